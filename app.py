@@ -43,7 +43,9 @@ def main():
     
     # Création de l'application
     try:
-        app = create_app(env)
+        # Avec le rechargement automatique, seul le processus enfant sert les requêtes
+        serving_process = not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'
+        app = create_app(env, start_services=serving_process)
         print(f"✅ Application créée avec succès")
         
         # Lancement du serveur
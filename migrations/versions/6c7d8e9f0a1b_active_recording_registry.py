@@ -0,0 +1,43 @@
+"""Registre partagé des enregistrements actifs
+
+Revision ID: 6c7d8e9f0a1b
+Revises: 5a6b7c8d9e0f
+Create Date: 2026-10-16 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6c7d8e9f0a1b'
+down_revision = '5a6b7c8d9e0f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('active_recording',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('session_id', sa.String(100), nullable=False),
+        sa.Column('court_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('node', sa.String(255), nullable=False),
+        sa.Column('worker_pid', sa.Integer(), nullable=False),
+        sa.Column('encoder_pid', sa.Integer(), nullable=True),
+        sa.Column('status', sa.String(20), nullable=True),
+        sa.Column('mode', sa.String(20), nullable=True),
+        sa.Column('video_path', sa.String(255), nullable=True),
+        sa.Column('stop_requested', sa.Boolean(), nullable=True),
+        sa.Column('result', sa.Text(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('heartbeat_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['court_id'], ['court.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('session_id')
+    )
+
+
+def downgrade():
+    op.drop_table('active_recording')
@@ -0,0 +1,38 @@
+"""Métadonnées média des vidéos (ffprobe)
+
+Revision ID: 7d8e9f0a1b2c
+Revises: 6c7d8e9f0a1b
+Create Date: 2026-10-16 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d8e9f0a1b2c'
+down_revision = '6c7d8e9f0a1b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('video', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('video_codec', sa.String(20), nullable=True))
+        batch_op.add_column(sa.Column('width', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('height', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('fps', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('bitrate', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('keyframe_interval', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('metadata_extracted_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('video', schema=None) as batch_op:
+        batch_op.drop_column('metadata_extracted_at')
+        batch_op.drop_column('keyframe_interval')
+        batch_op.drop_column('bitrate')
+        batch_op.drop_column('fps')
+        batch_op.drop_column('height')
+        batch_op.drop_column('width')
+        batch_op.drop_column('video_codec')
@@ -0,0 +1,30 @@
+"""Statut et durées du post-traitement des vidéos
+
+Revision ID: 8e9f0a1b2c3d
+Revises: 7d8e9f0a1b2c
+Create Date: 2026-10-16 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e9f0a1b2c3d'
+down_revision = '7d8e9f0a1b2c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('video', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('processing_status', sa.String(20), nullable=False, server_default='ready'))
+        batch_op.add_column(sa.Column('processing_timings', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('checksum', sa.String(64), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('video', schema=None) as batch_op:
+        batch_op.drop_column('checksum')
+        batch_op.drop_column('processing_timings')
+        batch_op.drop_column('processing_status')
@@ -0,0 +1,26 @@
+"""Tampon de pré-enregistrement par terrain
+
+Revision ID: 9f0a1b2c3d4e
+Revises: d9e0f1a2b3c4
+Create Date: 2026-10-16 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9f0a1b2c3d4e'
+down_revision = 'd9e0f1a2b3c4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('court', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('preroll_seconds', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('court', schema=None) as batch_op:
+        batch_op.drop_column('preroll_seconds')
@@ -0,0 +1,34 @@
+"""Santé des caméras par terrain
+
+Revision ID: a0b1c2d3e4f5
+Revises: 9f0a1b2c3d4e
+Create Date: 2026-10-16 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a0b1c2d3e4f5'
+down_revision = '9f0a1b2c3d4e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('court', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('camera_status', sa.String(length=20), nullable=False, server_default='unknown'))
+        batch_op.add_column(sa.Column('camera_latency_ms', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('camera_checked_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('camera_error', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('camera_info', sa.Text(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('court', schema=None) as batch_op:
+        batch_op.drop_column('camera_info')
+        batch_op.drop_column('camera_error')
+        batch_op.drop_column('camera_checked_at')
+        batch_op.drop_column('camera_latency_ms')
+        batch_op.drop_column('camera_status')
@@ -0,0 +1,49 @@
+"""Index des médias stockés et rétention par club
+
+Revision ID: b1c2d3e4f5a6
+Revises: a0b1c2d3e4f5
+Create Date: 2026-10-16 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b1c2d3e4f5a6'
+down_revision = 'a0b1c2d3e4f5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('stored_media',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('video_id', sa.Integer(), nullable=True),
+        sa.Column('club_id', sa.Integer(), nullable=True),
+        sa.Column('kind', sa.String(20), nullable=False),
+        sa.Column('path', sa.String(500), nullable=False),
+        sa.Column('size_bytes', sa.BigInteger(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=True),
+        sa.Column('deleted_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['video_id'], ['video.id'], ondelete='SET NULL'),
+        sa.ForeignKeyConstraint(['club_id'], ['club.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_stored_media_video_id', 'stored_media', ['video_id'])
+    op.create_index('ix_stored_media_club_id', 'stored_media', ['club_id'])
+    op.create_index('ix_stored_media_expiry', 'stored_media', ['deleted_at', 'expires_at'])
+
+    with op.batch_alter_table('club', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('retention_days', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('club', schema=None) as batch_op:
+        batch_op.drop_column('retention_days')
+
+    op.drop_index('ix_stored_media_expiry', table_name='stored_media')
+    op.drop_index('ix_stored_media_club_id', table_name='stored_media')
+    op.drop_index('ix_stored_media_video_id', table_name='stored_media')
+    op.drop_table('stored_media')
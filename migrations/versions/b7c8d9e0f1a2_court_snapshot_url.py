@@ -0,0 +1,26 @@
+"""URL d'instantané des caméras
+
+Revision ID: b7c8d9e0f1a2
+Revises: a6b7c8d9e0f1
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7c8d9e0f1a2'
+down_revision = 'a6b7c8d9e0f1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('court', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('snapshot_url', sa.String(255), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('court', schema=None) as batch_op:
+        batch_op.drop_column('snapshot_url')
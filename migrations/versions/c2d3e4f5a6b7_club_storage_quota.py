@@ -0,0 +1,35 @@
+"""Quota de stockage par club et occupation agrégée
+
+Revision ID: c2d3e4f5a6b7
+Revises: b1c2d3e4f5a6
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2d3e4f5a6b7'
+down_revision = 'b1c2d3e4f5a6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('club', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('storage_quota_bytes', sa.BigInteger(), nullable=True))
+        batch_op.add_column(sa.Column('storage_used_bytes', sa.BigInteger(), nullable=False, server_default='0'))
+
+    # Point de départ de l'agrégat: médias déjà indexés
+    op.execute(
+        "UPDATE club SET storage_used_bytes = ("
+        "SELECT COALESCE(SUM(size_bytes), 0) FROM stored_media "
+        "WHERE stored_media.club_id = club.id AND stored_media.deleted_at IS NULL)"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('club', schema=None) as batch_op:
+        batch_op.drop_column('storage_used_bytes')
+        batch_op.drop_column('storage_quota_bytes')
@@ -0,0 +1,30 @@
+"""Propriétaire du post-traitement des vidéos
+
+Revision ID: d9e0f1a2b3c4
+Revises: 8e9f0a1b2c3d
+Create Date: 2026-10-16 13:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd9e0f1a2b3c4'
+down_revision = '8e9f0a1b2c3d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('video', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('processing_node', sa.String(255), nullable=True))
+        batch_op.add_column(sa.Column('processing_pid', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('processing_heartbeat_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('video', schema=None) as batch_op:
+        batch_op.drop_column('processing_heartbeat_at')
+        batch_op.drop_column('processing_pid')
+        batch_op.drop_column('processing_node')
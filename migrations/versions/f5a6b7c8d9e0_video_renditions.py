@@ -0,0 +1,32 @@
+"""Déclinaisons ABR des vidéos
+
+Revision ID: f5a6b7c8d9e0
+Revises: e4f5a6b7c8d9
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f5a6b7c8d9e0'
+down_revision = 'e4f5a6b7c8d9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('video', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('view_count', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('renditions_status', sa.String(20), nullable=True))
+        batch_op.add_column(sa.Column('renditions_updated_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('renditions_attempts', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('video', schema=None) as batch_op:
+        batch_op.drop_column('renditions_attempts')
+        batch_op.drop_column('renditions_updated_at')
+        batch_op.drop_column('renditions_status')
+        batch_op.drop_column('view_count')
@@ -15,6 +15,12 @@ class Config:
     DEFAULT_ADMIN_PASSWORD = os.environ.get('DEFAULT_ADMIN_PASSWORD', 'password123')
     DEFAULT_ADMIN_NAME = 'Super Admin'
     DEFAULT_ADMIN_CREDITS = 10000
+    
+    # Réconciliation des enregistrements orphelins au démarrage (reprise après crash)
+    RECOVER_RECORDINGS_ON_STARTUP = os.environ.get('PADELVAR_RECOVER_ON_STARTUP', '1') != '0'
+    # Services d'enregistrement démarrés par create_app (serveur WSGI, ex. gunicorn);
+    # app.py et start_server.py les demandent explicitement
+    START_RECORDING_SERVICES = os.environ.get('PADELVAR_RECORDING_SERVICES', '0') == '1'
 
     @staticmethod
     def init_app(app):
@@ -3,6 +3,7 @@ Fichier principal de l'application PadelVar
 Factory pattern pour créer l'instance Flask
 """
 import os
+import logging
 from flask import Flask
 from flask_cors import CORS
 from werkzeug.security import generate_password_hash
@@ -21,13 +22,18 @@ from .routes.all_clubs import all_clubs_bp
 from .routes.players import players_bp
 from .routes.recording import recording_bp
 
-def create_app(config_name=None):
+logger = logging.getLogger(__name__)
+
+def create_app(config_name=None, start_services=None):
     """
     Factory pour créer l'application Flask
     
     Args:
         config_name (str): Nom de la configuration à utiliser ('development', 'production', 'testing')
                           Par défaut, utilise la variable d'environnement FLASK_ENV ou 'development'
+        start_services (bool): Démarre les services d'enregistrement (reprise après crash,
+                               pré-enregistrement, surveillance). Réservé au point d'entrée du
+                               serveur; par défaut, suit PADELVAR_RECORDING_SERVICES
     
     Returns:
         Flask: Instance de l'application configurée
@@ -137,8 +143,46 @@ def create_app(config_name=None):
             # Créer l'admin par défaut s'il n'existe pas
             _create_default_admin(app)
     
+    # Reprise après crash (encodeurs orphelins, fichiers partiels, terrains bloqués)
+    # puis démarrage des tampons de pré-enregistrement: seulement pour le serveur,
+    # jamais pour manage.py, les migrations ou les scripts qui créent l'application
+    if start_services is None:
+        start_services = app.config.get('START_RECORDING_SERVICES', False)
+    if start_services and config_name != 'testing':
+        start_recording_services(app)
+    
     return app
 
+def start_recording_services(app):
+    """
+    Réconcilie les enregistrements laissés par un worker arrêté brutalement
+    et démarre les tampons de pré-enregistrement des terrains ainsi que
+    la surveillance des caméras
+    
+    Args:
+        app: Instance Flask
+    """
+    from .services.video_capture_service import video_capture_service
+    from .services.camera_health import camera_health_scanner
+    from .services.archival import archival_service
+    from .services.court_snapshots import court_snapshotter
+    from .services.court_activity import court_activity_monitor
+    
+    camera_health_scanner.start(app)
+    archival_service.start(app)
+    court_snapshotter.start(app)
+    court_activity_monitor.start(app)
+    
+    with app.app_context():
+        try:
+            if app.config.get('RECOVER_RECORDINGS_ON_STARTUP', True):
+                video_capture_service.recover_orphaned_recordings()
+            video_capture_service.start_preroll_buffers()
+        except Exception as e:
+            # Base pas encore migrée, par exemple: le démarrage ne doit pas échouer
+            db.session.rollback()
+            logger.error(f"Démarrage des services d'enregistrement impossible: {e}")
+
 def _create_default_admin(app):
     """
     Crée l'administrateur par défaut s'il n'existe pas
@@ -16,6 +16,7 @@ class UserRole(Enum):
 # --- Table d'Association pour les Joueurs qui suivent des Clubs ---
 
 
+import json
 from datetime import datetime
 from enum import Enum
 from .database import db
@@ -77,6 +78,13 @@ class Club(db.Model):
     email = db.Column(db.String(120), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Conservation des vidéos en jours (None = durée par défaut, 0 = sans limite)
+    retention_days = db.Column(db.Integer, nullable=True)
+    
+    # Quota de stockage (None = illimité) et occupation tenue à jour par l'index des médias
+    storage_quota_bytes = db.Column(db.BigInteger, nullable=True)
+    storage_used_bytes = db.Column(db.BigInteger, nullable=False, default=0)
+    
     players = db.relationship('User', backref='club', lazy=True)
     courts = db.relationship('Court', backref='club', lazy=True, cascade='all, delete-orphan')
 
@@ -84,6 +92,9 @@ class Club(db.Model):
         return {
             'id': self.id, 'name': self.name, 'address': self.address,
             'phone_number': self.phone_number, 'email': self.email,
+            'retention_days': self.retention_days,
+            'storage_quota_bytes': self.storage_quota_bytes,
+            'storage_used_bytes': self.storage_used_bytes or 0,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
@@ -100,6 +111,19 @@ class Court(db.Model):
     recording_session_id = db.Column(db.String(100), nullable=True)
     current_recording_id = db.Column(db.String(100), nullable=True)
     
+    # Tampon de pré-enregistrement permanent (secondes conservées, 0 = désactivé)
+    preroll_seconds = db.Column(db.Integer, nullable=False, default=0)
+    
+    # Dernière sonde de la caméra (tenue à jour par le scanner en arrière-plan)
+    camera_status = db.Column(db.String(20), nullable=False, default='unknown')  # unknown, online, offline
+    camera_latency_ms = db.Column(db.Integer, nullable=True)
+    camera_checked_at = db.Column(db.DateTime, nullable=True)
+    camera_error = db.Column(db.String(255), nullable=True)
+    camera_info = db.Column(db.Text, nullable=True)  # JSON: codec, résolution, fps...
+    
+    # URL HTTP d'instantané JPEG de la caméra (capturée périodiquement, jamais à la demande)
+    snapshot_url = db.Column(db.String(255), nullable=True)
+    
     videos = db.relationship('Video', backref='court', lazy=True)
 
     def to_dict(self):
@@ -109,9 +133,21 @@ class Court(db.Model):
             "is_recording": self.is_recording,
             "recording_session_id": self.recording_session_id,
             "current_recording_id": self.current_recording_id,
+            "preroll_seconds": self.preroll_seconds,
+            "snapshot_url": self.snapshot_url,
+            "camera": self.camera_health(),
             "available": not self.is_recording
         }
 
+    def camera_health(self):
+        return {
+            "status": self.camera_status or 'unknown',
+            "latency_ms": self.camera_latency_ms,
+            "checked_at": self.camera_checked_at.isoformat() if self.camera_checked_at else None,
+            "error": self.camera_error,
+            "info": json.loads(self.camera_info) if self.camera_info else None
+        }
+
 class Video(db.Model):
     __tablename__ = 'video'
     id = db.Column(db.Integer, primary_key=True)
@@ -128,6 +164,36 @@ class Video(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     court_id = db.Column(db.Integer, db.ForeignKey('court.id'), nullable=True)
     
+    # Métadonnées média extraites une fois par ffprobe à la finalisation
+    video_codec = db.Column(db.String(20), nullable=True)
+    width = db.Column(db.Integer, nullable=True)
+    height = db.Column(db.Integer, nullable=True)
+    fps = db.Column(db.Float, nullable=True)
+    bitrate = db.Column(db.Integer, nullable=True)  # bit/s
+    keyframe_interval = db.Column(db.Float, nullable=True)  # secondes
+    metadata_extracted_at = db.Column(db.DateTime, nullable=True)
+    
+    # Post-traitement en arrière-plan: processing (recovering après reprise) -> ready | failed
+    processing_status = db.Column(db.String(20), nullable=False, default='ready')
+    # Worker qui porte le post-traitement, entretenu par son battement de cœur
+    processing_node = db.Column(db.String(255), nullable=True)
+    processing_pid = db.Column(db.Integer, nullable=True)
+    processing_heartbeat_at = db.Column(db.DateTime, nullable=True)
+    processing_timings = db.Column(db.Text, nullable=True)  # JSON: durée de chaque étape (s)
+    checksum = db.Column(db.String(64), nullable=True)  # SHA-256 du média
+    storyboard_url = db.Column(db.String(255), nullable=True)  # piste WebVTT des planches de miniatures
+    highlights = db.Column(db.Text, nullable=True)  # JSON: temps forts candidats [{start, end, score}] (s)
+    
+    # Déclinaisons ABR (360p/540p/720p): None -> pending -> processing -> ready | failed
+    view_count = db.Column(db.Integer, nullable=False, default=0)
+    renditions_status = db.Column(db.String(20), nullable=True)
+    renditions_updated_at = db.Column(db.DateTime, nullable=True)
+    renditions_attempts = db.Column(db.Integer, nullable=False, default=0)  # remis à zéro au succès
+    
+    # Archivage: réencodage plus compact des vidéos anciennes
+    archived_at = db.Column(db.DateTime, nullable=True)
+    archive_saved_bytes = db.Column(db.BigInteger, nullable=True)
+    
     # Relations (en utilisant les backrefs existants)
     # user = défini via backref='owner' dans User.videos
     # court = défini via backref='court' dans Court.videos
@@ -136,10 +202,70 @@ class Video(db.Model):
         return {
             "id": self.id, "user_id": self.user_id, "court_id": self.court_id,
             "file_url": self.file_url, "thumbnail_url": self.thumbnail_url,
+            "storyboard_url": self.storyboard_url,
+            "highlights": json.loads(self.highlights) if self.highlights else None,
             "title": self.title, "description": self.description, "duration": self.duration,
             "file_size": self.file_size, "is_unlocked": self.is_unlocked, "credits_cost": self.credits_cost,
             "recorded_at": self.recorded_at.isoformat() if self.recorded_at else None,
-            "created_at": self.created_at.isoformat() if self.created_at else None
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "media": self.media_metadata(),
+            "processing_status": self.processing_status,
+            "processing_timings": json.loads(self.processing_timings) if self.processing_timings else None,
+            "checksum": self.checksum,
+            "view_count": self.view_count,
+            "renditions_status": self.renditions_status,
+            "archived_at": self.archived_at.isoformat() if self.archived_at else None
+        }
+    
+    def media_metadata(self):
+        """Métadonnées média stockées (aucun accès au fichier)"""
+        return {
+            "duration": self.duration, "video_codec": self.video_codec,
+            "width": self.width, "height": self.height, "fps": self.fps,
+            "bitrate": self.bitrate, "keyframe_interval": self.keyframe_interval,
+            "extracted_at": self.metadata_extracted_at.isoformat() if self.metadata_extracted_at else None
+        }
+
+class VideoClip(db.Model):
+    """Extrait d'une vidéo, découpé par copie du flux entre images clés"""
+    __tablename__ = 'video_clip'
+    id = db.Column(db.Integer, primary_key=True)
+    video_id = db.Column(db.Integer, db.ForeignKey('video.id', ondelete='CASCADE'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    title = db.Column(db.String(200), nullable=True)
+    
+    # Bornes demandées et bornes effectives (alignées sur les images clés en mode rapide)
+    start_time = db.Column(db.Float, nullable=False)
+    end_time = db.Column(db.Float, nullable=False)
+    accurate = db.Column(db.Boolean, nullable=False, default=False)
+    actual_start = db.Column(db.Float, nullable=True)
+    duration = db.Column(db.Float, nullable=True)
+    
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, processing, ready, failed
+    file_path = db.Column(db.String(500), nullable=True)
+    file_size = db.Column(db.BigInteger, nullable=True)
+    error = db.Column(db.String(255), nullable=True)
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    completed_at = db.Column(db.DateTime, nullable=True)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'video_id': self.video_id,
+            'user_id': self.user_id,
+            'title': self.title,
+            'start_time': self.start_time,
+            'end_time': self.end_time,
+            'accurate': self.accurate,
+            'actual_start': self.actual_start,
+            'duration': self.duration,
+            'status': self.status,
+            'file_size': self.file_size,
+            'download_url': f"/api/videos/{self.video_id}/clips/{self.id}/download" if self.status == 'ready' else None,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None
         }
 
 class RecordingSession(db.Model):
@@ -214,6 +340,82 @@ class RecordingSession(db.Model):
         elapsed = self.get_elapsed_minutes()
         return elapsed >= self.planned_duration
 
+class ActiveRecording(db.Model):
+    """Registre partagé des enregistrements en cours, visible par tous les workers"""
+    __tablename__ = 'active_recording'
+    id = db.Column(db.Integer, primary_key=True)
+    session_id = db.Column(db.String(100), unique=True, nullable=False)
+    court_id = db.Column(db.Integer, db.ForeignKey('court.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    
+    # Propriétaire de l'encodeur
+    node = db.Column(db.String(255), nullable=False)
+    worker_pid = db.Column(db.Integer, nullable=False)
+    encoder_pid = db.Column(db.Integer, nullable=True)
+    
+    # État
+    status = db.Column(db.String(20), default='starting')  # starting, queued, recording, stopping, error
+    mode = db.Column(db.String(20), nullable=True)
+    video_path = db.Column(db.String(255), nullable=True)
+    stop_requested = db.Column(db.Boolean, default=False)
+    result = db.Column(db.Text, nullable=True)  # JSON du résultat d'arrêt
+    
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    heartbeat_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def is_stale(self, timeout_seconds):
+        """Le worker propriétaire n'a plus donné signe de vie"""
+        if not self.heartbeat_at:
+            return True
+        return (datetime.utcnow() - self.heartbeat_at).total_seconds() > timeout_seconds
+    
+    def to_dict(self):
+        return {
+            'session_id': self.session_id,
+            'court_id': self.court_id,
+            'user_id': self.user_id,
+            'node': self.node,
+            'worker_pid': self.worker_pid,
+            'encoder_pid': self.encoder_pid,
+            'status': self.status,
+            'mode': self.mode,
+            'video_path': self.video_path,
+            'stop_requested': self.stop_requested,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'heartbeat_at': self.heartbeat_at.isoformat() if self.heartbeat_at else None
+        }
+
+class StoredMedia(db.Model):
+    """Index des fichiers média stockés et de leur date d'expiration (rétention)"""
+    __tablename__ = 'stored_media'
+    __table_args__ = (
+        db.Index('ix_stored_media_expiry', 'deleted_at', 'expires_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    video_id = db.Column(db.Integer, db.ForeignKey('video.id', ondelete='SET NULL'), nullable=True, index=True)
+    club_id = db.Column(db.Integer, db.ForeignKey('club.id'), nullable=True, index=True)
+    
+    kind = db.Column(db.String(20), nullable=False)  # video, hls (dossier de segments), thumbnail
+    path = db.Column(db.String(500), nullable=False)
+    size_bytes = db.Column(db.BigInteger, nullable=True)
+    
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=True)  # None = conservé sans limite
+    deleted_at = db.Column(db.DateTime, nullable=True)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'video_id': self.video_id,
+            'club_id': self.club_id,
+            'kind': self.kind,
+            'path': self.path,
+            'size_bytes': self.size_bytes,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None,
+            'deleted_at': self.deleted_at.isoformat() if self.deleted_at else None
+        }
+
 class ClubActionHistory(db.Model):
     __tablename__ = 'club_action_history'
     id = db.Column(db.Integer, primary_key=True)
@@ -2,6 +2,8 @@
 
 from flask import Blueprint, request, jsonify, session
 from src.models.user import db, User, Club, Court, Video, UserRole, ClubActionHistory, RecordingSession
+from src.services.video_capture_service import video_capture_service
+from src.services.camera_health import camera_health_scanner
 from werkzeug.security import generate_password_hash
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import aliased, joinedload
@@ -256,6 +258,16 @@ def update_club(club_id):
         if "address" in data: club.address = data["address"]
         if "phone_number" in data: club.phone_number = data["phone_number"]
         if "email" in data: club.email = data["email"].strip()
+        retention_changed = "retention_days" in data and data["retention_days"] != club.retention_days
+        if retention_changed:
+            if data["retention_days"] is not None and (not isinstance(data["retention_days"], int) or data["retention_days"] < 0):
+                return jsonify({"error": "Durée de conservation invalide (jours >= 0, 0 = sans limite, null = par défaut)"}), 400
+            club.retention_days = data["retention_days"]
+        if "storage_quota_bytes" in data:
+            quota = data["storage_quota_bytes"]
+            if quota is not None and (not isinstance(quota, int) or quota < 0):
+                return jsonify({"error": "Quota de stockage invalide (octets >= 0, null = illimité)"}), 400
+            club.storage_quota_bytes = quota
         
         # Synchroniser l'objet User associé
         if club_user:
@@ -264,6 +276,9 @@ def update_club(club_id):
             club_user.phone_number = club.phone_number
         
         db.session.commit()
+        if retention_changed:
+            # Les médias déjà stockés suivent la nouvelle politique
+            video_capture_service.retention.apply_club_policy(club)
         return jsonify({"message": "Club mis à jour avec succès", "club": club.to_dict()}), 200
         
     except Exception as e:
@@ -380,9 +395,11 @@ def create_court(club_id):
     if not require_super_admin(): return jsonify({"error": "Accès non autorisé"}), 403
     data = request.get_json()
     try:
-        new_court = Court(name=data["name"], camera_url=data["camera_url"], club_id=club_id, qr_code=str(uuid.uuid4()))
+        new_court = Court(name=data["name"], camera_url=data["camera_url"], club_id=club_id, qr_code=str(uuid.uuid4()),
+                          snapshot_url=data.get("snapshot_url") or None)
         db.session.add(new_court)
         db.session.commit()
+        camera_health_scanner.request_scan()
         return jsonify({"message": "Terrain créé", "court": new_court.to_dict()}), 201
     except Exception as e:
         db.session.rollback()
@@ -395,8 +412,23 @@ def update_court(court_id):
     data = request.get_json()
     try:
         if "name" in data: court.name = data["name"]
-        if "camera_url" in data: court.camera_url = data["camera_url"]
+        if "camera_url" in data and data["camera_url"] != court.camera_url:
+            # L'état de l'ancienne caméra ne vaut plus rien pour la nouvelle
+            court.camera_url = data["camera_url"]
+            court.camera_status, court.camera_latency_ms, court.camera_error = 'unknown', None, None
+            court.camera_checked_at, court.camera_info = None, None
+        if "snapshot_url" in data: court.snapshot_url = data["snapshot_url"] or None
+        if "preroll_seconds" in data:
+            preroll_seconds = int(data["preroll_seconds"] or 0)
+            if not 0 <= preroll_seconds <= video_capture_service.preroll.max_seconds:
+                return jsonify({"error": f"Pré-enregistrement entre 0 et {video_capture_service.preroll.max_seconds} secondes"}), 400
+            court.preroll_seconds = preroll_seconds
         db.session.commit()
+        if court.camera_status == 'unknown':
+            camera_health_scanner.request_scan()
+        if "preroll_seconds" in data or "camera_url" in data:
+            # Démarrer, redimensionner ou arrêter le tampon du terrain
+            video_capture_service.preroll.sync()
         return jsonify({"message": "Terrain mis à jour", "court": court.to_dict()}), 200
     except Exception as e:
         db.session.rollback()
@@ -1381,6 +1381,7 @@ def stop_court_recording(court_id):
         print(f"  Start time: {start_time}")
         print(f"  End time: {end_time}")
         
+        duration_seconds = 60
         if start_time and end_time:
             duration_delta = end_time - start_time
             duration_seconds = duration_delta.total_seconds()
@@ -1399,7 +1400,7 @@ def stop_court_recording(court_id):
         new_video = Video(
             title=video_title,
             description=active_recording.description or f"Enregistrement automatique sur {court.name}",
-            duration=duration_minutes,
+            duration=int(duration_seconds),  # en secondes, comme les autres vidéos
             user_id=active_recording.user_id,
             court_id=court_id,
             recorded_at=active_recording.start_time,
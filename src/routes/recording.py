@@ -5,6 +5,7 @@ Fonctionnalités : durée sélectionnable, arrêt automatique, gestion par club
 
 from flask import Blueprint, request, jsonify, session
 from datetime import datetime, timedelta
+import os
 import uuid
 import logging
 import json
@@ -14,6 +15,11 @@ from ..models.user import (
     User, Club, Court, Video, RecordingSession, 
     ClubActionHistory, UserRole
 )
+from ..services.video_capture_service import video_capture_service
+from ..services.camera_health import camera_health_scanner
+from ..services.archival import archival_service
+from ..services.court_activity import court_activity_monitor
+from ..services.storage_admission import InsufficientStorageError
 
 logger = logging.getLogger(__name__)
 
@@ -113,6 +119,14 @@ def start_recording_with_duration():
                 'current_recording_id': court.current_recording_id
             }), 409
         
+        # Ne pas débiter de crédit pour une caméra injoignable à la dernière sonde
+        if court.camera_status == 'offline':
+            camera_health_scanner.request_scan()
+            return jsonify({
+                'error': 'La caméra de ce terrain est injoignable',
+                'camera': court.camera_health()
+            }), 503
+        
         # Vérifier que l'utilisateur a des crédits
         if user.credits_balance < 1:
             return jsonify({'error': 'Crédits insuffisants'}), 400
@@ -137,6 +151,12 @@ def start_recording_with_duration():
             if planned_duration not in [60, 90, 120, 200]:
                 return jsonify({'error': 'Durée invalide. Utilisez 60, 90, 120 ou MAX'}), 400
         
+        # Refuser avant tout débit si le volume ou le quota du club ne peut pas accueillir la session
+        try:
+            video_capture_service.check_storage_admission(court.club, planned_duration * 60)
+        except InsufficientStorageError as e:
+            return jsonify({'error': str(e), 'storage': e.details}), 507
+        
         # Générer un ID unique pour l'enregistrement
         recording_id = f"rec_{user.id}_{int(datetime.now().timestamp())}_{uuid.uuid4().hex[:8]}"
         
@@ -292,6 +312,13 @@ def _stop_recording_session(recording_session, stopped_by, performed_by_id):
             is_unlocked=True
         )
         
+        # Média présent: métadonnées (ffprobe), miniature, etc. par le pipeline de
+        # post-traitement, sans bloquer l'arrêt; sinon la durée écoulée fait foi
+        video_path = video_capture_service.base_path / os.path.basename(video.file_url)
+        if video_path.exists():
+            video.file_size = video_path.stat().st_size
+            video.processing_status = 'processing'
+        
         db.session.add(video)
         
         # Log de l'action
@@ -308,6 +335,15 @@ def _stop_recording_session(recording_session, stopped_by, performed_by_id):
         
         db.session.commit()
         
+        if video.processing_status == 'processing':
+            video_capture_service.submit_processing(video.id, {
+                'session_id': recording_session.recording_id,
+                'mode': 'mp4',
+                'video_path': str(video_path),
+                'video_filename': video_path.name,
+                'parts': [str(video_path)]
+            })
+        
         logger.info(f"Enregistrement arrêté: {recording_session.recording_id} par {stopped_by}")
         
         return jsonify({
@@ -457,6 +493,83 @@ def get_available_courts(club_id):
 # TÂCHE DE NETTOYAGE AUTOMATIQUE
 # ====================================================================
 
+@recording_bp.route('/reconcile', methods=['POST'])
+def reconcile_recordings():
+    """Réconcilier les enregistrements orphelins (reprise après crash, tâche de maintenance)"""
+    user = get_current_user()
+    if not user or user.role != UserRole.SUPER_ADMIN:
+        return jsonify({'error': 'Accès non autorisé'}), 403
+    
+    try:
+        report = video_capture_service.recover_orphaned_recordings()
+        return jsonify(report), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Erreur lors de la réconciliation: {e}")
+        return jsonify({'error': 'Erreur lors de la réconciliation'}), 500
+
+@recording_bp.route('/retention/run', methods=['POST'])
+def run_media_retention():
+    """Indexer les médias non encore suivis puis supprimer les médias expirés"""
+    user = get_current_user()
+    if not user or user.role != UserRole.SUPER_ADMIN:
+        return jsonify({'error': 'Accès non autorisé'}), 403
+    
+    try:
+        indexed = video_capture_service.index_existing_media()
+        report = video_capture_service.cleanup_old_recordings()
+        return jsonify({
+            'indexed': indexed,
+            'cleanup': report,
+            'retention': video_capture_service.retention.get_stats()
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Erreur lors de la rétention des médias: {e}")
+        return jsonify({'error': 'Erreur lors de la rétention des médias'}), 500
+
+@recording_bp.route('/archival/run', methods=['POST'])
+def run_archival():
+    """Réencoder maintenant les vidéos anciennes (hors plage creuse, nœud inoccupé requis)"""
+    user = get_current_user()
+    if not user or user.role != UserRole.SUPER_ADMIN:
+        return jsonify({'error': 'Accès non autorisé'}), 403
+    
+    try:
+        if not archival_service.nodes_idle():
+            return jsonify({'error': 'Enregistrements en cours, archivage reporté'}), 409
+        limit = (request.get_json(silent=True) or {}).get('limit')
+        report = archival_service.run(limit=int(limit) if limit else None)
+        return jsonify({'report': report, 'saved_by_club': archival_service.saved_by_club()}), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Erreur lors de l'archivage: {e}")
+        return jsonify({'error': "Erreur lors de l'archivage"}), 500
+
+@recording_bp.route('/archival/stats', methods=['GET'])
+def get_archival_stats():
+    """Octets gagnés par l'archivage, par club, et état du service"""
+    user = get_current_user()
+    if not user or user.role != UserRole.SUPER_ADMIN:
+        return jsonify({'error': 'Accès non autorisé'}), 403
+    
+    return jsonify({
+        'service': archival_service.get_stats(),
+        'saved_by_club': archival_service.saved_by_club()
+    }), 200
+
+@recording_bp.route('/auto-stop/stats', methods=['GET'])
+def get_auto_stop_stats():
+    """Mouvement observé sur les terrains enregistrés et arrêts anticipés"""
+    user = get_current_user()
+    if not user or user.role != UserRole.SUPER_ADMIN:
+        return jsonify({'error': 'Accès non autorisé'}), 403
+    
+    return jsonify(court_activity_monitor.get_stats()), 200
+
 @recording_bp.route('/cleanup-expired', methods=['POST'])
 def cleanup_expired_recordings():
     """Nettoyer les enregistrements expirés (tâche de maintenance)"""
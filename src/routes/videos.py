@@ -1,9 +1,19 @@
-from flask import Blueprint, request, jsonify, session, send_file, Response
-from src.models.user import db, User, Video, Court, Club
+from flask import Blueprint, request, jsonify, session, send_file, send_from_directory, Response, current_app, stream_with_context
+from src.models.user import db, User, Video, Court, Club, VideoClip
 from src.services.video_capture_service import video_capture_service
+from src.services.encoder_pool import EncoderPoolFullError, EncoderStartError
+from src.services.storage_admission import InsufficientStorageError
+from src.services.keyframe_index import KeyframeIndexError
+from src.services.clip_service import clip_service, ClipQueueFullError
+from src.services.camera_health import camera_health_scanner
+from src.services.storyboard import VTT_FILENAME as STORYBOARD_VTT
+from src.services.rendition_ladder import rendition_service, RENDITION_LADDER, MASTER_PLAYLIST
+from src.services.live_relay import live_relay, MJPEG_BOUNDARY
+from src.services.court_snapshots import court_snapshotter
 from datetime import datetime, timedelta
 import os
 import io
+import json
 import logging
 
 logger = logging.getLogger(__name__)
@@ -60,10 +70,30 @@ def start_recording():
     data = request.get_json()
     court_id = data.get('court_id')
     session_name = data.get('session_name', f"Match du {datetime.now().strftime('%d/%m/%Y')}")
+    recording_mode = data.get('recording_mode')  # 'mp4' ou 'segmented'
+    preroll_seconds = data.get('preroll_seconds') or 0  # démarrer dans le passé
+    planned_duration = data.get('planned_duration')  # minutes, pour estimer l'espace disque
     
     if not court_id:
         return jsonify({'error': 'Le terrain est requis'}), 400
     
+    max_preroll = video_capture_service.preroll.max_seconds
+    try:
+        preroll_seconds = int(preroll_seconds)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Le pré-enregistrement doit être un nombre entier de secondes'}), 400
+    if not 0 <= preroll_seconds <= max_preroll:
+        return jsonify({'error': f'Le pré-enregistrement doit être compris entre 0 et {max_preroll} secondes'}), 400
+    
+    planned_seconds = None
+    if planned_duration not in (None, ''):
+        try:
+            planned_seconds = int(planned_duration) * 60
+        except (TypeError, ValueError):
+            return jsonify({'error': 'La durée prévue doit être un nombre entier de minutes'}), 400
+        if planned_seconds <= 0:
+            return jsonify({'error': 'La durée prévue doit être positive'}), 400
+    
     try:
         # Vérifier que le terrain existe
         court = Court.query.get(court_id)
@@ -74,11 +104,25 @@ def start_recording():
         if hasattr(court, 'is_recording') and court.is_recording:
             return jsonify({'error': 'Ce terrain est déjà en cours d\'enregistrement'}), 400
         
+        # Caméra injoignable à la dernière sonde: inutile de lancer un encodeur
+        if court.camera_status == 'offline':
+            camera_health_scanner.request_scan()
+            return jsonify({
+                'error': 'La caméra de ce terrain est injoignable',
+                'camera': court.camera_health()
+            }), 503
+        
+        # Jamais plus loin dans le passé que le tampon du terrain
+        preroll_seconds = min(preroll_seconds, video_capture_service.preroll.wanted_seconds(court))
+        
         # Démarrer l'enregistrement avec le service de capture
         result = video_capture_service.start_recording(
             court_id=court_id,
             user_id=user.id,
-            session_name=session_name
+            session_name=session_name,
+            mode=recording_mode,
+            preroll_seconds=preroll_seconds,
+            planned_seconds=planned_seconds
         )
         
         # Marquer le terrain comme en cours d'enregistrement
@@ -94,7 +138,11 @@ def start_recording():
             'court_id': court_id,
             'session_name': session_name,
             'camera_url': result['camera_url'],
-            'status': 'recording'
+            'recording_mode': result['mode'],
+            'preroll_seconds': result['preroll_seconds'],
+            'storage_profile': result['storage_profile'],
+            'status': 'queued' if result['status'] == 'queued' else 'recording',
+            'queue_position': result.get('queue_position')
         }), 200
         court.is_recording = True
         court.current_recording_id = recording_id
@@ -127,6 +175,15 @@ def start_recording():
             'camera_url': court.camera_url
         }), 200
         
+    except EncoderPoolFullError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e), 'encoder_pool': video_capture_service.encoder_pool.get_stats()}), 503
+    except EncoderStartError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 503
+    except InsufficientStorageError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e), 'storage': e.details}), 507
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': f'Erreur lors du démarrage: {str(e)}'}), 500
@@ -242,6 +299,257 @@ def share_video(video_id):
     except Exception as e:
         return jsonify({'error': 'Erreur lors de la génération des liens de partage'}), 500
 
+@videos_bp.route('/<int:video_id>/metadata', methods=['GET'])
+def get_video_metadata(video_id):
+    """Métadonnées média stockées à la finalisation (le fichier n'est pas relu)"""
+    user = get_current_user()
+    if not user:
+        return jsonify({'error': 'Non authentifié'}), 401
+    
+    video = Video.query.get(video_id)
+    if not video:
+        return jsonify({'error': 'Vidéo non trouvée'}), 404
+    if video.user_id != user.id and not video.is_unlocked:
+        return jsonify({'error': 'Accès non autorisé'}), 403
+    
+    return jsonify({
+        'video_id': video.id,
+        'file_size': video.file_size,
+        'metadata': video.media_metadata()
+    }), 200
+
+def _get_viewable_video(video_id):
+    """Vidéo lisible par l'utilisateur connecté: (vidéo, réponse d'erreur)"""
+    user = get_current_user()
+    if not user:
+        return None, (jsonify({'error': 'Non authentifié'}), 401)
+    video = Video.query.get(video_id)
+    if not video or not video.file_url:
+        return None, (jsonify({'error': 'Vidéo non trouvée'}), 404)
+    if video.user_id != user.id and not video.is_unlocked:
+        return None, (jsonify({'error': 'Accès non autorisé'}), 403)
+    return video, None
+
+@videos_bp.route('/<int:video_id>/media', methods=['GET'])
+def stream_video_media(video_id):
+    """Fichier MP4 de la vidéo, servi par plages d'octets (Range) pour la lecture et la recherche"""
+    video, error = _get_viewable_video(video_id)
+    if error:
+        return error
+    
+    video_path = video_capture_service.resolve_media_path(video)
+    if not video_path.endswith('.mp4') or not os.path.exists(video_path):
+        return jsonify({'error': 'Média non disponible (enregistrement segmenté: utiliser la playlist HLS)'}), 404
+    response = send_file(os.path.abspath(video_path), mimetype='video/mp4', conditional=True)
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.headers['Cache-Control'] = 'private, max-age=3600'
+    return response
+
+@videos_bp.route('/<int:video_id>/seek', methods=['GET'])
+def seek_video(video_id):
+    """Image clé précédant l'instant t (s) et sa position en octets, lues dans l'index de la vidéo"""
+    video, error = _get_viewable_video(video_id)
+    if error:
+        return error
+    
+    seconds = request.args.get('t', type=float)
+    if seconds is None or seconds < 0:
+        return jsonify({'error': 'Paramètre t (secondes) requis'}), 400
+    try:
+        position = video_capture_service.seek(video, seconds)
+    except KeyframeIndexError as e:
+        logger.error(f"Recherche impossible dans la vidéo {video.id}: {e}")
+        return jsonify({'error': 'Index des images clés indisponible, réessayer plus tard'}), 503
+    if not position:
+        return jsonify({'error': 'Index des images clés indisponible'}), 404
+    return jsonify(dict(position, video_id=video.id, requested_time=seconds)), 200
+
+@videos_bp.route('/<int:video_id>/thumbnail', methods=['GET'])
+def get_thumbnail_at(video_id):
+    """Miniature à l'instant t (s), prise sur l'image clé précédente"""
+    video, error = _get_viewable_video(video_id)
+    if error:
+        return error
+    
+    seconds = request.args.get('t', default=0.0, type=float)
+    try:
+        thumbnail_path = video_capture_service.thumbnail_at(video, max(0.0, seconds))
+    except KeyframeIndexError as e:
+        logger.error(f"Miniature impossible pour la vidéo {video.id}: {e}")
+        return jsonify({'error': 'Index des images clés indisponible, réessayer plus tard'}), 503
+    if not thumbnail_path:
+        return jsonify({'error': 'Miniature indisponible'}), 404
+    response = send_file(os.path.abspath(thumbnail_path), mimetype='image/jpeg', conditional=True)
+    response.headers['Cache-Control'] = 'public, max-age=86400, immutable'
+    return response
+
+@videos_bp.route('/<int:video_id>/storyboard/<filename>', methods=['GET'])
+def get_storyboard_file(video_id, filename):
+    """Piste WebVTT (storyboard.vtt) et planches de miniatures pour la prévisualisation"""
+    video, error = _get_viewable_video(video_id)
+    if error:
+        return error
+    
+    if filename != STORYBOARD_VTT and not (filename.startswith('sheet_') and filename.endswith('.jpg')):
+        return jsonify({'error': 'Fichier non trouvé'}), 404
+    directory = video_capture_service.storyboard_dir(video)
+    if not directory:
+        return jsonify({'error': 'Storyboard indisponible'}), 404
+    
+    mimetype = 'text/vtt' if filename == STORYBOARD_VTT else 'image/jpeg'
+    response = send_from_directory(os.path.abspath(directory), filename, mimetype=mimetype, conditional=True)
+    response.headers['Cache-Control'] = 'private, max-age=86400'
+    return response
+
+@videos_bp.route('/<int:video_id>/highlights', methods=['GET'])
+def get_video_highlights(video_id):
+    """Temps forts candidats détectés au post-traitement (secondes depuis le début)"""
+    video, error = _get_viewable_video(video_id)
+    if error:
+        return error
+    
+    if video.highlights is None:
+        return jsonify({'error': 'Temps forts pas encore détectés', 'processing_status': video.processing_status}), 404
+    return jsonify({'video_id': video.id, 'highlights': json.loads(video.highlights)}), 200
+
+@videos_bp.route('/<int:video_id>/abr/master.m3u8', methods=['GET'])
+def get_abr_master(video_id):
+    """Playlist maîtresse des déclinaisons ABR; lance leur génération à la première demande"""
+    video, error = _get_viewable_video(video_id)
+    if error:
+        return error
+    
+    status = rendition_service.request(current_app._get_current_object(), video)
+    if status != 'ready':
+        # Le lecteur se rabat sur le fichier d'origine en attendant
+        return jsonify({'status': status, 'fallback_url': f"/api/videos/{video.id}/media"}), 202
+    response = send_from_directory(os.path.abspath(rendition_service.directory(video)), MASTER_PLAYLIST,
+                                   mimetype=HLS_MIMETYPES['.m3u8'])
+    response.headers['Cache-Control'] = 'private, max-age=60'
+    return response
+
+@videos_bp.route('/<int:video_id>/abr/<rendition>/<filename>', methods=['GET'])
+def get_abr_rendition_file(video_id, rendition, filename):
+    """Playlist, segment d'initialisation et segments d'une déclinaison"""
+    video, error = _get_viewable_video(video_id)
+    if error:
+        return error
+    
+    extension = os.path.splitext(filename)[1]
+    if rendition not in {rung[0] for rung in RENDITION_LADDER} or extension not in HLS_MIMETYPES:
+        return jsonify({'error': 'Fichier non trouvé'}), 404
+    if video.renditions_status != 'ready':
+        return jsonify({'error': 'Déclinaisons indisponibles', 'status': video.renditions_status}), 404
+    
+    directory = os.path.abspath(os.path.join(rendition_service.directory(video), rendition))
+    response = send_from_directory(directory, filename, mimetype=HLS_MIMETYPES[extension], conditional=True)
+    response.headers['Cache-Control'] = 'private, max-age=86400'
+    return response
+
+@videos_bp.route('/renditions/stats', methods=['GET'])
+def get_rendition_stats():
+    """Pool de génération des déclinaisons ABR"""
+    user = get_current_user()
+    if not user:
+        return jsonify({'error': 'Non authentifié'}), 401
+    
+    return jsonify(rendition_service.get_stats()), 200
+
+@videos_bp.route('/<int:video_id>/clips', methods=['POST'])
+def create_clip(video_id):
+    """Créer un extrait (copie du flux entre images clés, bords réencodés si accurate)"""
+    user = get_current_user()
+    if not user:
+        return jsonify({'error': 'Non authentifié'}), 401
+    
+    video = Video.query.get(video_id)
+    if not video:
+        return jsonify({'error': 'Vidéo non trouvée'}), 404
+    if video.user_id != user.id and not video.is_unlocked:
+        return jsonify({'error': 'Accès non autorisé'}), 403
+    if video.processing_status != 'ready' or not video.file_url:
+        return jsonify({'error': 'La vidéo n\'est pas disponible pour le découpage'}), 409
+    
+    data = request.get_json() or {}
+    try:
+        start = float(data.get('start'))
+        end = float(data.get('end'))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Les bornes start et end (secondes) sont requises'}), 400
+    if start < 0 or end <= start:
+        return jsonify({'error': 'Bornes invalides'}), 400
+    if video.duration and end > video.duration + 1:
+        return jsonify({'error': f'La vidéo dure {video.duration} secondes'}), 400
+    if end - start > clip_service.max_clip_seconds:
+        return jsonify({'error': f'Un extrait ne peut dépasser {clip_service.max_clip_seconds:.0f} secondes'}), 400
+    
+    try:
+        clip = VideoClip(
+            video_id=video.id,
+            user_id=user.id,
+            title=data.get('title'),
+            start_time=start,
+            end_time=end,
+            accurate=bool(data.get('accurate', False))
+        )
+        db.session.add(clip)
+        db.session.commit()
+        clip_service.submit(current_app._get_current_object(), clip.id)
+        return jsonify({'message': 'Extrait en cours de création', 'clip': clip.to_dict()}), 202
+        
+    except ClipQueueFullError as e:
+        clip.status = 'failed'
+        clip.error = str(e)
+        db.session.commit()
+        return jsonify({'error': str(e), 'clips': clip_service.get_stats()}), 503
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Erreur lors de la création de l'extrait: {e}")
+        return jsonify({'error': 'Erreur lors de la création de l\'extrait'}), 500
+
+@videos_bp.route('/<int:video_id>/clips', methods=['GET'])
+def list_clips(video_id):
+    """Extraits de la vidéo créés par l'utilisateur"""
+    user = get_current_user()
+    if not user:
+        return jsonify({'error': 'Non authentifié'}), 401
+    
+    clips = VideoClip.query.filter_by(video_id=video_id, user_id=user.id).order_by(VideoClip.created_at.desc()).all()
+    return jsonify({'clips': [clip.to_dict() for clip in clips]}), 200
+
+@videos_bp.route('/<int:video_id>/clips/<int:clip_id>', methods=['GET'])
+def get_clip(video_id, clip_id):
+    """Statut d'un extrait"""
+    user = get_current_user()
+    if not user:
+        return jsonify({'error': 'Non authentifié'}), 401
+    
+    clip = VideoClip.query.filter_by(id=clip_id, video_id=video_id, user_id=user.id).first()
+    if not clip:
+        return jsonify({'error': 'Extrait non trouvé'}), 404
+    return jsonify({'clip': clip.to_dict()}), 200
+
+@videos_bp.route('/<int:video_id>/clips/<int:clip_id>/download', methods=['GET'])
+def download_clip(video_id, clip_id):
+    """Télécharger un extrait terminé"""
+    user = get_current_user()
+    if not user:
+        return jsonify({'error': 'Non authentifié'}), 401
+    
+    clip = VideoClip.query.filter_by(id=clip_id, video_id=video_id, user_id=user.id).first()
+    if not clip or clip.status != 'ready':
+        return jsonify({'error': 'Extrait non disponible'}), 404
+    if not clip.file_path or not os.path.exists(clip.file_path):
+        return jsonify({'error': 'Fichier de l\'extrait expiré'}), 410
+    
+    return send_file(
+        os.path.abspath(clip.file_path),
+        mimetype='video/mp4',
+        as_attachment=True,
+        download_name=f"{clip.title or f'extrait_{clip.id}'}.mp4",
+        conditional=True
+    )
+
 @videos_bp.route('/<int:video_id>/watch', methods=['GET'])
 def watch_video(video_id):
     """Route publique pour regarder une vidéo partagée"""
@@ -253,6 +561,9 @@ def watch_video(video_id):
         if not video.is_unlocked:
             return jsonify({'error': 'Vidéo non disponible'}), 403
         
+        # Les vidéos souvent regardées sont déclinées en ABR d'avance
+        rendition_service.note_view(current_app._get_current_object(), video)
+        
         # Retourner les informations de la vidéo pour le lecteur
         return jsonify({
             'video': {
@@ -261,6 +572,8 @@ def watch_video(video_id):
                 'description': video.description,
                 'file_url': video.file_url,
                 'thumbnail_url': video.thumbnail_url,
+                'storyboard_url': video.storyboard_url,
+                'abr_url': f"/api/videos/{video.id}/abr/{MASTER_PLAYLIST}",
                 'duration': video.duration,
                 'recorded_at': video.recorded_at.isoformat() if video.recorded_at else None
             }
@@ -328,7 +641,8 @@ def scan_qr_code():
             'message': 'QR code scanné avec succès',
             'court': court.to_dict(),
             'club': club.to_dict() if club else None,
-            'camera_url': court.camera_url,
+            'camera_url': f"/api/videos/courts/{court.id}/live.mjpg" if court.camera_url else None,
+            'snapshot_url': f"/api/videos/courts/{court.id}/snapshot.jpg",
             'can_record': True  # L'utilisateur peut démarrer un enregistrement
         }), 200
         
@@ -347,16 +661,92 @@ def get_camera_stream(court_id):
         if not court:
             return jsonify({'error': 'Terrain non trouvé'}), 404
         
+        if not court.camera_url:
+            return jsonify({'error': 'Aucune caméra sur ce terrain'}), 404
+        
+        # Les clients passent par le relais: jamais de connexion directe à la caméra
         return jsonify({
             'court_id': court.id,
             'court_name': court.name,
-            'camera_url': court.camera_url,
-            'stream_type': 'mjpeg'  # Type de flux pour la caméra par défaut
+            'camera_url': f"/api/videos/courts/{court.id}/live.mjpg",
+            'stream_type': 'mjpeg',
+            'hls_url': f"/api/videos/courts/{court.id}/live/index.m3u8"
+            if video_capture_service.preroll.is_live(court.id) else None
         }), 200
         
     except Exception as e:
         return jsonify({'error': 'Erreur lors de la récupération du flux caméra'}), 500
 
+@videos_bp.route('/courts/<int:court_id>/live.mjpg', methods=['GET'])
+def relay_live_mjpeg(court_id):
+    """Direct du terrain en MJPEG, relayé: une seule connexion amont pour tous les spectateurs"""
+    user = get_current_user()
+    if not user:
+        return jsonify({'error': 'Non authentifié'}), 401
+    
+    court = Court.query.get(court_id)
+    if not court or not court.camera_url:
+        return jsonify({'error': 'Terrain ou caméra non trouvé'}), 404
+    
+    channel = live_relay.subscribe(court.id, court.camera_url)
+    response = Response(stream_with_context(live_relay.mjpeg(channel)),
+                        mimetype=f'multipart/x-mixed-replace; boundary={MJPEG_BOUNDARY}')
+    response.headers['Cache-Control'] = 'no-cache, no-store'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@videos_bp.route('/courts/<int:court_id>/live/<filename>', methods=['GET'])
+def relay_live_hls(court_id, filename):
+    """Direct du terrain en HLS, servi depuis le tampon d'ingestion (segments en cache mémoire)"""
+    user = get_current_user()
+    if not user:
+        return jsonify({'error': 'Non authentifié'}), 401
+    
+    extension = os.path.splitext(filename)[1]
+    if extension not in HLS_MIMETYPES or filename.startswith('.'):
+        return jsonify({'error': 'Type de fichier non supporté'}), 400
+    
+    data = live_relay.hls_file(court_id, filename)
+    if data is None:
+        return jsonify({'error': 'Direct indisponible'}), 404
+    response = Response(data, mimetype=HLS_MIMETYPES[extension])
+    response.headers['Cache-Control'] = 'no-cache' if extension == '.m3u8' else 'public, max-age=60'
+    return response
+
+@videos_bp.route('/courts/<int:court_id>/snapshot.jpg', methods=['GET'])
+def get_court_snapshot(court_id):
+    """Dernière image fixe du terrain, lue dans le cache (If-None-Match -> 304)"""
+    user = get_current_user()
+    if not user:
+        return jsonify({'error': 'Non authentifié'}), 401
+    
+    snapshot = court_snapshotter.get(court_id)
+    if not snapshot:
+        return jsonify({'error': 'Image du terrain indisponible'}), 404
+    response = Response(snapshot.data, mimetype='image/jpeg')
+    response.set_etag(snapshot.etag)
+    response.last_modified = snapshot.captured_at
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+@videos_bp.route('/snapshots/stats', methods=['GET'])
+def get_snapshot_stats():
+    """Capture périodique des images fixes des terrains"""
+    user = get_current_user()
+    if not user:
+        return jsonify({'error': 'Non authentifié'}), 401
+    
+    return jsonify(court_snapshotter.get_stats()), 200
+
+@videos_bp.route('/live/stats', methods=['GET'])
+def get_live_relay_stats():
+    """Canaux de relais ouverts par ce worker et cache des segments"""
+    user = get_current_user()
+    if not user:
+        return jsonify({'error': 'Non authentifié'}), 401
+    
+    return jsonify(live_relay.get_stats()), 200
+
 
 # ====================================================================
 # NOUVELLE ROUTE POUR METTRE À JOUR UNE VIDÉO
@@ -419,6 +809,39 @@ def stream_video(filename):
     except Exception as e:
         return jsonify({'error': 'Erreur lors du streaming vidéo'}), 500
 
+HLS_MIMETYPES = {
+    '.m3u8': 'application/vnd.apple.mpegurl',
+    '.m4s': 'video/iso.segment',
+    '.mp4': 'video/mp4'
+}
+
+@videos_bp.route('/hls/<session_id>/<filename>', methods=['GET'])
+def stream_hls(session_id, filename):
+    """Servir la playlist et les segments d'un enregistrement segmenté (même en cours)"""
+    user = get_current_user()
+    if not user:
+        return jsonify({'error': 'Non authentifié'}), 401
+    
+    if session_id.startswith('.') or os.sep in session_id:
+        return jsonify({'error': 'Session invalide'}), 400
+    
+    extension = os.path.splitext(filename)[1]
+    if extension not in HLS_MIMETYPES:
+        return jsonify({'error': 'Type de fichier non supporté'}), 400
+    
+    # Les enregistrements terminés ont pu être rangés dans le stockage définitif
+    session_dir = os.path.abspath(os.path.join(video_capture_service.storage_path, session_id))
+    if not os.path.isdir(session_dir):
+        session_dir = os.path.abspath(os.path.join(video_capture_service.base_path, session_id))
+    response = send_from_directory(session_dir, filename, mimetype=HLS_MIMETYPES[extension])
+    
+    # La playlist évolue pendant l'enregistrement, les segments sont immuables
+    if extension == '.m3u8':
+        response.headers['Cache-Control'] = 'no-cache'
+    else:
+        response.headers['Cache-Control'] = 'public, max-age=86400, immutable'
+    return response
+
 @videos_bp.route('/thumbnail/<filename>', methods=['GET'])
 def get_thumbnail(filename):
     """Servir les thumbnails (simulation pour le MVP)"""
@@ -496,6 +919,70 @@ def get_recording_status_by_id(recording_id):
         logger.error(f"Erreur lors de la récupération du statut: {e}")
         return jsonify({'error': 'Erreur lors de la récupération du statut'}), 500
 
+@videos_bp.route('/recording/capacity', methods=['GET'])
+def get_recording_capacity():
+    """Occupation des slots d'encodage du nœud"""
+    user = get_current_user()
+    if not user:
+        return jsonify({'error': 'Non authentifié'}), 401
+    
+    return jsonify(video_capture_service.encoder_pool.get_stats()), 200
+
+@videos_bp.route('/recording/startup-metrics', methods=['GET'])
+def get_recording_startup_metrics():
+    """Délai de première image des derniers enregistrements (préchauffés ou non)"""
+    user = get_current_user()
+    if not user:
+        return jsonify({'error': 'Non authentifié'}), 401
+    
+    return jsonify(video_capture_service.get_startup_stats()), 200
+
+@videos_bp.route('/cameras/health', methods=['GET'])
+def get_cameras_health():
+    """État des caméras de tous les terrains, tel que relevé par la dernière sonde"""
+    user = get_current_user()
+    if not user:
+        return jsonify({'error': 'Non authentifié'}), 401
+    
+    courts = Court.query.order_by(Court.id).all()
+    return jsonify({
+        'scanner': camera_health_scanner.get_stats(),
+        'courts': [
+            {'court_id': court.id, 'name': court.name, 'club_id': court.club_id, **court.camera_health()}
+            for court in courts
+        ]
+    }), 200
+
+@videos_bp.route('/storage/stats', methods=['GET'])
+def get_storage_stats():
+    """Espace du volume d'enregistrement, réservations en cours et rétention"""
+    user = get_current_user()
+    if not user:
+        return jsonify({'error': 'Non authentifié'}), 401
+    
+    return jsonify({
+        'volume': video_capture_service.admission.get_stats(),
+        'retention': video_capture_service.retention.get_stats()
+    }), 200
+
+@videos_bp.route('/preroll', methods=['GET'])
+def get_preroll_buffers():
+    """Tampons de pré-enregistrement du nœud (durée disponible, disque occupé)"""
+    user = get_current_user()
+    if not user:
+        return jsonify({'error': 'Non authentifié'}), 401
+    
+    return jsonify(video_capture_service.preroll.get_stats()), 200
+
+@videos_bp.route('/processing/stats', methods=['GET'])
+def get_processing_stats():
+    """Files et durées des étapes de post-traitement des enregistrements"""
+    user = get_current_user()
+    if not user:
+        return jsonify({'error': 'Non authentifié'}), 401
+    
+    return jsonify(video_capture_service.get_processing_stats()), 200
+
 @videos_bp.route('/recording/<recording_id>/stop', methods=['POST'])
 def stop_recording_by_id(recording_id):
     """Arrêter un enregistrement spécifique par son ID avec le service de capture"""
@@ -550,8 +1037,9 @@ def get_available_courts():
         # Récupérer tous les terrains non occupés
         courts = Court.query.filter_by(is_recording=False).all()
         
-        # Grouper par club
+        # Grouper par club (état caméra issu de la dernière sonde, jamais d'appel réseau ici)
         courts_by_club = {}
+        recordable = 0
         for court in courts:
             club = Club.query.get(court.club_id)
             if club:
@@ -560,11 +1048,15 @@ def get_available_courts():
                         'club': club.to_dict(),
                         'courts': []
                     }
-                courts_by_club[club.id]['courts'].append(court.to_dict())
+                court_data = court.to_dict()
+                court_data['recordable'] = court.camera_status != 'offline'
+                recordable += court_data['recordable']
+                courts_by_club[club.id]['courts'].append(court_data)
         
         return jsonify({
             'available_courts': list(courts_by_club.values()),
-            'total_available': len(courts)
+            'total_available': len(courts),
+            'total_recordable': recordable
         }), 200
         
     except Exception as e:
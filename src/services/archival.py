@@ -0,0 +1,289 @@
+"""
+Archivage des vidéos anciennes - Réencodage en heures creuses pour réduire le stockage
+Les vidéos plus anciennes que le seuil sont réencodées avec un preset plus lent et plus
+efficace, uniquement quand aucun enregistrement n'occupe le nœud. Le résultat est vérifié
+(durée identique à l'original) puis substitué à l'original par un renommage atomique.
+"""
+
+import os
+import time
+import logging
+import threading
+import subprocess
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Any, List, Tuple
+
+from ..models.database import db
+from ..models.user import Video, Court, StoredMedia, ActiveRecording
+from .keyframe_index import KeyframeIndex
+from .media_probe import probe_media_file
+from .node_ledger import NodeLeaderLock
+from .video_capture_service import video_capture_service
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_hours(value: str) -> Tuple[int, int]:
+    """Plage horaire 'début-fin' (heures locales, fin exclue, peut passer minuit)"""
+    start, end = value.split('-')
+    return int(start) % 24, int(end) % 24
+
+
+class ArchiveInterrupted(Exception):
+    """Un enregistrement a démarré pendant le réencodage"""
+    pass
+
+
+class ArchivalService:
+    """Réencodage d'archivage, un fichier à la fois, par un seul worker du nœud"""
+
+    def __init__(self, lock_path: str = "static/.archival.lock", after_days: int = None,
+                 off_peak_hours: str = None, interval: float = 600):
+        self.after_days = after_days if after_days is not None else int(os.environ.get('PADELVAR_ARCHIVE_AFTER_DAYS', 7))
+        self.off_peak_hours = _parse_hours(off_peak_hours or os.environ.get('PADELVAR_ARCHIVE_HOURS', '1-7'))
+        self.interval = interval
+        self.preset = os.environ.get('PADELVAR_ARCHIVE_PRESET', 'slower')
+        self.crf = int(os.environ.get('PADELVAR_ARCHIVE_CRF', 26))
+        self.threads = int(os.environ.get('PADELVAR_ARCHIVE_THREADS', max(1, (os.cpu_count() or 1) // 2)))
+        self.niceness = 19
+        # Un gain plus faible ne vaut pas une génération de perte de qualité
+        self.min_saving_ratio = 0.10
+        self.batch_size = 20
+        self.poll_interval = 2.0
+
+        self._thread: Optional[threading.Thread] = None
+        self.leader_lock = NodeLeaderLock(lock_path)
+        self._app = None
+        self._run_lock = threading.Lock()
+        self.total_archived = 0
+        self.total_saved_bytes = 0
+        self.total_failed = 0
+        self.total_interrupted = 0
+        self.last_run: Optional[Dict[str, Any]] = None
+
+    def start(self, app):
+        """Démarrer la boucle d'archivage en arrière-plan (une fois par worker)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._app = app
+        self._thread = threading.Thread(target=self._loop, name='archival', daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while True:
+            time.sleep(self.interval)
+            if not self.in_off_peak_window():
+                continue
+            with self._app.app_context():
+                try:
+                    if self.nodes_idle():
+                        self.run()
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Erreur lors de l'archivage: {e}")
+
+    def in_off_peak_window(self, now: Optional[datetime] = None) -> bool:
+        hour = (now or datetime.now()).hour
+        start, end = self.off_peak_hours
+        return start <= hour < end if start <= end else hour >= start or hour < end
+
+    def nodes_idle(self) -> bool:
+        """Aucun enregistrement sur ce nœud (tous workers) ni encodeur en attente
+
+        Les tampons de pré-enregistrement tournent en permanence: ils ne comptent pas.
+        """
+        recordings = ActiveRecording.query.filter(
+            ActiveRecording.node == video_capture_service.registry.node,
+            ActiveRecording.result.is_(None)
+        ).count()
+        if recordings:
+            return False
+        stats = video_capture_service.encoder_pool.get_stats()
+        jobs = stats['running'] + stats['pending']
+        return all(job['session_id'].startswith('preroll_') for job in jobs)
+
+    def candidates(self, limit: int) -> List[Video]:
+        """Vidéos MP4 prêtes, plus anciennes que le seuil et pas encore archivées"""
+        threshold = datetime.utcnow() - timedelta(days=self.after_days)
+        return (Video.query
+                .filter(Video.archived_at.is_(None), Video.processing_status == 'ready',
+                        Video.file_url.like('%.mp4'), Video.recorded_at < threshold)
+                .order_by(Video.recorded_at)
+                .limit(limit)
+                .all())
+
+    def run(self, limit: int = None) -> Dict[str, Any]:
+        """Archiver les candidats tant que le nœud reste inoccupé; rapport par club"""
+        report = {'archived': 0, 'skipped': 0, 'failed': 0, 'interrupted': False,
+                  'saved_bytes': 0, 'saved_bytes_by_club': {}}
+        if not self.leader_lock.acquire() or not self._run_lock.acquire(blocking=False):
+            report['skipped_reason'] = 'archivage déjà en cours'
+            return report
+        try:
+            for video in self.candidates(limit or self.batch_size):
+                if not self.nodes_idle():
+                    report['interrupted'] = True
+                    break
+                try:
+                    saved = self.archive(video)
+                except ArchiveInterrupted:
+                    report['interrupted'] = True
+                    self.total_interrupted += 1
+                    break
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Archivage impossible de la vidéo {video.id}: {e}")
+                    # Original conservé; la vidéo n'est pas reprise à chaque passage
+                    video.archived_at = datetime.utcnow()
+                    video.archive_saved_bytes = 0
+                    db.session.commit()
+                    report['failed'] += 1
+                    self.total_failed += 1
+                    continue
+                if saved is None:
+                    report['skipped'] += 1
+                    continue
+                court = Court.query.get(video.court_id)
+                club_id = court.club_id if court else None
+                by_club = report['saved_bytes_by_club']
+                by_club[str(club_id)] = by_club.get(str(club_id), 0) + saved
+                report['archived'] += 1
+                report['saved_bytes'] += saved
+        finally:
+            self._run_lock.release()
+
+        self.last_run = dict(report, finished_at=datetime.utcnow().isoformat())
+        if report['archived'] or report['failed']:
+            logger.info(f"Archivage: {report}")
+        return report
+
+    def archive(self, video: Video) -> Optional[int]:
+        """Réencoder une vidéo et substituer le fichier; retourne les octets gagnés
+
+        None si le gain est insuffisant (l'original est conservé). La vidéo est
+        marquée archivée dans les deux cas pour ne pas être réessayée.
+        """
+        source = video_capture_service.resolve_media_path(video)
+        if not source or not os.path.exists(source):
+            raise FileNotFoundError("Média de la vidéo introuvable")
+        original = probe_media_file(source, keyframe_window=0)
+        if not original or not original.get('duration'):
+            raise RuntimeError("Durée de l'original illisible")
+
+        # Même dossier que l'original: le renommage final reste atomique
+        temporary_path = f"{source}.archive.{os.getpid()}.tmp"
+        try:
+            self._encode(source, temporary_path)
+            archived = probe_media_file(temporary_path, keyframe_window=0)
+            tolerance = max(0.5, original['duration'] * 0.005)
+            if not archived or not archived.get('duration') \
+                    or abs(archived['duration'] - original['duration']) > tolerance:
+                raise RuntimeError(f"Durée réencodée {archived and archived.get('duration')}s "
+                                   f"différente de l'original ({original['duration']}s)")
+
+            original_size = os.path.getsize(source)
+            archived_size = os.path.getsize(temporary_path)
+            if archived_size > original_size * (1 - self.min_saving_ratio):
+                os.remove(temporary_path)
+                video.archived_at = datetime.utcnow()
+                video.archive_saved_bytes = 0
+                db.session.commit()
+                logger.info(f"Vidéo {video.id} conservée telle quelle (gain insuffisant)")
+                return None
+
+            with open(temporary_path, 'rb') as archived_file:
+                os.fsync(archived_file.fileno())
+            os.replace(temporary_path, source)
+        except BaseException:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
+
+        saved = original_size - archived_size
+        self._after_swap(video, source, archived, archived_size, saved)
+        self.total_archived += 1
+        self.total_saved_bytes += saved
+        logger.info(f"Vidéo {video.id} archivée: {original_size // 1024 ** 2} Mo -> "
+                    f"{archived_size // 1024 ** 2} Mo")
+        return saved
+
+    def _encode(self, source: str, output: str):
+        """Réencodage à basse priorité, abandonné dès qu'un enregistrement démarre"""
+        command = [
+            'ffmpeg', '-y', '-v', 'error', '-i', source,
+            '-map', '0:v:0', '-map', '0:a?',
+            '-c:v', 'libx264', '-preset', self.preset, '-crf', str(self.crf),
+            '-c:a', 'copy', '-threads', str(self.threads),
+            '-movflags', '+faststart', '-f', 'mp4', output
+        ]
+        process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                   preexec_fn=lambda: os.nice(self.niceness))
+        try:
+            while process.poll() is None:
+                time.sleep(self.poll_interval)
+                if not self.nodes_idle():
+                    process.terminate()
+                    process.wait(timeout=10)
+                    raise ArchiveInterrupted("Enregistrement démarré, archivage suspendu")
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+        if process.returncode != 0:
+            stderr = process.stderr.read().decode('utf-8', 'replace').strip()
+            raise RuntimeError(stderr[-200:] or f"FFmpeg a échoué (code {process.returncode})")
+
+    def _after_swap(self, video: Video, path: str, metadata: Dict[str, Any], size: int, saved: int):
+        """Mettre à jour vidéo, index des images clés, empreinte, index de rétention et quota"""
+        video.file_size = size
+        video.bitrate = metadata.get('bitrate')
+        video.checksum = video_capture_service.compute_checksum([path])
+        video.archived_at = datetime.utcnow()
+        video.archive_saved_bytes = saved
+
+        sizes = {path: size}
+        try:
+            index_path = KeyframeIndex.build(path)
+            sizes[index_path] = os.path.getsize(index_path)
+        except Exception as e:
+            # Reconstruit à la première recherche (index plus ancien que le média)
+            logger.warning(f"Index des images clés non reconstruit pour la vidéo {video.id}: {e}")
+
+        court = Court.query.get(video.court_id)
+        club_id = court.club_id if court else None
+        for media_path, media_size in sizes.items():
+            StoredMedia.query.filter(
+                StoredMedia.video_id == video.id, StoredMedia.path == media_path,
+                StoredMedia.deleted_at.is_(None)
+            ).update({StoredMedia.size_bytes: media_size}, synchronize_session=False)
+        video_capture_service.retention._adjust_usage({club_id: -saved})
+        db.session.commit()
+
+    def saved_by_club(self) -> List[Dict[str, Any]]:
+        """Octets gagnés par l'archivage, cumulés par club"""
+        rows = (db.session.query(Court.club_id, db.func.count(Video.id),
+                                 db.func.coalesce(db.func.sum(Video.archive_saved_bytes), 0))
+                .join(Court, Video.court_id == Court.id)
+                .filter(Video.archived_at.isnot(None))
+                .group_by(Court.club_id)
+                .all())
+        return [{'club_id': club_id, 'archived_videos': count, 'saved_bytes': int(saved)}
+                for club_id, count, saved in rows]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'after_days': self.after_days,
+            'off_peak_hours': '%d-%d' % self.off_peak_hours,
+            'preset': self.preset,
+            'crf': self.crf,
+            'leader': self.leader_lock.held,
+            'total_archived': self.total_archived,
+            'total_saved_bytes': self.total_saved_bytes,
+            'total_failed': self.total_failed,
+            'total_interrupted': self.total_interrupted,
+            'last_run': self.last_run
+        }
+
+
+# Instance globale du service d'archivage
+archival_service = ArchivalService()
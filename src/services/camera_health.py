@@ -0,0 +1,146 @@
+"""
+Surveillance des caméras - Sonde périodique et concurrente de toutes les caméras
+Les résultats (joignabilité, latence, paramètres du flux) sont conservés sur chaque
+terrain: les routes les lisent en base sans jamais attendre une caméra.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Optional, Any, List
+
+from ..models.database import db
+from ..models.user import Court
+from .media_probe import probe_stream
+from .node_ledger import NodeLeaderLock
+from .video_capture_service import video_capture_service
+
+logger = logging.getLogger(__name__)
+
+CAMERA_STATUSES = ('unknown', 'online', 'offline')
+
+
+class CameraHealthScanner:
+    """Sonde toutes les caméras en parallèle (pool borné) et enregistre leur état
+
+    Un seul worker par nœud sonde (verrou fichier), tous lisent le résultat en base.
+    """
+
+    def __init__(self, lock_path: str = "static/.camera_scan.lock", max_workers: int = None,
+                 probe_timeout: float = None, interval: float = None):
+        self.max_workers = max_workers or int(os.environ.get('PADELVAR_CAMERA_SCAN_WORKERS', 8))
+        self.probe_timeout = probe_timeout or float(os.environ.get('PADELVAR_CAMERA_PROBE_TIMEOUT', 5))
+        self.interval = interval or float(os.environ.get('PADELVAR_CAMERA_SCAN_INTERVAL', 60))
+
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='camera-probe')
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.leader_lock = NodeLeaderLock(lock_path)
+        self._app = None
+
+        self.last_scan_at: Optional[datetime] = None
+        self.last_scan_seconds: Optional[float] = None
+        self.scans = 0
+
+    def start(self, app):
+        """Démarrer la boucle de sonde en arrière-plan (une fois par worker)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._app = app
+        self._thread = threading.Thread(target=self._loop, name='camera-health-scanner', daemon=True)
+        self._thread.start()
+
+    def request_scan(self):
+        """Avancer la prochaine sonde (caméra ajoutée ou modifiée)"""
+        self._wake.set()
+
+    def _loop(self):
+        while True:
+            if self.leader_lock.acquire():
+                with self._app.app_context():
+                    try:
+                        self.scan_all()
+                    except Exception as e:
+                        db.session.rollback()
+                        logger.error(f"Erreur lors de la sonde des caméras: {e}")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def scan_all(self) -> List[Dict[str, Any]]:
+        """Sonder toutes les caméras en parallèle et enregistrer les résultats"""
+        started = time.monotonic()
+        targets = [(court.id, court.camera_url) for court in Court.query.all() if court.camera_url]
+
+        # Les sondes tournent hors contexte d'application: seuls les résultats touchent la base
+        results = list(self._executor.map(lambda target: self._probe(*target), targets))
+
+        for result in results:
+            Court.query.filter_by(id=result['court_id'], camera_url=result['camera_url']).update(
+                self._columns(result), synchronize_session=False
+            )
+        db.session.commit()
+
+        self.last_scan_at = datetime.utcnow()
+        self.last_scan_seconds = round(time.monotonic() - started, 3)
+        self.scans += 1
+        offline = [r['court_id'] for r in results if r['status'] == 'offline']
+        if offline:
+            logger.warning(f"Caméras injoignables: terrains {offline}")
+        logger.debug(f"{len(results)} caméras sondées en {self.last_scan_seconds}s")
+        return results
+
+    def _probe(self, court_id: int, camera_url: str) -> Dict[str, Any]:
+        # Un terrain ingéré reçoit déjà le flux: pas de connexion supplémentaire à la caméra
+        ingest = video_capture_service.preroll
+        if ingest.is_live(court_id):
+            info = ingest.source_info(court_id)
+            if info and info.get('video_codec'):
+                return {'court_id': court_id, 'camera_url': camera_url, 'status': 'online',
+                        'latency_ms': None, 'info': info, 'error': None}
+
+        started = time.monotonic()
+        try:
+            info = probe_stream(camera_url, timeout=self.probe_timeout)
+        except Exception as e:
+            logger.error(f"Sonde de la caméra du terrain {court_id} impossible: {e}")
+            info = None
+        latency_ms = int((time.monotonic() - started) * 1000)
+
+        if info and info.get('video_codec'):
+            return {'court_id': court_id, 'camera_url': camera_url, 'status': 'online',
+                    'latency_ms': latency_ms, 'info': info, 'error': None}
+        return {'court_id': court_id, 'camera_url': camera_url, 'status': 'offline',
+                'latency_ms': None, 'info': None,
+                'error': 'Aucun flux vidéo' if info else 'Caméra injoignable ou sonde expirée'}
+
+    @staticmethod
+    def _columns(result: Dict[str, Any]) -> Dict[str, Any]:
+        columns = {
+            'camera_status': result['status'],
+            'camera_latency_ms': result['latency_ms'],
+            'camera_error': result['error'],
+            'camera_checked_at': datetime.utcnow()
+        }
+        if result['info']:
+            # Derniers paramètres connus conservés même si la caméra tombe
+            columns['camera_info'] = json.dumps(result['info'])
+        return columns
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'max_workers': self.max_workers,
+            'probe_timeout': self.probe_timeout,
+            'interval': self.interval,
+            'leader': self.leader_lock.held,
+            'scans': self.scans,
+            'last_scan_at': self.last_scan_at.isoformat() if self.last_scan_at else None,
+            'last_scan_seconds': self.last_scan_seconds
+        }
+
+
+# Instance globale du scanner
+camera_health_scanner = CameraHealthScanner()
@@ -0,0 +1,200 @@
+"""
+Extraits de vidéos - Découpe par copie du flux entre images clés
+Seuls les morceaux de GOP aux bords sont réencodés quand une coupe à l'image
+près est demandée. Les découpes passent par un pool de workers borné.
+"""
+
+import os
+import shutil
+import logging
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional, Any, List, Tuple
+
+from ..models.database import db
+from ..models.user import Video, VideoClip, Court
+from .keyframe_index import KeyframeIndex
+from .media_probe import probe_media_file, probe_stream
+from .video_capture_service import video_capture_service
+
+logger = logging.getLogger(__name__)
+
+# Un morceau: (début, fin, 'copy' | 'encode')
+ClipPart = Tuple[float, float, str]
+
+
+class ClipQueueFullError(Exception):
+    """Trop de découpes en attente"""
+    pass
+
+
+def plan_clip(index: KeyframeIndex, start: float, end: float, accurate: bool) -> Tuple[float, List[ClipPart]]:
+    """Découper [start, end) en morceaux copiés ou réencodés; retourne (début effectif, morceaux)
+
+    En mode rapide le début recule jusqu'à l'image clé précédente et tout est copié.
+    En mode précis, seuls [start, 1re image clé) et [dernière image clé, end) sont réencodés.
+    """
+    if not accurate:
+        keyframe = index.at_or_before(start)
+        actual_start = keyframe if keyframe is not None else 0.0
+        return actual_start, [(actual_start, end, 'copy')]
+
+    first_keyframe = index.at_or_after(start)
+    if first_keyframe is None or first_keyframe >= end - 1e-3:
+        # Extrait contenu dans un seul GOP: court, on le réencode entièrement
+        return start, [(start, end, 'encode')]
+
+    parts: List[ClipPart] = []
+    if first_keyframe > start + 1e-3:
+        parts.append((start, first_keyframe, 'encode'))
+    last_keyframe = index.at_or_before(end)
+    if last_keyframe > first_keyframe + 1e-3 and not index.is_keyframe(end):
+        parts.append((first_keyframe, last_keyframe, 'copy'))
+        parts.append((last_keyframe, end, 'encode'))
+    else:
+        parts.append((first_keyframe, end, 'copy'))
+    return start, parts
+
+
+class ClipService:
+    """Création des extraits en arrière-plan, sur un nombre borné de workers"""
+
+    def __init__(self, output_path: str = "static/clips", max_workers: int = None,
+                 max_pending: int = 20, max_clip_seconds: float = None):
+        self.output_path = Path(output_path)
+        self.max_workers = max_workers or int(os.environ.get('PADELVAR_CLIP_WORKERS', 2))
+        self.max_pending = max_pending
+        self.max_clip_seconds = max_clip_seconds or float(os.environ.get('PADELVAR_MAX_CLIP_SECONDS', 600))
+        self.ffmpeg_timeout = 600
+        # Morceaux intermédiaires en MPEG-TS: SPS/PPS répétés dans le flux, les bords
+        # réencodés et le cœur copié restent décodables une fois concaténés
+        self.part_format = ('mpegts', '.ts')
+
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='clip')
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.completed = 0
+        self.failed = 0
+
+    def submit(self, app, clip_id: int):
+        """Confier une découpe au pool (ClipQueueFullError si la file est pleine)"""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise ClipQueueFullError("Trop d'extraits en cours de création, réessayez plus tard")
+            self._pending += 1
+        self._executor.submit(self._run, app, clip_id)
+
+    def _run(self, app, clip_id: int):
+        try:
+            with app.app_context():
+                clip = VideoClip.query.get(clip_id)
+                if not clip:
+                    return
+                clip.status = 'processing'
+                db.session.commit()
+                try:
+                    self._extract(clip)
+                    clip.status = 'ready'
+                    self.completed += 1
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Découpe de l'extrait {clip_id} impossible: {e}")
+                    clip.status = 'failed'
+                    clip.error = str(e)[:255]
+                    self.failed += 1
+                clip.completed_at = datetime.utcnow()
+                db.session.commit()
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _extract(self, clip: VideoClip):
+        video = Video.query.get(clip.video_id)
+        source = video_capture_service.resolve_media_path(video)
+        if not source or not os.path.exists(source):
+            raise FileNotFoundError("Média de la vidéo introuvable")
+
+        with KeyframeIndex.load_or_build(source) as index:
+            actual_start, parts = plan_clip(index, clip.start_time, clip.end_time, clip.accurate)
+        # Les bords réencodés gardent l'échantillonnage couleur de la source
+        source_info = probe_stream(source) if any(part[2] == 'encode' for part in parts) else None
+        pix_fmt = (source_info or {}).get('pix_fmt') or 'yuv420p'
+
+        directory = self.output_path / str(video.id)
+        directory.mkdir(parents=True, exist_ok=True)
+        output = directory / f"clip_{clip.id}.mp4"
+
+        if len(parts) == 1 and parts[0][2] == 'copy':
+            self._ffmpeg(self._part_command(source, parts[0], str(output), 'mp4', pix_fmt))
+        else:
+            # Morceaux intermédiaires puis concaténation sans réencodage
+            container, extension = self.part_format
+            work_dir = tempfile.mkdtemp(prefix=f"clip_{clip.id}_", dir=directory.resolve())
+            try:
+                list_path = os.path.join(work_dir, 'parts.txt')
+                with open(list_path, 'w') as part_list:
+                    for number, part in enumerate(parts):
+                        part_path = os.path.join(work_dir, f"part_{number}{extension}")
+                        self._ffmpeg(self._part_command(source, part, part_path, container, pix_fmt))
+                        part_list.write(f"file '{part_path}'\n")
+                self._ffmpeg([
+                    'ffmpeg', '-y', '-v', 'error', '-f', 'concat', '-safe', '0', '-i', list_path,
+                    '-c', 'copy', '-movflags', '+faststart', str(output)
+                ])
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+        metadata = probe_media_file(str(output), keyframe_window=0) or {}
+        clip.actual_start = round(actual_start, 3)
+        clip.duration = metadata.get('duration')
+        clip.file_path = str(output)
+        clip.file_size = output.stat().st_size
+
+        # Même rétention et même quota que la vidéo d'origine
+        court = Court.query.get(video.court_id)
+        video_capture_service.retention.register(
+            video, court.club_id if court else None, [('clip', clip.file_path, clip.file_size)]
+        )
+        logger.info(f"Extrait {clip.id} créé ({len(parts)} morceau(x), "
+                    f"{sum(1 for part in parts if part[2] == 'encode')} réencodé(s)): {output}")
+
+    @staticmethod
+    def _part_command(source: str, part: ClipPart, output: str, container: str, pix_fmt: str) -> List[str]:
+        start, end, method = part
+        command = [
+            'ffmpeg', '-y', '-v', 'error',
+            '-ss', f"{start:.6f}", '-i', source, '-t', f"{end - start:.6f}",
+            '-map', '0:v:0', '-map', '0:a?'
+        ]
+        if method == 'copy':
+            command += ['-c', 'copy', '-avoid_negative_ts', 'make_zero']
+        else:
+            # Bord de GOP: quelques images seulement, qualité quasi transparente
+            command += ['-c:v', 'libx264', '-preset', 'veryfast', '-crf', '18', '-pix_fmt', pix_fmt,
+                        '-c:a', 'aac', '-b:a', '128k']
+        if container == 'mp4':
+            command += ['-movflags', '+faststart']
+        return command + ['-f', container, output]
+
+    def _ffmpeg(self, command: List[str]):
+        result = subprocess.run(command, capture_output=True, timeout=self.ffmpeg_timeout)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.decode('utf-8', 'replace').strip()[-200:] or
+                               f"FFmpeg a échoué (code {result.returncode})")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'max_workers': self.max_workers,
+            'pending': self._pending,
+            'max_pending': self.max_pending,
+            'completed': self.completed,
+            'failed': self.failed
+        }
+
+
+# Instance globale du service d'extraits
+clip_service = ClipService()
@@ -0,0 +1,203 @@
+"""
+Activité des terrains - Arrêt anticipé des enregistrements d'un terrain déserté
+Les images d'analyse de l'ingestion (anneau partagé, niveaux de gris basse résolution)
+sont réduites encore puis comparées environ une fois par seconde. Sans mouvement
+pendant le délai configuré, la session est arrêtée comme à son expiration
+(stopped_by='auto'): le terrain et l'encodeur sont libérés plus tôt.
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Dict, Optional, Any
+
+import numpy as np
+
+from ..models.database import db
+from ..models.user import RecordingSession
+from .shared_frames import SharedFrameRing
+from .node_ledger import NodeLeaderLock
+from .video_capture_service import video_capture_service
+
+logger = logging.getLogger(__name__)
+
+
+def downscale(frame: np.ndarray, factor: int = 2) -> np.ndarray:
+    """Moyenne par blocs factor x factor: divise la résolution et lisse le bruit du capteur"""
+    height = frame.shape[0] // factor * factor
+    width = frame.shape[1] // factor * factor
+    blocks = frame[:height, :width].reshape(height // factor, factor, width // factor, factor)
+    return blocks.mean(axis=(1, 3), dtype=np.float32)
+
+
+def motion_ratio(previous: np.ndarray, current: np.ndarray, pixel_threshold: float = 12.0) -> float:
+    """Part des pixels qui ont changé de plus de pixel_threshold niveaux entre deux images"""
+    return float(np.count_nonzero(np.abs(current - previous) > pixel_threshold)) / current.size
+
+
+class CourtActivity:
+    """Suivi du mouvement d'un terrain enregistré"""
+
+    def __init__(self, recording_id: str):
+        self.recording_id = recording_id
+        self.ring: Optional[SharedFrameRing] = None
+        self.previous: Optional[np.ndarray] = None
+        self.seq = 0
+        self.last_frame_at: Optional[float] = None
+        self.last_motion_at: Optional[float] = None
+        self.motion: Optional[float] = None
+
+    def reset(self):
+        """Flux perdu: le délai d'inactivité repart de zéro au retour des images"""
+        if self.ring:
+            self.ring.close()
+        self.ring = None
+        self.previous = None
+        self.seq = 0
+        self.last_frame_at = None
+        self.last_motion_at = None
+        self.motion = None
+
+    @property
+    def idle_seconds(self) -> float:
+        if self.last_frame_at is None or self.last_motion_at is None:
+            return 0.0
+        return self.last_frame_at - self.last_motion_at
+
+
+class CourtActivityMonitor:
+    """Détection des terrains inoccupés pendant un enregistrement (un worker par nœud)"""
+
+    def __init__(self, lock_path: str = "static/.court_activity.lock", idle_minutes: float = None,
+                 motion_threshold: float = None, sample_interval: float = 1.0):
+        # 0: arrêt anticipé désactivé
+        self.idle_minutes = idle_minutes if idle_minutes is not None else \
+            float(os.environ.get('PADELVAR_AUTO_STOP_IDLE_MINUTES', 0))
+        # Part minimale de pixels modifiés pour considérer qu'il y a du jeu
+        self.motion_threshold = motion_threshold if motion_threshold is not None else \
+            float(os.environ.get('PADELVAR_AUTO_STOP_MOTION', 0.002))
+        self.sample_interval = sample_interval
+        self.pixel_threshold = 12.0
+        self.refresh_interval = 15.0
+        # Image plus ancienne: ingestion arrêtée, aucune conclusion possible
+        self.stale_after = 5.0
+
+        self._courts: Dict[int, CourtActivity] = {}
+        self._refreshed_at = 0.0
+        self._thread: Optional[threading.Thread] = None
+        self.leader_lock = NodeLeaderLock(lock_path)
+        self._app = None
+        self.auto_stopped = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.idle_minutes > 0
+
+    def start(self, app):
+        """Démarrer la surveillance en arrière-plan (une fois par worker, si activée)"""
+        if not self.enabled or (self._thread and self._thread.is_alive()):
+            return
+        self._app = app
+        self._thread = threading.Thread(target=self._loop, name='court-activity', daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while True:
+            time.sleep(self.sample_interval)
+            if not self.leader_lock.acquire():
+                continue
+            with self._app.app_context():
+                try:
+                    self.tick()
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Erreur lors de la surveillance de l'activité des terrains: {e}")
+
+    def tick(self):
+        """Échantillonner chaque terrain enregistré et arrêter les sessions inactives"""
+        now = time.monotonic()
+        if now - self._refreshed_at >= self.refresh_interval:
+            self._refresh()
+            self._refreshed_at = now
+
+        for court_id, activity in list(self._courts.items()):
+            self.sample(court_id, activity)
+            if activity.idle_seconds >= self.idle_minutes * 60:
+                self._auto_stop(court_id, activity)
+
+    def _refresh(self):
+        """Suivre les sessions actives (les terrains sans tampon vivant sont ignorés)"""
+        sessions = RecordingSession.query.filter_by(status='active').all()
+        active = {recording_session.court_id: recording_session.recording_id for recording_session in sessions}
+        for court_id in list(self._courts):
+            if active.get(court_id) != self._courts[court_id].recording_id:
+                self._courts.pop(court_id).reset()
+        for court_id, recording_id in active.items():
+            if court_id not in self._courts:
+                self._courts[court_id] = CourtActivity(recording_id)
+
+    def sample(self, court_id: int, activity: CourtActivity):
+        """Comparer la dernière image d'analyse à celle de l'échantillon précédent"""
+        if activity.ring is None or activity.ring.replaced():
+            activity.reset()
+            activity.ring = video_capture_service.preroll.analysis_feed(court_id)
+            if activity.ring is None:
+                return
+
+        latest = activity.ring.latest()
+        if not latest or time.time() - latest[1] > self.stale_after:
+            activity.reset()
+            return
+        seq, timestamp, frame = latest
+        if seq == activity.seq:
+            return
+
+        current = downscale(frame)
+        if activity.previous is None:
+            activity.last_motion_at = timestamp
+        else:
+            activity.motion = motion_ratio(activity.previous, current, self.pixel_threshold)
+            if activity.motion >= self.motion_threshold:
+                activity.last_motion_at = timestamp
+        activity.previous = current
+        activity.seq = seq
+        activity.last_frame_at = timestamp
+
+    def _auto_stop(self, court_id: int, activity: CourtActivity):
+        # Import local: les routes importent les services
+        from ..routes.recording import _stop_recording_session
+
+        idle_minutes = int(activity.idle_seconds // 60)
+        self._courts.pop(court_id).reset()
+        recording_session = RecordingSession.query.filter_by(
+            recording_id=activity.recording_id, status='active'
+        ).first()
+        if not recording_session:
+            return
+        _stop_recording_session(recording_session, 'auto', recording_session.user_id)
+        self.auto_stopped += 1
+        logger.info(f"Enregistrement {activity.recording_id} arrêté: terrain {court_id} "
+                    f"sans mouvement depuis {idle_minutes} min")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'enabled': self.enabled,
+            'idle_minutes': self.idle_minutes,
+            'motion_threshold': self.motion_threshold,
+            'leader': self.leader_lock.held,
+            'auto_stopped': self.auto_stopped,
+            'courts': {
+                court_id: {
+                    'recording_id': activity.recording_id,
+                    'watching': activity.ring is not None,
+                    'motion': activity.motion,
+                    'idle_seconds': round(activity.idle_seconds, 1)
+                }
+                for court_id, activity in list(self._courts.items())
+            }
+        }
+
+
+# Instance globale de la surveillance de l'activité des terrains
+court_activity_monitor = CourtActivityMonitor()
@@ -0,0 +1,187 @@
+"""
+Images fixes des terrains - Capture périodique et cache servi avec ETag
+Un seul worker du nœud capture (verrou fichier): l'image fixe de l'ingestion quand
+elle existe, sinon l'URL d'instantané de la caméra sur des connexions HTTP
+persistantes et mutualisées. Les pages (tableaux de bord, écran du QR code) lisent
+le cache mémoire et ne contactent jamais les caméras.
+"""
+
+import os
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional, Any, List
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ..models.database import db
+from ..models.user import Court
+from .node_ledger import NodeLeaderLock
+from .video_capture_service import video_capture_service
+
+logger = logging.getLogger(__name__)
+
+JPEG_START = b'\xff\xd8'
+
+
+class CourtSnapshot:
+    """Image fixe d'un terrain telle que servie (contenu, ETag, instant de capture)"""
+
+    def __init__(self, data: bytes, mtime_ns: int):
+        self.data = data
+        self.mtime_ns = mtime_ns
+        self.etag = hashlib.sha1(data).hexdigest()[:20]
+        self.captured_at = datetime.utcfromtimestamp(mtime_ns / 1e9)
+
+
+class CourtSnapshotter:
+    """Capture planifiée des images fixes et cache borné en mémoire"""
+
+    def __init__(self, directory: str = "static/snapshots", lock_path: str = "static/.snapshots.lock",
+                 interval: float = None, max_workers: int = None, cache_entries: int = 256):
+        self.directory = Path(directory)
+        self.interval = interval or float(os.environ.get('PADELVAR_SNAPSHOT_INTERVAL', 10))
+        self.max_workers = max_workers or int(os.environ.get('PADELVAR_SNAPSHOT_WORKERS', 8))
+        self.timeout = (2.0, 5.0)  # connexion, lecture
+        self.max_bytes = 5 * 1024 * 1024
+
+        # Connexions keep-alive réutilisées d'un cycle à l'autre (une par caméra)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=64, pool_maxsize=self.max_workers, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='snapshot')
+        self._cache: 'OrderedDict[int, CourtSnapshot]' = OrderedDict()
+        self._cache_entries = cache_entries
+        self._cache_lock = threading.Lock()
+        self._digests: Dict[int, str] = {}
+        self._thread: Optional[threading.Thread] = None
+        self.leader_lock = NodeLeaderLock(lock_path)
+        self._app = None
+        self.captures = 0
+        self.failures = 0
+        self.last_cycle_seconds: Optional[float] = None
+
+    # ------------------------------------------------------------------
+    # Capture (worker leader)
+    # ------------------------------------------------------------------
+
+    def start(self, app):
+        """Démarrer la boucle de capture en arrière-plan (une fois par worker)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._app = app
+        self._thread = threading.Thread(target=self._loop, name='court-snapshots', daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while True:
+            started = time.monotonic()
+            if self.leader_lock.acquire():
+                with self._app.app_context():
+                    try:
+                        self.capture_all()
+                    except Exception as e:
+                        db.session.rollback()
+                        logger.error(f"Erreur lors de la capture des images fixes: {e}")
+            time.sleep(max(1.0, self.interval - (time.monotonic() - started)))
+
+    def capture_all(self) -> List[Dict[str, Any]]:
+        """Capturer l'image fixe de chaque terrain en parallèle (hors contexte d'application)"""
+        started = time.monotonic()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        targets = [(court.id, court.snapshot_url) for court in Court.query.all()
+                   if court.snapshot_url or video_capture_service.preroll.is_live(court.id)]
+        results = list(self._executor.map(lambda target: self._capture(*target), targets))
+        self.last_cycle_seconds = round(time.monotonic() - started, 3)
+        return results
+
+    def _capture(self, court_id: int, snapshot_url: Optional[str]) -> Dict[str, Any]:
+        try:
+            data, source = self._fetch(court_id, snapshot_url)
+            # Image identique: le fichier (et donc l'ETag) ne change pas
+            digest = hashlib.sha1(data).hexdigest()
+            if self._digests.get(court_id) != digest:
+                path = self.path(court_id)
+                temporary_path = path.with_suffix('.tmp')
+                with open(temporary_path, 'wb') as snapshot_file:
+                    snapshot_file.write(data)
+                os.replace(temporary_path, path)
+                self._digests[court_id] = digest
+        except Exception as e:
+            self.failures += 1
+            logger.debug(f"Image fixe du terrain {court_id} indisponible: {e}")
+            return {'court_id': court_id, 'ok': False, 'error': str(e)}
+        self.captures += 1
+        return {'court_id': court_id, 'ok': True, 'source': source}
+
+    def _fetch(self, court_id: int, snapshot_url: Optional[str]) -> tuple:
+        """Image fixe de l'ingestion si elle est fraîche, sinon requête HTTP à la caméra"""
+        ingest_path = video_capture_service.preroll.snapshot_path(court_id)
+        if ingest_path:
+            with open(ingest_path, 'rb') as ingest_file:
+                return ingest_file.read(), 'ingest'
+        if not snapshot_url:
+            raise ValueError("Aucune source d'image fixe")
+
+        response = self.session.get(snapshot_url, timeout=self.timeout, stream=True)
+        try:
+            response.raise_for_status()
+            data = response.raw.read(self.max_bytes + 1, decode_content=True)
+        finally:
+            response.close()  # rend la connexion au pool
+        if len(data) > self.max_bytes or not data.startswith(JPEG_START):
+            raise ValueError("Réponse de la caméra qui n'est pas une image JPEG")
+        return data, 'camera'
+
+    # ------------------------------------------------------------------
+    # Lecture (tous les workers)
+    # ------------------------------------------------------------------
+
+    def path(self, court_id: int) -> Path:
+        return self.directory / f"court_{court_id}.jpg"
+
+    def get(self, court_id: int) -> Optional[CourtSnapshot]:
+        """Dernière image fixe d'un terrain, relue sur disque seulement si elle a changé"""
+        try:
+            mtime_ns = self.path(court_id).stat().st_mtime_ns
+        except OSError:
+            return None
+        with self._cache_lock:
+            snapshot = self._cache.get(court_id)
+            if snapshot and snapshot.mtime_ns == mtime_ns:
+                self._cache.move_to_end(court_id)
+                return snapshot
+        try:
+            with open(self.path(court_id), 'rb') as snapshot_file:
+                snapshot = CourtSnapshot(snapshot_file.read(), mtime_ns)
+        except OSError:
+            return None
+        with self._cache_lock:
+            self._cache[court_id] = snapshot
+            self._cache.move_to_end(court_id)
+            while len(self._cache) > self._cache_entries:
+                self._cache.popitem(last=False)
+        return snapshot
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'interval': self.interval,
+            'max_workers': self.max_workers,
+            'leader': self.leader_lock.held,
+            'captures': self.captures,
+            'failures': self.failures,
+            'last_cycle_seconds': self.last_cycle_seconds,
+            'cached_courts': len(self._cache)
+        }
+
+
+# Instance globale de la capture des images fixes
+court_snapshotter = CourtSnapshotter()
@@ -0,0 +1,555 @@
+"""
+Pool d'encodeurs supervisé - Limite le nombre d'encodeurs simultanés par nœud
+Les démarrages au-delà de la capacité sont mis en file d'attente ou refusés,
+les encodeurs FFmpeg qui plantent sont redémarrés automatiquement.
+Tous les encodeurs sont surveillés depuis une seule boucle asyncio: arrêts et
+fins de processus sont traités dès qu'ils surviennent, sans scrutation.
+"""
+
+import os
+import re
+import asyncio
+import concurrent.futures
+import time
+import threading
+import logging
+import subprocess
+from collections import deque
+from datetime import datetime
+from typing import Dict, Optional, Any, Callable, List
+
+from .node_ledger import NodeLedger
+
+logger = logging.getLogger(__name__)
+
+# Plafond du délai entre deux redémarrages (encodeurs permanents)
+MAX_RESTART_DELAY = 60.0
+# Durée de fonctionnement après laquelle un plantage ne compte plus les précédents
+STABLE_RUNTIME = 60.0
+# Dernières lignes de stderr conservées par encodeur (diagnostic des plantages)
+STDERR_TAIL_LINES = 20
+
+
+class EncoderPoolFullError(Exception):
+    """Aucun slot d'encodage libre et file d'attente pleine"""
+    pass
+
+
+class EncoderStartError(Exception):
+    """L'encodeur n'a pas pu être lancé (processus ou thread)"""
+    pass
+
+
+class EncoderJob:
+    """Encodeur géré par le pool (processus FFmpeg ou thread de fallback)"""
+
+    def __init__(self, session_id: str,
+                 command_factory: Optional[Callable[[int], List[str]]] = None,
+                 target: Optional[Callable[[], None]] = None,
+                 on_start: Optional[Callable[[str], None]] = None,
+                 on_exit: Optional[Callable[[str, Optional[int], str], None]] = None,
+                 cost: float = 1.0,
+                 on_output: Optional[Callable[[str], None]] = None,
+                 max_restarts: Optional[int] = None,
+                 output_frame_size: Optional[int] = None):
+        self.session_id = session_id
+        self.cost = cost
+        self.on_output = on_output
+        self.output_frame_size = output_frame_size
+        self.max_restarts = max_restarts
+        self.command_factory = command_factory
+        self.target = target
+        self.on_start = on_start
+        self.on_exit = on_exit
+
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.future: Optional[asyncio.Future] = None
+        self.task: Optional[asyncio.Task] = None
+        # Créés dans la boucle de supervision (_events) et jamais remplacés
+        self.stop_event: Optional[asyncio.Event] = None
+        self.exited: Optional[asyncio.Event] = None
+        self.stop_timeout: float = 10
+        self.attempt = 0
+        self.restarts = 0
+        self.spawned_at: Optional[float] = None
+        self.returncode: Optional[int] = None
+        self.stop_requested = False
+        self.queued_at = datetime.now()
+        self.started_at: Optional[datetime] = None
+        self.stderr_tail: deque = deque(maxlen=STDERR_TAIL_LINES)
+        self.stderr_reader: Optional[asyncio.Task] = None
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self.process.pid if self.process else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'session_id': self.session_id,
+            'pid': self.pid,
+            'kind': 'process' if self.command_factory else 'thread',
+            'cost': self.cost,
+            'attempt': self.attempt,
+            'restarts': self.restarts,
+            'queued_at': self.queued_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None
+        }
+
+
+class EncoderPool:
+    """Pool borné d'encodeurs dimensionné sur le nombre de cœurs du nœud
+
+    Avec un registre de nœud (ledger), les slots sont comptés pour tous les workers
+    du nœud: chaque encodeur lancé y prend un bail, rendu à sa fin.
+    """
+
+    def __init__(self, max_slots: int = None, max_queue: int = None,
+                 max_restarts: int = 3, restart_delay: float = 2.0,
+                 ledger: Optional[NodeLedger] = None, queue_poll_interval: float = 2.0):
+        cpu_count = os.cpu_count() or 1
+
+        # Un encodeur x264 720p occupe environ deux cœurs
+        self.max_slots = max_slots or int(
+            os.environ.get('PADELVAR_MAX_ENCODERS', max(1, cpu_count // 2))
+        )
+        self.max_queue = max_queue if max_queue is not None else int(
+            os.environ.get('PADELVAR_ENCODER_QUEUE', self.max_slots)
+        )
+        self.max_restarts = max_restarts
+        self.restart_delay = restart_delay
+        self.ledger = ledger
+        # File locale relancée quand un autre worker libère un slot
+        self.queue_poll_interval = queue_poll_interval
+
+        # Threads d'encodage attribués à chaque encodeur pour ne pas déborder du slot
+        self.threads_per_encoder = max(1, cpu_count // self.max_slots)
+
+        self._lock = threading.RLock()
+        self._running: Dict[str, EncoderJob] = {}
+        self._pending: deque = deque()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[threading.Thread] = None
+        self.total_restarts = 0
+        self.total_rejected = 0
+
+        logger.info(f"Pool d'encodeurs initialisé: {self.max_slots} slots, file de {self.max_queue}")
+
+    # ------------------------------------------------------------------
+    # API publique (appelée depuis les threads Flask)
+    # ------------------------------------------------------------------
+
+    def submit(self, session_id: str,
+               command_factory: Optional[Callable[[int], List[str]]] = None,
+               target: Optional[Callable[[], None]] = None,
+               on_start: Optional[Callable[[str], None]] = None,
+               on_exit: Optional[Callable[[str, Optional[int], str], None]] = None,
+               cost: float = 1.0,
+               on_output: Optional[Callable[[str], None]] = None,
+               max_restarts: Optional[int] = None,
+               queue: bool = True,
+               output_frame_size: Optional[int] = None) -> Dict[str, Any]:
+        """Soumettre un encodeur: démarrage immédiat, mise en file ou refus
+
+        command_factory(attempt) retourne la commande FFmpeg à lancer (attempt > 0
+        lors d'un redémarrage), target est un callable exécuté dans un thread
+        pour les encodeurs sans processus externe (fallback OpenCV).
+        cost est la part de slot consommée (un remux sans réencodage coûte
+        bien moins qu'un encodage x264).
+        on_output reçoit chaque ligne écrite par le processus sur stdout
+        (sortie -progress de FFmpeg), lue de façon asynchrone par la boucle;
+        avec output_frame_size, il reçoit des blocs binaires de cette taille
+        (images brutes) au lieu de lignes.
+        max_restarts remplace la limite du pool pour cet encodeur, et
+        queue=False refuse plutôt que de mettre en file (encodeurs permanents).
+        """
+        if not command_factory and not target:
+            raise ValueError("command_factory ou target requis")
+
+        job = EncoderJob(session_id, command_factory, target, on_start, on_exit, cost, on_output, max_restarts,
+                         output_frame_size)
+
+        with self._lock:
+            if session_id in self._running or any(j.session_id == session_id for j in self._pending):
+                raise ValueError(f"Encodeur déjà soumis pour {session_id}")
+
+            if not self._pending and self._claim(job):
+                self._running[session_id] = job
+                state = 'running'
+            elif queue and len(self._pending) < self.max_queue:
+                self._pending.append(job)
+                state = 'queued'
+            else:
+                self.total_rejected += 1
+                raise EncoderPoolFullError(
+                    f"Capacité d'encodage atteinte ({self.max_slots} slots, "
+                    f"{len(self._pending)} en attente)"
+                )
+
+        self._ensure_loop()
+
+        if state == 'running':
+            if not self._run_in_loop(self._start(job)):
+                return {'state': 'failed'}
+            return {'state': 'running', 'pid': job.pid}
+
+        logger.info(f"Encodeur {session_id} en file d'attente (position {self.queue_position(session_id)})")
+        return {'state': 'queued', 'queue_position': self.queue_position(session_id)}
+
+    def stop(self, session_id: str, timeout: float = 10) -> Optional[int]:
+        """Arrêter un encodeur (ou le retirer de la file) et attendre sa fin"""
+        future = self.request_stop(session_id, timeout)
+        if future is None:
+            return None
+        # Marge pour le kill qui suit un arrêt gracieux trop long
+        return future.result(timeout + 5)
+
+    def request_stop(self, session_id: str, timeout: float = 10) -> Optional[concurrent.futures.Future]:
+        """Demander l'arrêt sans attendre; le futur renvoyé aboutit au code de sortie
+
+        Retourne None si l'encodeur n'était qu'en file d'attente (ou inconnu).
+        """
+        with self._lock:
+            queued_job = next((j for j in self._pending if j.session_id == session_id), None)
+            if queued_job:
+                self._pending.remove(queued_job)
+            job = self._running.get(session_id)
+
+        if queued_job:
+            # Encodeur jamais démarré
+            self._notify_exit(queued_job, None, 'cancelled')
+            return None
+        if not job:
+            return None
+
+        return asyncio.run_coroutine_threadsafe(self._stop(job, timeout), self._loop)
+
+    def queue_position(self, session_id: str) -> Optional[int]:
+        """Position (1-indexée) d'une session dans la file d'attente"""
+        with self._lock:
+            for position, job in enumerate(self._pending, start=1):
+                if job.session_id == session_id:
+                    return position
+        return None
+
+    def set_cost(self, session_id: str, cost: float):
+        """Réévaluer la part de slot d'un encodeur (ex: passage du remux au réencodage)"""
+        with self._lock:
+            job = self._running.get(session_id)
+            if job:
+                job.cost = cost
+                if self.ledger:
+                    with self.ledger.transaction() as data:
+                        if session_id in data['slots']:
+                            data['slots'][session_id]['cost'] = cost
+
+    def get_job(self, session_id: str) -> Optional[EncoderJob]:
+        with self._lock:
+            return self._running.get(session_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Occupation des slots d'encodage"""
+        with self._lock:
+            used = self._used_capacity()
+            node_used = self._node_used_capacity() if self.ledger else used
+            return {
+                'max_slots': self.max_slots,
+                'used_slots': round(used, 2),
+                'node_used_slots': round(node_used, 2),
+                'free_slots': round(max(0, self.max_slots - node_used), 2),
+                'running_encoders': len(self._running),
+                'queued': len(self._pending),
+                'max_queue': self.max_queue,
+                'threads_per_encoder': self.threads_per_encoder,
+                'total_restarts': self.total_restarts,
+                'total_rejected': self.total_rejected,
+                'running': [job.to_dict() for job in self._running.values()],
+                'pending': [job.to_dict() for job in self._pending]
+            }
+
+    def _used_capacity(self) -> float:
+        return sum(job.cost for job in self._running.values())
+
+    def _has_capacity(self, cost: float) -> bool:
+        # Tolérance pour les coûts fractionnaires
+        return self._used_capacity() + cost <= self.max_slots + 1e-9
+
+    def _node_used_capacity(self) -> float:
+        return sum(lease['cost'] for lease in self.ledger.leases('slots').values())
+
+    def _claim(self, job: EncoderJob) -> bool:
+        """Prendre un slot pour le job (verrou du pool tenu), sur tout le nœud si possible"""
+        if not self.ledger:
+            return self._has_capacity(job.cost)
+        with self.ledger.transaction() as data:
+            slots = data['slots']
+            used = sum(lease['cost'] for key, lease in slots.items() if key != job.session_id)
+            if used + job.cost > self.max_slots + 1e-9:
+                return False
+            slots[job.session_id] = {'pid': os.getpid(), 'cost': job.cost}
+            return True
+
+    def _unclaim(self, job: EncoderJob):
+        if self.ledger:
+            with self.ledger.transaction() as data:
+                data['slots'].pop(job.session_id, None)
+
+    # ------------------------------------------------------------------
+    # Boucle asyncio de supervision
+    # ------------------------------------------------------------------
+
+    def _ensure_loop(self):
+        """Démarrer (une seule fois) le thread qui porte la boucle de supervision"""
+        with self._lock:
+            if self._loop_thread and self._loop_thread.is_alive():
+                return
+            self._loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def run_loop():
+                asyncio.set_event_loop(self._loop)
+                self._loop.call_soon(ready.set)
+                if self.ledger:
+                    self._loop.create_task(self._watch_queue())
+                self._loop.run_forever()
+
+            self._loop_thread = threading.Thread(
+                target=run_loop,
+                name='encoder-pool-loop',
+                daemon=True
+            )
+            self._loop_thread.start()
+            ready.wait()
+
+    def _run_in_loop(self, coro, timeout: float = None):
+        """Exécuter une coroutine dans la boucle de supervision et attendre son résultat"""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result(timeout)
+
+    @staticmethod
+    def _events(job: EncoderJob):
+        """Événements d'arrêt et de fin du job (boucle de supervision uniquement)"""
+        if job.stop_event is None:
+            job.stop_event = asyncio.Event()
+        if job.exited is None:
+            job.exited = asyncio.Event()
+
+    async def _watch_queue(self):
+        """Slots libérés par les autres workers du nœud: démarrer la file locale"""
+        while True:
+            await asyncio.sleep(self.queue_poll_interval)
+            if self._pending:
+                try:
+                    self._promote_pending()
+                except Exception as e:
+                    logger.error(f"Erreur lors de la reprise de la file d'encodage: {e}")
+
+    def _promote_pending(self):
+        """Démarrer les encodeurs en attente qui tiennent dans les slots libres (boucle)"""
+        with self._lock:
+            next_jobs = []
+            while self._pending and self._claim(self._pending[0]):
+                next_job = self._pending.popleft()
+                self._running[next_job.session_id] = next_job
+                next_jobs.append(next_job)
+
+        for next_job in next_jobs:
+            logger.info(f"Slot libéré, démarrage de l'encodeur en attente {next_job.session_id}")
+            asyncio.ensure_future(self._start(next_job))
+
+    async def _start(self, job: EncoderJob) -> bool:
+        """Lancer l'encodeur dans son slot puis le confier à sa tâche de supervision"""
+        self._events(job)
+        if job.stop_requested:
+            # Arrêt demandé entre la promotion depuis la file et le lancement
+            self._finish(job, None, 'cancelled')
+            return False
+        if not await self._spawn(job):
+            return False
+
+        if job.on_start:
+            try:
+                job.on_start(job.session_id)
+            except Exception as e:
+                logger.error(f"Erreur callback démarrage {job.session_id}: {e}")
+
+        job.task = asyncio.get_running_loop().create_task(self._supervise(job))
+        return True
+
+    async def _spawn(self, job: EncoderJob) -> bool:
+        try:
+            if job.command_factory:
+                command = job.command_factory(job.attempt)
+                job.process = await asyncio.create_subprocess_exec(
+                    *command,
+                    stdin=subprocess.DEVNULL,
+                    stdout=subprocess.PIPE if job.on_output else subprocess.DEVNULL,
+                    stderr=subprocess.PIPE
+                )
+                job.stderr_tail.clear()
+                job.stderr_reader = asyncio.get_running_loop().create_task(
+                    self._read_stderr(job, job.process)
+                )
+                if job.on_output:
+                    asyncio.get_running_loop().create_task(self._read_output(job, job.process))
+                logger.info(f"Encodeur {job.session_id} lancé (pid {job.process.pid}, tentative {job.attempt})")
+                job.spawned_at = time.monotonic()
+            else:
+                job.future = asyncio.get_running_loop().run_in_executor(None, job.target)
+        except Exception as e:
+            logger.error(f"Impossible de lancer l'encodeur {job.session_id}: {e}")
+            self._finish(job, None, 'failed')
+            return False
+
+        if job.started_at is None:
+            job.started_at = datetime.now()
+        return True
+
+    async def _read_output(self, job: EncoderJob, process: asyncio.subprocess.Process):
+        """Transmettre la sortie du processus ligne par ligne, ou image par image
+        (le tube ne doit jamais se remplir)"""
+        while True:
+            if job.output_frame_size:
+                try:
+                    chunk = await process.stdout.readexactly(job.output_frame_size)
+                except asyncio.IncompleteReadError:
+                    return
+            else:
+                line = await process.stdout.readline()
+                if not line:
+                    return
+                chunk = line.decode('utf-8', 'replace')
+            try:
+                job.on_output(chunk)
+            except Exception as e:
+                logger.error(f"Erreur de lecture de la sortie de {job.session_id}: {e}")
+
+    async def _read_stderr(self, job: EncoderJob, process: asyncio.subprocess.Process):
+        """Garder les dernières lignes de stderr (FFmpeg sépare sa progression par \\r)"""
+        pending = ''
+        while True:
+            chunk = await process.stderr.read(4096)
+            if not chunk:
+                break
+            lines = re.split(r'[\r\n]+', pending + chunk.decode('utf-8', 'replace'))
+            pending = lines.pop()[-4096:]
+            job.stderr_tail.extend(line for line in lines if line.strip())
+        if pending.strip():
+            job.stderr_tail.append(pending)
+
+    async def _log_stderr_tail(self, job: EncoderJob, returncode: int):
+        """Journaliser la fin de stderr d'un encodeur sorti en erreur"""
+        if job.stderr_reader:
+            try:
+                await asyncio.wait_for(asyncio.shield(job.stderr_reader), 2)
+            except Exception:
+                pass
+        if job.stderr_tail:
+            logger.error(
+                f"Encodeur {job.session_id} sorti avec le code {returncode}, fin de stderr:\n"
+                + '\n'.join(job.stderr_tail)
+            )
+
+    async def _supervise(self, job: EncoderJob):
+        """Attendre la fin de l'encodeur ou une demande d'arrêt, redémarrer après un crash"""
+        try:
+            while True:
+                exit_waiter = asyncio.ensure_future(job.process.wait() if job.process else job.future)
+                stop_waiter = asyncio.ensure_future(job.stop_event.wait())
+                await asyncio.wait({exit_waiter, stop_waiter}, return_when=asyncio.FIRST_COMPLETED)
+                stop_waiter.cancel()
+
+                if job.stop_event.is_set():
+                    await self._terminate(job, exit_waiter)
+                    self._finish(job, job.returncode, 'stopped')
+                    return
+
+                if not job.process:
+                    self._finish(job, 0, 'completed')
+                    return
+
+                returncode = job.process.returncode
+                if returncode == 0:
+                    self._finish(job, returncode, 'completed')
+                    return
+                await self._log_stderr_tail(job, returncode)
+
+                if job.spawned_at and time.monotonic() - job.spawned_at >= STABLE_RUNTIME:
+                    # Coupure isolée après un fonctionnement stable: nouveau crédit de redémarrages
+                    job.restarts = 0
+                max_restarts = self.max_restarts if job.max_restarts is None else job.max_restarts
+                if job.restarts >= max_restarts:
+                    logger.error(f"Encodeur {job.session_id} abandonné après {job.restarts} redémarrages")
+                    self._finish(job, returncode, 'failed')
+                    return
+
+                job.restarts += 1
+                self.total_restarts += 1
+                delay = min(self.restart_delay * job.restarts, MAX_RESTART_DELAY)
+                logger.warning(
+                    f"Encodeur {job.session_id} planté (code {returncode}), "
+                    f"redémarrage {job.restarts}/{max_restarts} dans {delay:.0f}s"
+                )
+
+                # Un arrêt demandé pendant l'attente est pris en compte immédiatement
+                try:
+                    await asyncio.wait_for(job.stop_event.wait(), delay)
+                    job.returncode = returncode
+                    self._finish(job, returncode, 'stopped')
+                    return
+                except asyncio.TimeoutError:
+                    pass
+
+                job.attempt += 1
+                if not await self._spawn(job):
+                    return
+        except Exception as e:
+            logger.error(f"Erreur de supervision de l'encodeur {job.session_id}: {e}")
+            self._finish(job, None, 'failed')
+
+    async def _terminate(self, job: EncoderJob, exit_waiter: asyncio.Future):
+        """Arrêt gracieux (FFmpeg finalise le fichier sur SIGTERM), kill en dernier recours"""
+        if job.process:
+            if job.process.returncode is None:
+                job.process.terminate()
+            try:
+                job.returncode = await asyncio.wait_for(asyncio.shield(exit_waiter), job.stop_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Encodeur {job.session_id} ne répond pas, arrêt forcé")
+                job.process.kill()
+                job.returncode = await exit_waiter
+        else:
+            # Le thread de fallback surveille lui-même le statut de sa session
+            try:
+                await asyncio.wait_for(asyncio.shield(exit_waiter), job.stop_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Encodeur {job.session_id} toujours actif après {job.stop_timeout}s")
+
+    async def _stop(self, job: EncoderJob, timeout: float) -> Optional[int]:
+        self._events(job)
+        job.stop_requested = True
+        job.stop_timeout = timeout
+        job.stop_event.set()
+        # Fin effective quel que soit l'état du job (pas encore lancé, supervisé, en échec)
+        await job.exited.wait()
+        return job.returncode
+
+    def _finish(self, job: EncoderJob, returncode: Optional[int], reason: str):
+        """Libérer le slot et démarrer les encodeurs en attente qui y tiennent"""
+        with self._lock:
+            if self._running.get(job.session_id) is not job:
+                return
+            del self._running[job.session_id]
+            self._unclaim(job)
+
+        job.returncode = returncode
+        self._notify_exit(job, returncode, reason)
+        self._events(job)
+        job.exited.set()
+
+        self._promote_pending()
+
+    def _notify_exit(self, job: EncoderJob, returncode: Optional[int], reason: str):
+        if job.on_exit:
+            try:
+                job.on_exit(job.session_id, returncode, reason)
+            except Exception as e:
+                logger.error(f"Erreur callback fin d'encodeur {job.session_id}: {e}")
@@ -0,0 +1,138 @@
+"""
+Suivi temps réel des encodeurs - Analyse incrémentale de la sortie -progress de FFmpeg
+"""
+
+import time
+import logging
+from typing import Dict, Optional, Any, Callable
+
+logger = logging.getLogger(__name__)
+
+# Option FFmpeg: blocs clé=valeur sur stdout, terminés par progress=continue|end
+FFMPEG_PROGRESS_ARGS = ['-nostats', '-progress', 'pipe:1']
+
+
+def _to_float(value: str) -> Optional[float]:
+    try:
+        return float(value.rstrip('x'))
+    except (ValueError, AttributeError):
+        return None
+
+
+def _to_int(value: str) -> Optional[int]:
+    try:
+        return int(value)
+    except (ValueError, TypeError):
+        return None
+
+
+class EncoderProgress:
+    """Statistiques vivantes d'un encodeur, alimentées ligne par ligne
+
+    Les compteurs sont cumulés entre les redémarrages de l'encodeur pour
+    refléter l'ensemble de l'enregistrement. Le délai entre le lancement de
+    l'encodeur et sa première image encodée est mesuré une fois (à la
+    granularité des blocs -progress, environ 0,5 s).
+    """
+
+    def __init__(self, on_first_frame: Optional[Callable[[float], None]] = None):
+        self._on_first_frame = on_first_frame
+        self._launched_at: Optional[float] = None
+        self._block: Dict[str, str] = {}
+        self._offset_frames = 0
+        self._offset_size = 0
+        self._offset_time = 0.0
+        self._offset_drops = 0
+        self._offset_dups = 0
+        self.stats: Dict[str, Any] = {
+            'frames': 0,
+            'fps': None,
+            'bitrate_kbps': None,
+            'total_size': None,  # inconnu pour la sortie HLS
+            'out_time': 0.0,
+            'dup_frames': 0,
+            'drop_frames': 0,
+            'speed': None,
+            'state': 'waiting',
+            'time_to_first_frame': None,
+            'updated_at': None
+        }
+
+    def mark_launched(self):
+        """L'encodeur vient d'obtenir son slot: début de la mesure du premier frame"""
+        if self._launched_at is None:
+            self._launched_at = time.monotonic()
+
+    def feed(self, line: str):
+        """Consommer une ligne de sortie; publie un instantané à chaque fin de bloc"""
+        key, sep, value = line.strip().partition('=')
+        if not sep:
+            return
+        if key != 'progress':
+            self._block[key] = value.strip()
+            return
+        self._publish(value.strip())
+        self._block = {}
+
+    def new_attempt(self):
+        """L'encodeur redémarre: ses compteurs repartent de zéro, on les cumule"""
+        self._offset_frames = self.stats['frames']
+        self._offset_size = self.stats['total_size'] or 0
+        self._offset_time = self.stats['out_time']
+        self._offset_drops = self.stats['drop_frames']
+        self._offset_dups = self.stats['dup_frames']
+        self.stats['state'] = 'restarting'
+
+    def update(self, **values):
+        """Mise à jour directe (encodeurs sans sortie -progress, ex: OpenCV)"""
+        self.stats.update(values)
+        self.stats['updated_at'] = time.time()
+        self._check_first_frame()
+
+    def _check_first_frame(self):
+        stats = self.stats
+        if stats['time_to_first_frame'] is not None or not stats['frames'] or self._launched_at is None:
+            return
+        stats['time_to_first_frame'] = round(time.monotonic() - self._launched_at, 3)
+        if self._on_first_frame:
+            try:
+                self._on_first_frame(stats['time_to_first_frame'])
+            except Exception as e:
+                logger.error(f"Erreur callback première image: {e}")
+
+    def _publish(self, state: str):
+        block = self._block
+        stats = self.stats
+
+        frames = _to_int(block.get('frame'))
+        if frames is not None:
+            stats['frames'] = self._offset_frames + frames
+
+        total_size = _to_int(block.get('total_size'))
+        if total_size is not None:
+            stats['total_size'] = self._offset_size + total_size
+
+        out_time_us = _to_int(block.get('out_time_us'))
+        if out_time_us is not None and out_time_us >= 0:
+            stats['out_time'] = round(self._offset_time + out_time_us / 1_000_000, 3)
+
+        drops = _to_int(block.get('drop_frames'))
+        if drops is not None:
+            stats['drop_frames'] = self._offset_drops + drops
+        dups = _to_int(block.get('dup_frames'))
+        if dups is not None:
+            stats['dup_frames'] = self._offset_dups + dups
+
+        stats['fps'] = _to_float(block.get('fps'))
+        bitrate = block.get('bitrate', '')
+        stats['bitrate_kbps'] = _to_float(bitrate.replace('kbits/s', '')) if 'kbits/s' in bitrate else None
+        stats['speed'] = _to_float(block.get('speed'))
+        stats['state'] = 'finished' if state == 'end' else 'encoding'
+        stats['updated_at'] = time.time()
+        self._check_first_frame()
+
+    def snapshot(self) -> Dict[str, Any]:
+        snapshot = dict(self.stats)
+        updated_at = snapshot.pop('updated_at')
+        snapshot['seconds_since_update'] = round(time.time() - updated_at, 1) if updated_at else None
+        return snapshot
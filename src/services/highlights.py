@@ -0,0 +1,149 @@
+"""
+Temps forts des vidéos - Détection automatique par le mouvement et l'énergie sonore
+Une seule passe FFmpeg décode la vidéo en niveaux de gris minuscules (décodage allégé)
+et l'audio en mono 8 kHz; les deux signaux par seconde sont calculés d'un bloc avec
+NumPy, normalisés, combinés puis lissés: les fenêtres les plus intenses sont retenues.
+"""
+
+import os
+import shutil
+import logging
+import tempfile
+import subprocess
+from typing import Dict, Optional, Any, List
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def robust_zscore(signal: np.ndarray) -> np.ndarray:
+    """Écart à la médiane en unités de MAD: insensible aux temps morts et aux pics isolés"""
+    median = np.median(signal)
+    mad = np.median(np.abs(signal - median)) * 1.4826
+    return (signal - median) / (mad + 1e-6)
+
+
+def motion_per_second(frames: np.ndarray, fps: int, pixel_threshold: int = 12) -> np.ndarray:
+    """Part des pixels changés entre images consécutives, moyennée par seconde"""
+    if len(frames) < 2:
+        return np.zeros(0, dtype=np.float32)
+    changed = np.empty(len(frames), dtype=np.float32)
+    changed[0] = 0.0
+    # Par blocs: borne la mémoire du tableau de différences en int16
+    for start in range(1, len(frames), 4096):
+        block = frames[start - 1:start + 4096].astype(np.int16)
+        changed[start:start + len(block) - 1] = (np.abs(np.diff(block, axis=0)) > pixel_threshold).mean(axis=(1, 2))
+    seconds = len(changed) // fps
+    return changed[:seconds * fps].reshape(seconds, fps).mean(axis=1)
+
+
+def audio_energy_per_second(samples: np.ndarray, sample_rate: int, bursts: int = 4) -> np.ndarray:
+    """Énergie (dB) du quart de seconde le plus fort de chaque seconde: cris, applaudissements"""
+    seconds = len(samples) // sample_rate
+    if not seconds:
+        return np.zeros(0, dtype=np.float32)
+    blocks = samples[:seconds * sample_rate].astype(np.float32).reshape(seconds, bursts, sample_rate // bursts)
+    rms = np.sqrt(np.mean(np.square(blocks / 32768.0), axis=2)).max(axis=1)
+    return 20 * np.log10(rms + 1e-6)
+
+
+class HighlightDetector:
+    """Analyse d'une vidéo et sélection des fenêtres candidates"""
+
+    def __init__(self, fps: int = None, width: int = 64, sample_rate: int = 8000,
+                 window: float = None, max_highlights: int = None, timeout: float = 3600):
+        self.fps = fps or int(os.environ.get('PADELVAR_HIGHLIGHT_FPS', 2))
+        self.width = width
+        self.sample_rate = sample_rate
+        # Durée d'un temps fort (s): lissage des signaux et écart minimal entre deux temps forts
+        self.window = int(window or float(os.environ.get('PADELVAR_HIGHLIGHT_WINDOW', 12)))
+        self.max_highlights = max_highlights or int(os.environ.get('PADELVAR_HIGHLIGHT_COUNT', 10))
+        self.min_score = 1.0
+        self.audio_weight = 0.5
+        self.threads = int(os.environ.get('PADELVAR_HIGHLIGHT_THREADS', max(1, (os.cpu_count() or 1) // 4)))
+        self.timeout = timeout
+
+    def height(self, width: Optional[int], height: Optional[int]) -> int:
+        """Hauteur d'analyse au ratio de la source (paire)"""
+        if not width or not height:
+            return self.width * 9 // 16
+        return max(2, int(round(self.width * height / width / 2)) * 2)
+
+    def command(self, media_path: str, frames_path: str, audio_path: Optional[str], height: int) -> List[str]:
+        """Une seule commande FFmpeg pour les deux signaux
+
+        Le décodage H.264 est allégé (images non référencées et filtre de boucle
+        ignorés): la qualité d'image est sans importance à 64 pixels de large.
+        """
+        command = [
+            'ffmpeg', '-y', '-v', 'error', '-threads', str(self.threads),
+            '-skip_frame', 'noref', '-skip_loop_filter', 'all', '-flags2', 'fast',
+            '-i', media_path,
+            '-map', '0:v:0', '-an',
+            '-vf', f"fps={self.fps},scale={self.width}:{height}:flags=fast_bilinear,format=gray",
+            '-f', 'rawvideo', frames_path
+        ]
+        if audio_path:
+            command += ['-map', '0:a:0', '-vn', '-ac', '1', '-ar', str(self.sample_rate),
+                        '-f', 's16le', audio_path]
+        return command
+
+    def signals(self, media_path: str, has_audio: bool, width: Optional[int] = None,
+                height: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Mouvement et énergie sonore par seconde (une passe de décodage)"""
+        analysis_height = self.height(width, height)
+        work_dir = tempfile.mkdtemp(prefix='highlights_')
+        try:
+            frames_path = os.path.join(work_dir, 'frames.gray')
+            audio_path = os.path.join(work_dir, 'audio.pcm') if has_audio else None
+            result = subprocess.run(self.command(media_path, frames_path, audio_path, analysis_height),
+                                    capture_output=True, timeout=self.timeout)
+            if result.returncode != 0:
+                raise RuntimeError(result.stderr.decode('utf-8', 'replace').strip()[-200:] or
+                                   f"FFmpeg a échoué (code {result.returncode})")
+
+            frame_size = self.width * analysis_height
+            frames = np.fromfile(frames_path, dtype=np.uint8)
+            frames = frames[:len(frames) // frame_size * frame_size].reshape(-1, analysis_height, self.width)
+            motion = motion_per_second(frames, self.fps)
+            audio = None
+            if audio_path and os.path.exists(audio_path):
+                audio = audio_energy_per_second(np.fromfile(audio_path, dtype='<i2'), self.sample_rate)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        return {'motion': motion, 'audio': audio}
+
+    def score(self, motion: np.ndarray, audio: Optional[np.ndarray]) -> np.ndarray:
+        """Intensité lissée par seconde (mouvement et son normalisés sur la vidéo entière)"""
+        combined = np.clip(robust_zscore(motion), -3, 6)
+        if audio is not None and len(audio):
+            seconds = min(len(motion), len(audio))
+            combined = ((1 - self.audio_weight) * combined[:seconds] +
+                        self.audio_weight * np.clip(robust_zscore(audio[:seconds]), -3, 6))
+        kernel = np.ones(min(self.window, len(combined)) or 1, dtype=np.float32)
+        return np.convolve(combined, kernel / len(kernel), mode='same')
+
+    def select(self, score: np.ndarray) -> List[Dict[str, Any]]:
+        """Fenêtres les mieux notées, sans chevauchement, dans l'ordre chronologique"""
+        duration = len(score)
+        taken = np.zeros(duration, dtype=bool)
+        highlights = []
+        for peak in np.argsort(score)[::-1]:
+            if len(highlights) >= self.max_highlights or score[peak] < self.min_score:
+                break
+            if taken[peak]:
+                continue
+            start = max(0, int(peak) - self.window // 2)
+            end = min(duration, start + self.window)
+            taken[max(0, start - self.window // 2):end + self.window // 2] = True
+            highlights.append({'start': float(start), 'end': float(end), 'score': round(float(score[peak]), 2)})
+        return sorted(highlights, key=lambda highlight: highlight['start'])
+
+    def detect(self, media_path: str, has_audio: bool, width: Optional[int] = None,
+               height: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Temps forts candidats d'une vidéo: [{'start', 'end', 'score'}] en secondes"""
+        signals = self.signals(media_path, has_audio, width, height)
+        if len(signals['motion']) < self.window:
+            return []
+        return self.select(self.score(signals['motion'], signals['audio']))
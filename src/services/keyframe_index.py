@@ -0,0 +1,185 @@
+"""
+Index des images clés d'une vidéo - Instant et position dans le fichier de chaque image clé
+Construit une fois (lecture des paquets, aucun décodage) à la finalisation et stocké
+à côté du média dans un format binaire compact, projeté en mémoire (mmap) à l'usage:
+une recherche est dichotomique et ne lit que quelques pages de l'index.
+"""
+
+import os
+import mmap
+import struct
+import logging
+import threading
+import subprocess
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+INDEX_SUFFIX = '.kfi'
+
+# En-tête: signature, version, taille d'un enregistrement, nombre d'enregistrements
+HEADER = struct.Struct('<4sHHI')
+MAGIC = b'PVKI'
+VERSION = 1
+# Enregistrement: instant (s, double) et position en octets (-1 si inconnue, ex: HLS)
+RECORD = struct.Struct('<dq')
+
+# Une seule construction à la fois par média (découpes simultanées d'une même vidéo)
+_build_locks: dict = {}
+_build_locks_guard = threading.Lock()
+
+
+class KeyframeIndexError(Exception):
+    """Index des images clés impossible à construire (ffprobe absent, média illisible)"""
+    pass
+
+
+class KeyframeIndex:
+    """Vue en lecture seule (mmap) d'un index binaire d'images clés triées par instant"""
+
+    def __init__(self, buffer, count: int):
+        self._buffer = buffer
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def close(self):
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def record(self, position: int) -> Tuple[float, int]:
+        return RECORD.unpack_from(self._buffer, HEADER.size + position * RECORD.size)
+
+    def time(self, position: int) -> float:
+        return self.record(position)[0]
+
+    def _bisect(self, seconds: float) -> int:
+        """Nombre d'images clés d'instant <= seconds (recherche dichotomique)"""
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self.time(middle) <= seconds:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def at_or_before(self, seconds: float) -> Optional[float]:
+        entry = self.entry_at_or_before(seconds)
+        return entry[0] if entry else None
+
+    def at_or_after(self, seconds: float) -> Optional[float]:
+        position = self._bisect(seconds - 2e-3)
+        return self.time(position) if position < self._count else None
+
+    def entry_at_or_before(self, seconds: float) -> Optional[Tuple[float, int]]:
+        """(instant, position en octets) de la dernière image clé avant seconds"""
+        position = self._bisect(seconds + 1e-3)
+        return self.record(position - 1) if position else None
+
+    def is_keyframe(self, seconds: float) -> bool:
+        nearest = self.at_or_before(seconds)
+        return nearest is not None and abs(nearest - seconds) <= 1e-3
+
+    @staticmethod
+    def index_path(media_path: str) -> str:
+        """Fichier d'index: à côté du MP4, ou dans le dossier d'un enregistrement HLS"""
+        if media_path.endswith('.m3u8'):
+            return os.path.join(os.path.dirname(media_path), 'index' + INDEX_SUFFIX)
+        return media_path + INDEX_SUFFIX
+
+    @staticmethod
+    def scan(media_path: str, timeout: float = 300) -> List[Tuple[float, int]]:
+        """Lister (instant, position) des images clés par lecture des paquets vidéo"""
+        command = [
+            'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+            '-show_entries', 'packet=pts_time,pos,flags', '-of', 'csv=p=0', media_path
+        ]
+        result = subprocess.run(command, capture_output=True, timeout=timeout, check=True)
+
+        entries = []
+        for line in result.stdout.decode('utf-8', 'replace').splitlines():
+            fields = line.split(',')
+            if len(fields) < 3 or 'K' not in fields[2]:
+                continue
+            try:
+                pts_time = float(fields[0])
+            except ValueError:
+                continue
+            try:
+                position = int(fields[1])
+            except ValueError:
+                position = -1  # N/A: position sans objet (segments HLS)
+            entries.append((round(pts_time, 6), position))
+        entries.sort()
+        return entries
+
+    @classmethod
+    def write(cls, path: str, entries: List[Tuple[float, int]]):
+        """Écrire l'index de façon atomique (fichier temporaire puis renommage)"""
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, 'wb') as index_file:
+            index_file.write(HEADER.pack(MAGIC, VERSION, RECORD.size, len(entries)))
+            for entry in entries:
+                index_file.write(RECORD.pack(*entry))
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def open(cls, path: str) -> Optional['KeyframeIndex']:
+        """Projeter un index en mémoire; None s'il est absent ou invalide"""
+        try:
+            with open(path, 'rb') as index_file:
+                size = os.fstat(index_file.fileno()).st_size
+                if size < HEADER.size:
+                    return None
+                buffer = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+
+        magic, version, record_size, count = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC or version != VERSION or record_size != RECORD.size \
+                or size < HEADER.size + count * RECORD.size:
+            buffer.close()
+            return None
+        return cls(buffer, count)
+
+    @classmethod
+    def build(cls, media_path: str) -> str:
+        """Construire et stocker l'index d'un média; retourne le chemin de l'index"""
+        path = cls.index_path(media_path)
+        entries = cls.scan(media_path)
+        cls.write(path, entries)
+        logger.info(f"Index des images clés construit: {path} ({len(entries)} images clés)")
+        return path
+
+    @classmethod
+    def load_or_build(cls, media_path: str) -> 'KeyframeIndex':
+        """Ouvrir l'index stocké, le construire s'il manque ou est périmé (vidéos anciennes)
+
+        Lève KeyframeIndexError si la construction échoue.
+        """
+        path = cls.index_path(media_path)
+        with _build_locks_guard:
+            lock = _build_locks.setdefault(path, threading.Lock())
+        with lock:
+            try:
+                fresh = os.path.getmtime(path) >= os.path.getmtime(media_path)
+            except OSError:
+                fresh = False
+            index = cls.open(path) if fresh else None
+            if index is None:
+                try:
+                    cls.build(media_path)
+                except (OSError, subprocess.SubprocessError) as e:
+                    raise KeyframeIndexError(f"Index des images clés impossible pour {media_path}: {e}") from e
+                index = cls.open(path)
+                if index is None:
+                    raise KeyframeIndexError(f"Index des images clés illisible: {path}")
+            return index
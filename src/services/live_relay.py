@@ -0,0 +1,297 @@
+"""
+Relais du direct pour les spectateurs - Une connexion amont par terrain, N spectateurs
+Un seul FFmpeg par terrain produit le flux MJPEG (lu dans le tampon d'ingestion quand il
+est vivant, sinon sur la caméra); chaque image est publiée dans un emplacement partagé.
+Chaque spectateur envoie la dernière image disponible à son rythme: un client lent saute
+des images, il ne retient ni l'amont ni les autres spectateurs.
+"""
+
+import os
+import time
+import logging
+import threading
+import subprocess
+from collections import OrderedDict
+from typing import Dict, Optional, Any, Iterator, Tuple
+
+from .video_capture_service import video_capture_service
+
+logger = logging.getLogger(__name__)
+
+MJPEG_BOUNDARY = 'frame'
+JPEG_END = b'\xff\xd9'
+
+
+class RelayChannel:
+    """Flux d'un terrain: processus amont, dernière image et spectateurs"""
+
+    def __init__(self, court_id: int, camera_url: str):
+        self.court_id = court_id
+        self.camera_url = camera_url
+        self.condition = threading.Condition()
+        self.seq = 0
+        self.frame: Optional[bytes] = None
+        self.viewers = 0
+        self.idle_since: Optional[float] = time.monotonic()
+        self.process: Optional[subprocess.Popen] = None
+        self.thread: Optional[threading.Thread] = None
+        self.closed = False
+        self.source = None
+        self.restarts = 0
+        self.frames_skipped = 0
+
+    def publish(self, frame: bytes):
+        with self.condition:
+            self.seq += 1
+            self.frame = frame
+            self.condition.notify_all()
+
+    def wait_frame(self, last_seq: int, timeout: float) -> Tuple[int, Optional[bytes]]:
+        """Dernière image plus récente que last_seq (ou (last_seq, None) après timeout)"""
+        with self.condition:
+            if self.seq <= last_seq and not self.closed:
+                self.condition.wait(timeout)
+            if self.seq <= last_seq:
+                return last_seq, None
+            return self.seq, self.frame
+
+
+class SegmentCache:
+    """Segments HLS récents en mémoire, partagés par les spectateurs du worker (LRU borné)"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: 'OrderedDict[Tuple[str, float], bytes]' = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path: str) -> Optional[bytes]:
+        try:
+            key = (path, os.path.getmtime(path))
+        except OSError:
+            return None
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return data
+        try:
+            with open(path, 'rb') as segment_file:
+                data = segment_file.read()
+        except OSError:
+            return None
+        with self._lock:
+            self.misses += 1
+            if key not in self._entries:
+                self._entries[key] = data
+                self._size += len(data)
+            while self._size > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+        return data
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {'entries': len(self._entries), 'bytes': self._size, 'max_bytes': self.max_bytes,
+                'hits': self.hits, 'misses': self.misses}
+
+
+class LiveRelay:
+    """Canaux de relais des terrains portés par ce worker"""
+
+    def __init__(self, fps: int = None, width: int = None, idle_timeout: float = 15.0):
+        self.fps = fps or int(os.environ.get('PADELVAR_RELAY_FPS', 10))
+        self.width = width or int(os.environ.get('PADELVAR_RELAY_WIDTH', 640))
+        self.idle_timeout = idle_timeout
+        self.frame_timeout = 10.0
+        self.max_frame_bytes = 4 * 1024 * 1024
+        self.segments = SegmentCache(int(os.environ.get('PADELVAR_RELAY_CACHE_MB', 64)) * 1024 ** 2)
+
+        self._channels: Dict[int, RelayChannel] = {}
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Spectateurs
+    # ------------------------------------------------------------------
+
+    def subscribe(self, court_id: int, camera_url: str) -> RelayChannel:
+        """Rattacher un spectateur au canal du terrain (démarré au premier spectateur)"""
+        with self._lock:
+            channel = self._channels.get(court_id)
+            if channel is None or channel.closed or channel.camera_url != camera_url:
+                if channel:
+                    self._close(channel)
+                channel = RelayChannel(court_id, camera_url)
+                self._channels[court_id] = channel
+                channel.thread = threading.Thread(target=self._pump, args=(channel,),
+                                                  name=f'relay-{court_id}', daemon=True)
+                channel.thread.start()
+                logger.info(f"Relais du direct ouvert pour le terrain {court_id}")
+            channel.viewers += 1
+            channel.idle_since = None
+        return channel
+
+    def unsubscribe(self, channel: RelayChannel):
+        with self._lock:
+            channel.viewers -= 1
+            if channel.viewers <= 0:
+                channel.idle_since = time.monotonic()
+                # Amont muet: la lecture bloquée ne verrait jamais le départ du dernier spectateur
+                timer = threading.Timer(self.idle_timeout + 0.1, self._expire_if_idle, args=(channel,))
+                timer.daemon = True
+                timer.start()
+
+    def mjpeg(self, channel: RelayChannel) -> Iterator[bytes]:
+        """Corps multipart d'un spectateur: toujours la dernière image, jamais de file"""
+        last_seq = 0
+        try:
+            while not channel.closed:
+                seq, frame = channel.wait_frame(last_seq, self.frame_timeout)
+                if frame is None:
+                    if channel.closed:
+                        return
+                    continue
+                if last_seq and seq > last_seq + 1:
+                    channel.frames_skipped += seq - last_seq - 1
+                last_seq = seq
+                yield (f"--{MJPEG_BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+                       f"Content-Length: {len(frame)}\r\n\r\n").encode() + frame + b"\r\n"
+        finally:
+            self.unsubscribe(channel)
+
+    # ------------------------------------------------------------------
+    # Amont
+    # ------------------------------------------------------------------
+
+    def _command(self, channel: RelayChannel) -> list:
+        command = ['ffmpeg', '-nostats', '-loglevel', 'error']
+        playlist = None
+        if video_capture_service.preroll.is_live(channel.court_id):
+            attach = video_capture_service.preroll.attach(channel.court_id, 0)
+            playlist = attach['playlist'] if attach else None
+        if playlist:
+            # Tampon d'ingestion du terrain: aucune connexion caméra supplémentaire
+            channel.source = 'ingest'
+            command += ['-live_start_index', '-1', '-i', playlist]
+        else:
+            channel.source = 'camera'
+            if channel.camera_url.startswith('rtsp://'):
+                command += ['-rtsp_transport', 'tcp']
+            command += ['-i', channel.camera_url]
+        return command + [
+            '-an', '-vf', f"fps={self.fps},scale='min({self.width},iw)':-2",
+            '-q:v', '6', '-f', 'mjpeg', 'pipe:1'
+        ]
+
+    def _pump(self, channel: RelayChannel):
+        """Lire le flux MJPEG amont et publier chaque image; s'arrêter sans spectateur"""
+        delay = 1.0
+        while not channel.closed:
+            started = time.monotonic()
+            try:
+                channel.process = subprocess.Popen(self._command(channel), stdin=subprocess.DEVNULL,
+                                                   stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+                self._read_frames(channel)
+            except Exception as e:
+                logger.error(f"Relais du terrain {channel.court_id}: {e}")
+            finally:
+                self._terminate(channel)
+            if channel.closed or self._expire_if_idle(channel):
+                break
+            # Amont coupé: reconnexion espacée, remise à zéro après une session stable
+            delay = 1.0 if time.monotonic() - started > 30 else min(delay * 2, 10.0)
+            channel.restarts += 1
+            time.sleep(delay)
+        with channel.condition:
+            channel.closed = True
+            channel.condition.notify_all()
+        logger.info(f"Relais du direct fermé pour le terrain {channel.court_id}")
+
+    def _read_frames(self, channel: RelayChannel):
+        pending = b''
+        while not channel.closed:
+            chunk = channel.process.stdout.read1(65536)
+            if not chunk:
+                return
+            pending += chunk
+            while True:
+                end = pending.find(JPEG_END)
+                if end < 0:
+                    break
+                channel.publish(pending[:end + len(JPEG_END)])
+                pending = pending[end + len(JPEG_END):]
+            if len(pending) > self.max_frame_bytes:
+                pending = b''
+            if self._expire_if_idle(channel):
+                return
+
+    def _expire_if_idle(self, channel: RelayChannel) -> bool:
+        with self._lock:
+            if channel.viewers <= 0 and channel.idle_since is not None \
+                    and time.monotonic() - channel.idle_since >= self.idle_timeout:
+                self._close(channel)
+                return True
+        return False
+
+    def _close(self, channel: RelayChannel):
+        """Fermer un canal (verrou du relais tenu par l'appelant)"""
+        channel.closed = True
+        if self._channels.get(channel.court_id) is channel:
+            del self._channels[channel.court_id]
+        if channel.process and channel.process.poll() is None:
+            channel.process.terminate()  # débloque la lecture; l'attente se fait dans _pump
+        with channel.condition:
+            channel.condition.notify_all()
+
+    @staticmethod
+    def _terminate(channel: RelayChannel):
+        process = channel.process
+        if process and process.poll() is None:
+            process.terminate()
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+
+    def close_all(self):
+        with self._lock:
+            for channel in list(self._channels.values()):
+                self._close(channel)
+
+    # ------------------------------------------------------------------
+    # HLS du tampon d'ingestion
+    # ------------------------------------------------------------------
+
+    def hls_file(self, court_id: int, filename: str) -> Optional[bytes]:
+        """Playlist (toujours relue) ou segment (cache mémoire) du tampon d'un terrain"""
+        directory = video_capture_service.preroll.base_path / f"court_{court_id}"
+        path = str(directory / filename)
+        if filename.endswith('.m3u8'):
+            try:
+                with open(path, 'rb') as playlist:
+                    return playlist.read()
+            except OSError:
+                return None
+        return self.segments.get(path)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            channels = {
+                court_id: {
+                    'viewers': channel.viewers,
+                    'source': channel.source,
+                    'frames': channel.seq,
+                    'frames_skipped': channel.frames_skipped,
+                    'restarts': channel.restarts
+                }
+                for court_id, channel in self._channels.items()
+            }
+        return {'fps': self.fps, 'width': self.width, 'channels': channels,
+                'segment_cache': self.segments.get_stats()}
+
+
+# Instance globale du relais du direct
+live_relay = LiveRelay()
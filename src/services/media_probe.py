@@ -0,0 +1,163 @@
+"""
+Sonde média - Lecture des paramètres d'un flux caméra ou d'un fichier via ffprobe
+"""
+
+import json
+import logging
+import subprocess
+from typing import Dict, Optional, Any
+
+logger = logging.getLogger(__name__)
+
+# Codecs vidéo qu'on peut recopier tels quels dans un conteneur MP4/fMP4 lisible partout
+STREAM_COPY_VIDEO_CODECS = ('h264',)
+STREAM_COPY_PIX_FMTS = ('yuv420p', 'yuvj420p')
+STREAM_COPY_AUDIO_CODECS = ('aac',)
+
+
+def _parse_frame_rate(rate: Optional[str]) -> Optional[float]:
+    """Convertir un débit d'images ffprobe ('25/1') en nombre"""
+    if not rate or rate == '0/0':
+        return None
+    try:
+        num, den = rate.split('/')
+        return round(int(num) / int(den), 3) if int(den) else None
+    except (ValueError, ZeroDivisionError):
+        return None
+
+
+def _to_int(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def probe_stream(url: str, timeout: float = 5.0) -> Optional[Dict[str, Any]]:
+    """Interroger une source (URL caméra ou fichier) et résumer ses flux
+
+    Retourne None si ffprobe est absent ou si la source ne répond pas.
+    """
+    command = ['ffprobe', '-v', 'error', '-print_format', 'json', '-show_streams', '-show_format']
+    if url.startswith('rtsp://'):
+        command += ['-rtsp_transport', 'tcp']
+    command.append(url)
+
+    try:
+        result = subprocess.run(command, capture_output=True, timeout=timeout, check=True)
+        data = json.loads(result.stdout or b'{}')
+    except FileNotFoundError:
+        logger.debug("ffprobe non trouvé, sonde impossible")
+        return None
+    except subprocess.TimeoutExpired:
+        logger.warning(f"Sonde expirée après {timeout}s: {url}")
+        return None
+    except (subprocess.CalledProcessError, ValueError) as e:
+        logger.warning(f"Sonde impossible pour {url}: {e}")
+        return None
+
+    info: Dict[str, Any] = {
+        'format': data.get('format', {}).get('format_name'),
+        'video_codec': None,
+        'audio_codec': None,
+        'bitrate': _to_int(data.get('format', {}).get('bit_rate'))  # souvent absent en direct
+    }
+
+    for stream in data.get('streams', []):
+        if stream.get('codec_type') == 'video' and info['video_codec'] is None:
+            info.update({
+                'video_codec': stream.get('codec_name'),
+                'profile': stream.get('profile'),
+                'pix_fmt': stream.get('pix_fmt'),
+                'width': stream.get('width'),
+                'height': stream.get('height'),
+                'fps': _parse_frame_rate(stream.get('avg_frame_rate')) or _parse_frame_rate(stream.get('r_frame_rate'))
+            })
+            info['bitrate'] = _to_int(stream.get('bit_rate')) or info['bitrate']
+        elif stream.get('codec_type') == 'audio' and info['audio_codec'] is None:
+            info['audio_codec'] = stream.get('codec_name')
+
+    return info
+
+
+def can_copy_video(info: Optional[Dict[str, Any]]) -> bool:
+    """La vidéo source peut-elle être remuxée sans réencodage ?"""
+    if not info or info.get('video_codec') not in STREAM_COPY_VIDEO_CODECS:
+        return False
+    return info.get('pix_fmt') in STREAM_COPY_PIX_FMTS + (None,)
+
+
+def can_copy_audio(info: Optional[Dict[str, Any]]) -> bool:
+    """L'audio source peut-il être recopié dans un conteneur MP4 ?"""
+    return bool(info) and info.get('audio_codec') in STREAM_COPY_AUDIO_CODECS
+
+
+def _estimate_keyframe_interval(path: str, window: int, timeout: float) -> Optional[float]:
+    """Intervalle moyen entre images clés sur les premières secondes du fichier
+
+    Seules les images clés sont décodées (-skip_frame nokey).
+    """
+    command = [
+        'ffprobe', '-v', 'error',
+        '-select_streams', 'v:0',
+        '-skip_frame', 'nokey',
+        '-read_intervals', f'%+{window}',
+        '-show_entries', 'frame=pts_time',
+        '-of', 'csv=p=0',
+        path
+    ]
+    try:
+        result = subprocess.run(command, capture_output=True, timeout=timeout, check=True)
+    except (FileNotFoundError, subprocess.TimeoutExpired, subprocess.CalledProcessError):
+        return None
+
+    times = []
+    for line in result.stdout.decode(errors='replace').splitlines():
+        try:
+            times.append(float(line.strip().rstrip(',')))
+        except ValueError:
+            continue
+    if len(times) < 2:
+        return None
+    return round((times[-1] - times[0]) / (len(times) - 1), 3)
+
+
+def probe_media_file(path: str, timeout: float = 60.0, keyframe_window: int = 60) -> Optional[Dict[str, Any]]:
+    """Métadonnées réelles d'un enregistrement terminé, à lire une seule fois par fichier
+
+    Retourne durée (s), codec, résolution, débit (bit/s), images/s et
+    intervalle entre images clés (s), ou None si le fichier est illisible.
+    """
+    command = ['ffprobe', '-v', 'error', '-print_format', 'json', '-show_streams', '-show_format', path]
+    try:
+        result = subprocess.run(command, capture_output=True, timeout=timeout, check=True)
+        data = json.loads(result.stdout or b'{}')
+    except FileNotFoundError:
+        logger.debug("ffprobe non trouvé, métadonnées indisponibles")
+        return None
+    except (subprocess.TimeoutExpired, subprocess.CalledProcessError, ValueError) as e:
+        logger.warning(f"Lecture des métadonnées impossible pour {path}: {e}")
+        return None
+
+    media_format = data.get('format', {})
+    video_stream = next((st for st in data.get('streams', []) if st.get('codec_type') == 'video'), {})
+
+    def as_float(value):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+
+    duration = as_float(media_format.get('duration')) or as_float(video_stream.get('duration'))
+    bitrate = as_float(media_format.get('bit_rate')) or as_float(video_stream.get('bit_rate'))
+
+    return {
+        'duration': duration,
+        'video_codec': video_stream.get('codec_name'),
+        'width': video_stream.get('width'),
+        'height': video_stream.get('height'),
+        'fps': _parse_frame_rate(video_stream.get('avg_frame_rate')),
+        'bitrate': int(bitrate) if bitrate else None,
+        'keyframe_interval': _estimate_keyframe_interval(path, keyframe_window, timeout)
+        if video_stream and keyframe_window else None
+    }
@@ -0,0 +1,190 @@
+"""
+Rétention des médias - Suppression pilotée par l'index stored_media
+Chaque fichier rangé est indexé avec sa date d'expiration (politique du club);
+le nettoyage ne parcourt jamais les dossiers, il lit l'index par lots.
+"""
+
+import os
+import time
+import shutil
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Any, List, Tuple
+
+from ..models.database import db
+from ..models.user import Video, Club, StoredMedia
+
+logger = logging.getLogger(__name__)
+
+# Médias dont la suppression rend la vidéo illisible
+PLAYABLE_KINDS = ('video', 'hls')
+# Médias rangés sous forme de dossier
+DIRECTORY_KINDS = ('hls', 'storyboard', 'renditions')
+
+
+class MediaRetention:
+    """Indexation des médias rangés et purge par lots des médias expirés"""
+
+    def __init__(self, default_days: int = None, chunk_size: int = 500, interval: float = 3600):
+        self.default_days = default_days if default_days is not None else int(os.environ.get('PADELVAR_RETENTION_DAYS', 30))
+        self.chunk_size = chunk_size
+        self.interval = interval
+        self.retry_delay = timedelta(days=1)  # fichier indélébile: on réessaie plus tard
+        self._last_run = 0.0
+
+    def retention_days(self, club: Optional[Club]) -> Optional[int]:
+        """Durée de conservation du club en jours (None = sans limite)"""
+        days = club.retention_days if club and club.retention_days is not None else self.default_days
+        return days or None
+
+    def expiry_for(self, club: Optional[Club], created_at: datetime) -> Optional[datetime]:
+        days = self.retention_days(club)
+        return created_at + timedelta(days=days) if days else None
+
+    def register(self, video: Video, club_id: Optional[int], entries: List[Tuple[str, str, Optional[int]]]):
+        """Indexer les médias d'une vidéo: entries = [(kind, chemin, taille)]
+
+        Un média déjà indexé (post-traitement repris) n'est pas dupliqué.
+        Le commit reste à la charge de l'appelant.
+        """
+        club = Club.query.get(club_id) if club_id else None
+        created_at = video.recorded_at or datetime.utcnow()
+        expires_at = self.expiry_for(club, created_at)
+        known = {
+            path for (path,) in db.session.query(StoredMedia.path)
+            .filter(StoredMedia.video_id == video.id, StoredMedia.deleted_at.is_(None))
+        }
+        added_bytes = 0
+        for kind, path, size in entries:
+            if path in known:
+                continue
+            db.session.add(StoredMedia(
+                video_id=video.id, club_id=club_id, kind=kind, path=path,
+                size_bytes=size, created_at=created_at, expires_at=expires_at
+            ))
+            added_bytes += size or 0
+        self._adjust_usage({club_id: added_bytes})
+
+    @staticmethod
+    def _adjust_usage(deltas: Dict[Optional[int], int]):
+        """Mettre à jour l'occupation des clubs par incrément (aucune somme à la demande)"""
+        for club_id, delta in deltas.items():
+            if club_id and delta:
+                Club.query.filter_by(id=club_id).update(
+                    {Club.storage_used_bytes: db.func.coalesce(Club.storage_used_bytes, 0) + delta},
+                    synchronize_session=False
+                )
+
+    def apply_club_policy(self, club: Club) -> int:
+        """Recalculer l'expiration des médias du club après un changement de politique"""
+        updated = 0
+        last_id = 0
+        while True:
+            rows = (db.session.query(StoredMedia.id, StoredMedia.created_at)
+                    .filter(StoredMedia.club_id == club.id, StoredMedia.deleted_at.is_(None),
+                            StoredMedia.id > last_id)
+                    .order_by(StoredMedia.id)
+                    .limit(self.chunk_size)
+                    .all())
+            if not rows:
+                break
+            db.session.bulk_update_mappings(StoredMedia, [
+                {'id': media_id, 'expires_at': self.expiry_for(club, created_at)}
+                for media_id, created_at in rows
+            ])
+            db.session.commit()
+            updated += len(rows)
+            last_id = rows[-1][0]
+        logger.info(f"Politique de rétention du club {club.id} appliquée à {updated} médias")
+        return updated
+
+    def due(self) -> bool:
+        return time.monotonic() - self._last_run >= self.interval
+
+    def run(self, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """Supprimer les médias expirés, un lot à la fois (requêtes ensemblistes par lot)"""
+        self._last_run = time.monotonic()
+        now = now or datetime.utcnow()
+        report = {'deleted': 0, 'freed_bytes': 0, 'failed': 0, 'videos_unavailable': 0}
+
+        while True:
+            batch = (StoredMedia.query
+                     .filter(StoredMedia.deleted_at.is_(None), StoredMedia.expires_at <= now)
+                     .order_by(StoredMedia.expires_at)
+                     .limit(self.chunk_size)
+                     .all())
+            if not batch:
+                break
+
+            deleted, failed = [], []
+            for media in batch:
+                (deleted if self._remove(media) else failed).append(media)
+            freed_bytes = sum(m.size_bytes or 0 for m in deleted)
+
+            if deleted:
+                StoredMedia.query.filter(StoredMedia.id.in_([m.id for m in deleted])).update(
+                    {StoredMedia.deleted_at: now}, synchronize_session=False
+                )
+                playable = {m.video_id for m in deleted if m.kind in PLAYABLE_KINDS and m.video_id}
+                thumbnails = {m.video_id for m in deleted if m.kind == 'thumbnail' and m.video_id}
+                storyboards = {m.video_id for m in deleted if m.kind == 'storyboard' and m.video_id}
+                renditions = {m.video_id for m in deleted if m.kind == 'renditions' and m.video_id}
+                if playable:
+                    report['videos_unavailable'] += Video.query.filter(Video.id.in_(playable)).update(
+                        {Video.file_url: None}, synchronize_session=False
+                    )
+                if thumbnails:
+                    Video.query.filter(Video.id.in_(thumbnails)).update(
+                        {Video.thumbnail_url: None}, synchronize_session=False
+                    )
+                if storyboards:
+                    Video.query.filter(Video.id.in_(storyboards)).update(
+                        {Video.storyboard_url: None}, synchronize_session=False
+                    )
+                if renditions:
+                    Video.query.filter(Video.id.in_(renditions)).update(
+                        {Video.renditions_status: None}, synchronize_session=False
+                    )
+                freed_by_club: Dict[Optional[int], int] = {}
+                for media in deleted:
+                    freed_by_club[media.club_id] = freed_by_club.get(media.club_id, 0) - (media.size_bytes or 0)
+                self._adjust_usage(freed_by_club)
+            if failed:
+                StoredMedia.query.filter(StoredMedia.id.in_([m.id for m in failed])).update(
+                    {StoredMedia.expires_at: now + self.retry_delay}, synchronize_session=False
+                )
+            db.session.commit()
+            db.session.expire_all()
+
+            report['deleted'] += len(deleted)
+            report['failed'] += len(failed)
+            report['freed_bytes'] += freed_bytes
+
+        if report['deleted'] or report['failed']:
+            logger.info(f"Rétention: {report}")
+        return report
+
+    def _remove(self, media: StoredMedia) -> bool:
+        """Supprimer le fichier (ou dossier: HLS, storyboard, déclinaisons); absent = déjà supprimé"""
+        try:
+            if media.kind in DIRECTORY_KINDS:
+                shutil.rmtree(media.path)
+            else:
+                os.remove(media.path)
+            logger.debug(f"Média expiré supprimé: {media.path}")
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"Suppression impossible de {media.path}: {e}")
+            return False
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        now = datetime.utcnow()
+        live = StoredMedia.query.filter(StoredMedia.deleted_at.is_(None))
+        return {
+            'default_days': self.default_days,
+            'indexed_media': live.count(),
+            'indexed_bytes': int(live.with_entities(db.func.coalesce(db.func.sum(StoredMedia.size_bytes), 0)).scalar()),
+            'expired_pending': live.filter(StoredMedia.expires_at <= now).count()
+        }
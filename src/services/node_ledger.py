@@ -0,0 +1,105 @@
+"""
+Registre local du nœud - Slots d'encodage et réservations d'espace de tous les workers
+Un petit fichier JSON verrouillé (flock) que chaque worker du nœud lit et modifie de
+façon atomique: la limite d'encodeurs et l'espace réservé valent pour le nœud entier,
+quel que soit le nombre de workers. Les entrées d'un worker mort sont purgées.
+Le même mécanisme désigne le worker qui porte chaque tâche de fond du nœud.
+"""
+
+import os
+import json
+import logging
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Any, Iterator
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows: un seul processus, verrou local seulement
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+SECTIONS = ('slots', 'reservations')
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+class NodeLeaderLock:
+    """Verrou fichier non bloquant: un seul worker du nœud porte une tâche de fond
+
+    Le verrou est gardé tant que le worker vit et libéré par le système à sa mort,
+    ce qui permet à un autre worker de prendre le relais au tour suivant.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._file = None
+
+    @property
+    def held(self) -> bool:
+        return fcntl is None or self._file is not None
+
+    def acquire(self) -> bool:
+        """Ce worker est-il (ou devient-il) le porteur de la tâche ?"""
+        if self.held:
+            return True
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        lock_file = open(self.path, 'w')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._file = lock_file
+        return True
+
+
+class NodeLedger:
+    """Baux (slots, réservations) des workers du nœud, indexés par session"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def transaction(self) -> Iterator[Dict[str, Dict[str, Any]]]:
+        """Lire, modifier puis réécrire le registre sous verrou exclusif"""
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, 'a+') as ledger_file:
+                if fcntl:
+                    fcntl.flock(ledger_file, fcntl.LOCK_EX)
+                try:
+                    ledger_file.seek(0)
+                    try:
+                        data = json.loads(ledger_file.read() or '{}')
+                    except ValueError:
+                        logger.warning(f"Registre du nœud illisible, réinitialisé: {self.path}")
+                        data = {}
+                    for section in SECTIONS:
+                        leases = data.setdefault(section, {})
+                        for key in [key for key, lease in leases.items() if not _pid_alive(lease['pid'])]:
+                            del leases[key]
+                    yield data
+                    ledger_file.seek(0)
+                    ledger_file.truncate()
+                    ledger_file.write(json.dumps(data))
+                    ledger_file.flush()
+                finally:
+                    if fcntl:
+                        fcntl.flock(ledger_file, fcntl.LOCK_UN)
+
+    def leases(self, section: str) -> Dict[str, Dict[str, Any]]:
+        """Copie des baux vivants d'une section"""
+        with self.transaction() as data:
+            return dict(data[section])
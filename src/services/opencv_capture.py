@@ -0,0 +1,226 @@
+"""
+Capture de secours OpenCV - Lecture caméra découplée de l'écriture à cadence fixe
+Un thread lecteur remplit un tampon circulaire préalloué; l'écrivain produit une
+image par tic d'horloge en dupliquant ou en sautant des images pour tenir le fps.
+"""
+
+import time
+import logging
+import threading
+from typing import Dict, Optional, Any, Callable, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class FrameRing:
+    """Tampon circulaire d'images de taille fixe, alloué une seule fois
+
+    Un seul producteur (le lecteur) et un seul consommateur (l'écrivain).
+    Les images horodatées à leur réception sont recopiées dans des cases
+    préallouées: aucune allocation par image après le démarrage.
+    """
+
+    def __init__(self, capacity: int, shape: Tuple[int, int, int]):
+        self.capacity = capacity
+        self.shape = shape
+        self.frames = np.empty((capacity,) + shape, dtype=np.uint8)
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.write_index = 0  # nombre total d'images reçues
+        self.read_index = 0   # prochaine image non consommée
+        self._lock = threading.Lock()
+
+    def push(self, frame: np.ndarray, timestamp: float):
+        with self._lock:
+            slot = self.frames[self.write_index % self.capacity]
+            if frame.shape == self.shape:
+                np.copyto(slot, frame)
+            else:
+                # La caméra a changé de résolution après une reconnexion
+                cv2.resize(frame, (self.shape[1], self.shape[0]), dst=slot)
+            self.timestamps[self.write_index % self.capacity] = timestamp
+            self.write_index += 1
+
+    def take(self, deadline: float, out: np.ndarray, max_backlog: int = 2) -> Tuple[bool, int]:
+        """Copier dans out la plus ancienne image non consommée reçue avant deadline
+
+        Les images en retard au-delà de max_backlog sont sautées (source plus
+        rapide que la sortie). Retourne (nouvelle image ?, images sautées).
+        Sans nouvelle image, out garde la précédente: l'appelant la duplique.
+        """
+        with self._lock:
+            oldest = max(self.read_index, self.write_index - self.capacity)
+            overwritten = oldest - self.read_index
+            eligible = 0
+            while oldest + eligible < self.write_index \
+                    and self.timestamps[(oldest + eligible) % self.capacity] <= deadline:
+                eligible += 1
+            if not eligible:
+                self.read_index = oldest
+                return False, overwritten
+            skipped = max(0, eligible - 1 - max_backlog)
+            chosen = oldest + skipped
+            np.copyto(out, self.frames[chosen % self.capacity])
+            self.read_index = chosen + 1
+            return True, overwritten + skipped
+
+
+class OpenCVCaptureEngine:
+    """Enregistrement d'une caméra en MP4 à cadence constante, sans FFmpeg
+
+    run() s'exécute dans le thread fourni par le pool d'encodeurs et rend la
+    main quand should_stop() devient vrai ou que la durée maximale est atteinte.
+    """
+
+    def __init__(self, camera_url: str, output_path: str, fps: int,
+                 should_stop: Callable[[], bool], max_duration: float,
+                 on_progress: Optional[Callable[..., None]] = None,
+                 buffer_seconds: float = 1.0, open_timeout: float = 15.0,
+                 reconnect_initial_delay: float = 0.5, reconnect_max_delay: float = 30.0,
+                 max_read_failures: int = 25):
+        self.camera_url = camera_url
+        self.output_path = output_path
+        self.fps = fps
+        self.should_stop = should_stop
+        self.max_duration = max_duration
+        self.on_progress = on_progress
+        self.capacity = max(4, int(fps * buffer_seconds))
+        self.open_timeout = open_timeout
+        self.reconnect_initial_delay = reconnect_initial_delay
+        self.reconnect_max_delay = reconnect_max_delay
+        self.max_read_failures = max_read_failures
+        # Retard volontaire de l'écrivain: absorbe la gigue réseau sans doublon/saut
+        self.latency = 2.0 / fps
+
+        self.ring: Optional[FrameRing] = None
+        self._first_frame = threading.Event()
+        self._stopped = threading.Event()
+
+        self.frames_written = 0
+        self.frames_read = 0
+        self.duplicated = 0
+        self.dropped = 0
+        self.reconnects = 0
+
+    def run(self) -> int:
+        """Capturer jusqu'à l'arrêt; retourne le nombre d'images écrites"""
+        reader = threading.Thread(target=self._read_loop, name='opencv-reader', daemon=True)
+        reader.start()
+        try:
+            deadline = time.monotonic() + self.open_timeout
+            while not self._first_frame.wait(0.1):
+                if self.should_stop():
+                    return 0
+                if time.monotonic() > deadline:
+                    raise Exception(f"Aucune image reçue de la caméra après {self.open_timeout:.0f}s: {self.camera_url}")
+            return self._write_loop()
+        finally:
+            self._stopped.set()
+            reader.join(timeout=5)
+
+    def _write_loop(self) -> int:
+        height, width, _ = self.ring.shape
+        out = cv2.VideoWriter(self.output_path, cv2.VideoWriter_fourcc(*'mp4v'), self.fps, (width, height))
+        if not out.isOpened():
+            raise Exception(f"Impossible d'ouvrir le fichier de sortie: {self.output_path}")
+
+        frame = np.empty(self.ring.shape, dtype=np.uint8)
+        period = 1.0 / self.fps
+        started = time.monotonic()
+        try:
+            while not self.should_stop():
+                # Échéance du tic calculée depuis le départ: pas de dérive cumulée
+                tick = started + self.frames_written * period
+                if tick - started > self.max_duration:
+                    break
+                delay = tick - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+
+                fresh, skipped = self.ring.take(tick - self.latency, frame)
+                self.dropped += skipped
+                if not fresh and self.frames_written:
+                    self.duplicated += 1
+                elif not fresh:
+                    # Tic avant la première image utilisable: rien à dupliquer
+                    started += period
+                    continue
+
+                out.write(frame)
+                self.frames_written += 1
+                if self.frames_written == 1 or self.frames_written % self.fps == 0:
+                    self._report('encoding')
+        finally:
+            out.release()
+        self._report('finished')
+        return self.frames_written
+
+    def _read_loop(self):
+        """Lire la caméra en continu, se reconnecter avec un délai exponentiel"""
+        delay = self.reconnect_initial_delay
+        scratch = None
+        while not self._stopped.is_set():
+            cap = cv2.VideoCapture(self.camera_url)
+            if not cap.isOpened():
+                cap.release()
+                logger.warning(f"Caméra injoignable ({self.camera_url}), nouvelle tentative dans {delay:.1f}s")
+                self._stopped.wait(delay)
+                delay = min(delay * 2, self.reconnect_max_delay)
+                self.reconnects += 1
+                continue
+
+            # Un fichier se lit plus vite que le temps réel: le cadencer sur son propre fps
+            file_fps = cap.get(cv2.CAP_PROP_FPS) if cap.get(cv2.CAP_PROP_FRAME_COUNT) > 0 else 0
+            opened_at = time.monotonic()
+            frames_this_connection = 0
+            failures = 0
+            while not self._stopped.is_set():
+                ok, scratch = cap.read(scratch)
+                if not ok:
+                    failures += 1
+                    if failures >= self.max_read_failures:
+                        break
+                    continue
+                failures = 0
+                delay = self.reconnect_initial_delay
+                now = time.monotonic()
+                if self.ring is None:
+                    self.ring = FrameRing(self.capacity, scratch.shape)
+                    self._first_frame.set()
+                self.ring.push(scratch, now)
+                self.frames_read += 1
+                frames_this_connection += 1
+                if file_fps:
+                    ahead = opened_at + frames_this_connection / file_fps - time.monotonic()
+                    if ahead > 0:
+                        time.sleep(ahead)
+            cap.release()
+
+            if not self._stopped.is_set():
+                logger.warning(f"Flux interrompu ({self.camera_url}), reconnexion dans {delay:.1f}s")
+                self._stopped.wait(delay)
+                delay = min(delay * 2, self.reconnect_max_delay)
+                self.reconnects += 1
+
+    def _report(self, state: str):
+        if self.on_progress:
+            self.on_progress(
+                frames=self.frames_written,
+                out_time=round(self.frames_written / self.fps, 3),
+                fps=self.fps,
+                dup_frames=self.duplicated,
+                drop_frames=self.dropped,
+                state=state
+            )
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'frames_read': self.frames_read,
+            'frames_written': self.frames_written,
+            'duplicated': self.duplicated,
+            'dropped': self.dropped,
+            'reconnects': self.reconnects,
+            'buffer_capacity': self.capacity
+        }
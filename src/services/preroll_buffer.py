@@ -0,0 +1,430 @@
+"""
+Tampon de pré-enregistrement par terrain - Les dernières minutes toujours disponibles
+Un FFmpeg par terrain recopie le flux caméra (sans décodage) dans une playlist HLS
+tournante: nombre de segments borné, les plus anciens sont supprimés au fil de l'eau.
+Un enregistrement démarré sur le terrain lit cette playlist à partir d'un point
+passé puis la suit en direct, sans ouvrir de seconde connexion à la caméra.
+En mode préchauffage, chaque terrain garde un tampon minimal: connexion ouverte,
+paramètres du flux connus et dernière image clé sur disque, l'encodeur s'y
+rattache sans attendre la caméra.
+En mode ingestion, ce même FFmpeg décode aussi le flux une seule fois pour deux
+sorties partagées: un anneau d'images basse résolution (analyse) et une image
+fixe rafraîchie chaque seconde (aperçus). Aucun consommateur n'ouvre la caméra.
+"""
+
+import os
+import json
+import math
+import shutil
+import time
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Any, List
+
+from ..models.user import Court
+from .encoder_pool import EncoderPoolFullError
+from .media_probe import probe_stream
+from .recording_recovery import find_ffmpeg_readers, find_orphaned_ffmpeg, terminate_ffmpeg
+from .shared_frames import SharedFrameRing
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows: un seul processus propriétaire
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+PREROLL_PLAYLIST_NAME = 'index.m3u8'
+PREROLL_SOURCE_NAME = 'source.json'
+ANALYSIS_RING_NAME = 'analysis.ring'
+SNAPSHOT_NAME = 'snapshot.jpg'
+# Codecs qu'on peut recopier dans des segments fMP4 sans réencoder
+PREROLL_VIDEO_CODECS = ('h264', 'hevc')
+# Un tampon permanent doit survivre aux coupures caméra: redémarrages quasi illimités
+PREROLL_MAX_RESTARTS = 100000
+
+
+class PrerollBuffer:
+    """Tampon d'un terrain porté par ce worker"""
+
+    def __init__(self, court_id: int, camera_url: str, seconds: int, directory: Path, segment_count: int):
+        self.court_id = court_id
+        self.camera_url = camera_url
+        self.seconds = seconds
+        self.directory = directory
+        self.segment_count = segment_count
+        self.session_id = f"preroll_{court_id}"
+        self.source: Optional[Dict[str, Any]] = None
+        self.lock_file = None
+        self.started_at = time.time()
+        # Sorties de l'ingestion (None pour un simple tampon)
+        self.analysis_size: Optional[tuple] = None
+        self.ring: Optional[SharedFrameRing] = None
+
+    def write_frame(self, frame: bytes):
+        """Image brute d'analyse lue sur la sortie du FFmpeg (boucle du pool)"""
+        if self.ring:
+            self.ring.write(frame)
+
+    @property
+    def playlist_path(self) -> str:
+        return str(self.directory / PREROLL_PLAYLIST_NAME)
+
+
+class PrerollManager:
+    """Démarre, surveille et expose les tampons de pré-enregistrement des terrains
+
+    Un seul worker du nœud porte le tampon d'un terrain (verrou fichier libéré
+    à sa mort); tous les workers peuvent y rattacher un enregistrement.
+    """
+
+    def __init__(self, base_path: str, encoder_pool, segment_duration: int = 2):
+        self.base_path = Path(base_path)
+        self.base_path.mkdir(parents=True, exist_ok=True)
+        self.encoder_pool = encoder_pool
+        self.segment_duration = segment_duration
+
+        self.max_seconds = int(os.environ.get('PADELVAR_PREROLL_MAX_SECONDS', 300))
+        # Un remux sans décodage coûte une fraction de slot d'encodage
+        self.cost = float(os.environ.get('PADELVAR_PREROLL_COST', 0.1))
+        self.sync_interval = 30.0
+
+        # Préchauffage: un tampon minimal (deux segments) sur chaque terrain
+        self.prewarm = os.environ.get('PADELVAR_CAMERA_PREWARM', '0') == '1'
+        self.prewarm_seconds = 2 * segment_duration
+
+        # Ingestion: une connexion et un décodage par terrain pour tous les consommateurs
+        self.ingest = os.environ.get('PADELVAR_CAMERA_INGEST', '0') == '1'
+        self.ingest_cost = float(os.environ.get('PADELVAR_INGEST_COST', 0.35))
+        self.analysis_width = int(os.environ.get('PADELVAR_ANALYSIS_WIDTH', 320))
+        self.analysis_fps = int(os.environ.get('PADELVAR_ANALYSIS_FPS', 5))
+        self.analysis_ring_seconds = 10
+        self.snapshot_width = 1280
+
+        self._buffers: Dict[int, PrerollBuffer] = {}
+        self._lock = threading.Lock()
+        self._last_sync = 0.0
+
+    # ------------------------------------------------------------------
+    # Cycle de vie (appelé en contexte d'application)
+    # ------------------------------------------------------------------
+
+    def sync_due(self) -> bool:
+        return time.monotonic() - self._last_sync >= self.sync_interval
+
+    def wanted_seconds(self, court: Court) -> int:
+        """Durée de tampon voulue pour un terrain (0 = pas de tampon)"""
+        seconds = court.preroll_seconds or 0
+        if (self.prewarm or self.ingest) and court.camera_url:
+            seconds = max(seconds, self.prewarm_seconds)
+        return min(seconds, self.max_seconds)
+
+    def sync(self):
+        """Aligner les tampons de ce worker sur la configuration des terrains"""
+        self._last_sync = time.monotonic()
+        query = Court.query if self.prewarm or self.ingest else Court.query.filter(Court.preroll_seconds > 0)
+        wanted = {court.id: court for court in query.all() if self.wanted_seconds(court) > 0}
+
+        with self._lock:
+            owned = dict(self._buffers)
+        for court_id, buffer in owned.items():
+            court = wanted.get(court_id)
+            if not court or court.camera_url != buffer.camera_url or \
+                    self.wanted_seconds(court) != buffer.seconds:
+                self.stop_buffer(court_id)
+
+        for court_id, court in wanted.items():
+            if court_id not in self._buffers:
+                self.start_buffer(court)
+
+    def start_buffer(self, court: Court) -> bool:
+        """Démarrer le tampon d'un terrain si aucun autre worker ne le porte"""
+        seconds = self.wanted_seconds(court)
+        if seconds <= 0:
+            return False
+
+        directory = self.base_path / f"court_{court.id}"
+        directory.mkdir(parents=True, exist_ok=True)
+        buffer = PrerollBuffer(court.id, court.camera_url, seconds, directory,
+                               segment_count=math.ceil(seconds / self.segment_duration) + 1)
+        if not self._acquire(buffer):
+            return False
+
+        # Le FFmpeg d'un propriétaire mort peut encore écrire dans le tampon
+        for orphan in find_orphaned_ffmpeg(directory):
+            terminate_ffmpeg(orphan['pid'], buffer.playlist_path, timeout=5)
+
+        source = probe_stream(court.camera_url)
+        if source is None and shutil.which('ffprobe'):
+            # Caméra injoignable: nouvel essai à la prochaine synchronisation
+            logger.debug(f"Caméra du terrain {court.id} injoignable, tampon non démarré")
+            self._release(buffer)
+            return False
+        if source and source.get('video_codec') not in PREROLL_VIDEO_CODECS:
+            # Réencoder en permanent chaque caméra n'est pas un coût acceptable
+            logger.warning(
+                f"Pré-enregistrement impossible pour le terrain {court.id}: "
+                f"codec {source.get('video_codec')} non recopiable"
+            )
+            self._release(buffer)
+            return False
+        buffer.source = source
+        if self.ingest:
+            buffer.analysis_size = self._analysis_size(source)
+
+        with self._lock:
+            self._buffers[court.id] = buffer
+        try:
+            if buffer.analysis_size:
+                width, height = buffer.analysis_size
+                self.encoder_pool.submit(
+                    buffer.session_id,
+                    command_factory=lambda attempt: self._build_command(buffer, attempt),
+                    on_exit=self._on_buffer_exit,
+                    cost=self.ingest_cost,
+                    on_output=buffer.write_frame,
+                    output_frame_size=width * height,
+                    max_restarts=PREROLL_MAX_RESTARTS,
+                    queue=False
+                )
+            else:
+                self.encoder_pool.submit(
+                    buffer.session_id,
+                    command_factory=lambda attempt: self._build_command(buffer, attempt),
+                    on_exit=self._on_buffer_exit,
+                    cost=self.cost,
+                    max_restarts=PREROLL_MAX_RESTARTS,
+                    queue=False
+                )
+        except EncoderPoolFullError:
+            logger.warning(f"Pas de slot pour le pré-enregistrement du terrain {court.id}, nouvel essai plus tard")
+            with self._lock:
+                self._buffers.pop(court.id, None)
+            self._release(buffer)
+            return False
+
+        logger.info(f"{'Ingestion' if buffer.analysis_size else 'Pré-enregistrement'} active pour "
+                    f"le terrain {court.id} ({seconds}s de tampon)")
+        return True
+
+    def _analysis_size(self, source: Optional[Dict[str, Any]]) -> tuple:
+        """Dimensions paires du flux d'analyse, au ratio de la caméra"""
+        width = self.analysis_width
+        if source and source.get('width') and source.get('height'):
+            height = int(round(width * source['height'] / source['width'] / 2)) * 2
+        else:
+            height = width * 9 // 16
+        return width, max(2, height)
+
+    def stop_buffer(self, court_id: int):
+        buffer = self._buffers.get(court_id)
+        if not buffer:
+            return
+        self.encoder_pool.stop(buffer.session_id, timeout=5)
+        # Encodeur déjà sorti du pool: le callback de fin ne viendra plus
+        with self._lock:
+            if self._buffers.get(court_id) is buffer:
+                del self._buffers[court_id]
+        self._release(buffer)
+
+    def stop_all(self):
+        for court_id in list(self._buffers.keys()):
+            self.stop_buffer(court_id)
+
+    def _on_buffer_exit(self, session_id: str, returncode: Optional[int], reason: str):
+        with self._lock:
+            buffer = next((b for b in self._buffers.values() if b.session_id == session_id), None)
+            if buffer:
+                del self._buffers[buffer.court_id]
+        if buffer:
+            if buffer.ring:
+                buffer.ring.close()
+                buffer.ring = None
+            if reason == 'failed':
+                logger.error(f"Pré-enregistrement abandonné pour le terrain {buffer.court_id} (code {returncode})")
+            self._release(buffer)
+
+    def _build_command(self, buffer: PrerollBuffer, attempt: int) -> List[str]:
+        if attempt == 0:
+            if find_ffmpeg_readers(Path(buffer.playlist_path)):
+                # Des enregistrements suivent encore la playlist: on la prolonge (append_list)
+                logger.info(f"Tampon du terrain {buffer.court_id} repris avec ses lecteurs, segments conservés")
+            else:
+                # Tampon neuf: rien d'un ancien propriétaire ne doit passer pour du direct
+                for entry in buffer.directory.iterdir():
+                    if entry.name != '.lock':
+                        entry.unlink()
+            if buffer.source:
+                # Paramètres du flux partagés avec les autres workers: pas de sonde au démarrage
+                with open(buffer.directory / PREROLL_SOURCE_NAME, 'w') as source_file:
+                    json.dump(buffer.source, source_file)
+            if buffer.analysis_size:
+                width, height = buffer.analysis_size
+                if buffer.ring:
+                    buffer.ring.close()
+                buffer.ring = SharedFrameRing.create(
+                    str(buffer.directory / ANALYSIS_RING_NAME), width, height,
+                    slots=self.analysis_fps * self.analysis_ring_seconds
+                )
+
+        command = ['ffmpeg', '-y', '-nostats', '-loglevel', 'error']
+        if buffer.camera_url.startswith('rtsp://'):
+            command += ['-rtsp_transport', 'tcp']
+        command += [
+            '-i', buffer.camera_url,
+            '-map', '0:v:0', '-map', '0:a:0?',
+            '-c', 'copy',
+            '-f', 'hls',
+            '-hls_time', str(self.segment_duration),
+            '-hls_list_size', str(buffer.segment_count),
+            '-hls_delete_threshold', '1',
+            '-hls_segment_type', 'fmp4',
+            '-hls_fmp4_init_filename', 'init.mp4',
+            # Pas d'ENDLIST: les lecteurs continuent de suivre la playlist après un redémarrage
+            '-hls_flags', 'delete_segments+append_list+temp_file+program_date_time+omit_endlist',
+            '-hls_segment_filename', str(buffer.directory / 'seg_%06d.m4s'),
+            buffer.playlist_path
+        ]
+        if buffer.analysis_size:
+            command += self._ingest_outputs(buffer)
+        return command
+
+    def _ingest_outputs(self, buffer: PrerollBuffer) -> List[str]:
+        """Sorties décodées de l'ingestion: images grises sur stdout, image fixe atomique"""
+        width, height = buffer.analysis_size
+        return [
+            '-filter_complex',
+            (f"[0:v:0]split=2[analysis][still];"
+             f"[analysis]fps={self.analysis_fps},scale={width}:{height},format=gray[frames];"
+             f"[still]fps=1,scale='min({self.snapshot_width},iw)':-2[snapshot]"),
+            '-map', '[frames]', '-f', 'rawvideo', '-pix_fmt', 'gray', 'pipe:1',
+            '-map', '[snapshot]', '-q:v', '4', '-f', 'image2', '-update', '1', '-atomic_writing', '1',
+            str(buffer.directory / SNAPSHOT_NAME)
+        ]
+
+    def _acquire(self, buffer: PrerollBuffer) -> bool:
+        """Verrou exclusif du terrain, libéré automatiquement si le worker meurt"""
+        if fcntl is None:
+            return True
+        lock_file = open(buffer.directory / '.lock', 'w')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        buffer.lock_file = lock_file
+        return True
+
+    def _release(self, buffer: PrerollBuffer):
+        # Sans playlist, aucun nouvel enregistrement ne se rattache à un tampon arrêté
+        try:
+            os.remove(buffer.playlist_path)
+        except OSError:
+            pass
+        if buffer.lock_file:
+            buffer.lock_file.close()
+            buffer.lock_file = None
+
+    # ------------------------------------------------------------------
+    # Lecture du tampon (depuis n'importe quel worker)
+    # ------------------------------------------------------------------
+
+    def _playlist_path(self, court_id: int) -> Path:
+        return self.base_path / f"court_{court_id}" / PREROLL_PLAYLIST_NAME
+
+    def _segment_durations(self, court_id: int) -> List[float]:
+        try:
+            with open(self._playlist_path(court_id)) as playlist:
+                return [float(line[len('#EXTINF:'):].split(',')[0])
+                        for line in playlist if line.startswith('#EXTINF:')]
+        except (OSError, ValueError):
+            return []
+
+    def is_live(self, court_id: int) -> bool:
+        """Le tampon reçoit-il encore des segments ?"""
+        try:
+            age = time.time() - os.path.getmtime(self._playlist_path(court_id))
+        except OSError:
+            return False
+        return age < max(3 * self.segment_duration, 10)
+
+    def snapshot_path(self, court_id: int, max_age: float = 5.0) -> Optional[str]:
+        """Dernière image fixe du terrain écrite par l'ingestion, si elle est récente"""
+        path = self.base_path / f"court_{court_id}" / SNAPSHOT_NAME
+        try:
+            if time.time() - path.stat().st_mtime > max_age:
+                return None
+        except OSError:
+            return None
+        return str(path)
+
+    def analysis_feed(self, court_id: int) -> Optional[SharedFrameRing]:
+        """Anneau d'images d'analyse du terrain (à fermer par l'appelant), si l'ingestion est vivante"""
+        if not self.is_live(court_id):
+            return None
+        return SharedFrameRing.open(str(self.base_path / f"court_{court_id}" / ANALYSIS_RING_NAME))
+
+    def source_info(self, court_id: int) -> Optional[Dict[str, Any]]:
+        """Paramètres du flux caméra sondés au démarrage du tampon"""
+        try:
+            with open(self.base_path / f"court_{court_id}" / PREROLL_SOURCE_NAME) as source_file:
+                return json.load(source_file)
+        except (OSError, ValueError):
+            return None
+
+    def attach(self, court_id: int, seconds: int) -> Optional[Dict[str, Any]]:
+        """Entrée FFmpeg d'un enregistrement qui commence `seconds` dans le passé
+
+        Retourne None si le terrain n'a pas de tampon vivant.
+        """
+        if not self.is_live(court_id):
+            return None
+
+        durations = self._segment_durations(court_id)
+        if not durations:
+            return None
+
+        # Remonter segment par segment jusqu'à couvrir la durée demandée
+        segments, available = 0, 0.0
+        for duration in reversed(durations):
+            if available >= seconds:
+                break
+            segments += 1
+            available += duration
+
+        return {
+            'playlist': str(self._playlist_path(court_id)),
+            'start_index': -max(1, segments),
+            'preroll_seconds': round(available, 1) if seconds > 0 else 0
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """État des tampons du nœud (disque occupé, durée disponible)"""
+        stats = {}
+        for directory in sorted(self.base_path.glob('court_*')):
+            try:
+                court_id = int(directory.name[len('court_'):])
+            except ValueError:
+                continue
+            durations = self._segment_durations(court_id)
+            buffer = self._buffers.get(court_id)
+            stats[court_id] = {
+                'owned_by_this_worker': buffer is not None,
+                'configured_seconds': buffer.seconds if buffer else None,
+                'live': self.is_live(court_id),
+                'segments': len(durations),
+                'available_seconds': round(sum(durations), 1),
+                'disk_bytes': sum(f.stat().st_size for f in directory.iterdir() if f.is_file()),
+                'snapshot_fresh': self.snapshot_path(court_id) is not None
+            }
+        return {
+            'prewarm': self.prewarm,
+            'ingest': self.ingest,
+            'ingest_cost': self.ingest_cost,
+            'analysis': {'width': self.analysis_width, 'fps': self.analysis_fps},
+            'max_seconds': self.max_seconds,
+            'segment_duration': self.segment_duration,
+            'cost_per_buffer': self.cost,
+            'courts': stats
+        }
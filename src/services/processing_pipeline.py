@@ -0,0 +1,151 @@
+"""
+Pipeline de post-traitement des enregistrements
+Chaque étape dispose de ses propres workers, de ses relances et de ses mesures de durée
+"""
+
+import time
+import queue
+import threading
+import logging
+from typing import Dict, Optional, Any, Callable, List
+
+logger = logging.getLogger(__name__)
+
+
+class PipelineStage:
+    """Étape du pipeline: un handler exécuté par un nombre borné de workers"""
+
+    def __init__(self, name: str, handler: Callable[[Dict[str, Any]], None],
+                 workers: int = 1, max_retries: int = 0, retry_delay: float = 5.0):
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+
+        self.queue: queue.Queue = queue.Queue()
+        self.in_progress = 0
+        self.processed = 0
+        self.failed = 0
+        self.retries = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'workers': self.workers,
+            'queued': self.queue.qsize(),
+            'in_progress': self.in_progress,
+            'processed': self.processed,
+            'failed': self.failed,
+            'retries': self.retries,
+            'avg_seconds': round(self.total_seconds / self.processed, 3) if self.processed else None,
+            'max_seconds': round(self.max_seconds, 3)
+        }
+
+
+class ProcessingPipeline:
+    """Enchaîne les étapes pour chaque job; un job est un dict partagé entre étapes
+
+    Le job doit porter 'app' (instance Flask) : chaque étape s'exécute dans
+    son contexte d'application. Les durées par étape sont cumulées dans
+    job['timings'] et dans les statistiques de l'étape.
+    """
+
+    def __init__(self, stages: List[PipelineStage],
+                 on_failure: Optional[Callable[[Dict[str, Any], str, Exception], None]] = None):
+        self.stages = stages
+        self.on_failure = on_failure
+        self._lock = threading.Lock()
+        self._started = False
+
+    def submit(self, job: Dict[str, Any]):
+        """Confier un job à la première étape"""
+        self._ensure_workers()
+        job.setdefault('timings', {})
+        job.setdefault('attempts', {})
+        job['submitted_at'] = time.time()
+        self.stages[0].queue.put(job)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {stage.name: stage.get_stats() for stage in self.stages}
+
+    def _ensure_workers(self):
+        with self._lock:
+            if self._started:
+                return
+            for index, stage in enumerate(self.stages):
+                for worker_number in range(stage.workers):
+                    threading.Thread(
+                        target=self._worker_loop,
+                        args=(index,),
+                        name=f'pipeline-{stage.name}-{worker_number}',
+                        daemon=True
+                    ).start()
+            self._started = True
+
+    def _worker_loop(self, index: int):
+        stage = self.stages[index]
+        while True:
+            job = stage.queue.get()
+            try:
+                self._run_stage(index, job)
+            except Exception as e:
+                logger.error(f"Erreur inattendue dans l'étape {stage.name}: {e}")
+            finally:
+                stage.queue.task_done()
+
+    def _run_stage(self, index: int, job: Dict[str, Any]):
+        stage = self.stages[index]
+        attempt = job['attempts'].get(stage.name, 0) + 1
+        job['attempts'][stage.name] = attempt
+
+        with self._lock:
+            stage.in_progress += 1
+        started = time.monotonic()
+        try:
+            with job['app'].app_context():
+                stage.handler(job)
+        except Exception as e:
+            elapsed = time.monotonic() - started
+            job['timings'][stage.name] = round(job['timings'].get(stage.name, 0) + elapsed, 3)
+            with self._lock:
+                stage.in_progress -= 1
+
+            if attempt <= stage.max_retries:
+                with self._lock:
+                    stage.retries += 1
+                delay = stage.retry_delay * attempt
+                logger.warning(
+                    f"Étape {stage.name} échouée pour {job.get('session_id')} ({e}), "
+                    f"nouvelle tentative {attempt}/{stage.max_retries} dans {delay:.0f}s"
+                )
+                timer = threading.Timer(delay, stage.queue.put, args=(job,))
+                timer.daemon = True
+                timer.start()
+                return
+
+            with self._lock:
+                stage.failed += 1
+            logger.error(f"Étape {stage.name} abandonnée pour {job.get('session_id')}: {e}")
+            if self.on_failure:
+                try:
+                    with job['app'].app_context():
+                        self.on_failure(job, stage.name, e)
+                except Exception as callback_error:
+                    logger.error(f"Erreur lors du traitement de l'échec: {callback_error}")
+            return
+
+        elapsed = time.monotonic() - started
+        job['timings'][stage.name] = round(job['timings'].get(stage.name, 0) + elapsed, 3)
+        with self._lock:
+            stage.in_progress -= 1
+            stage.processed += 1
+            stage.total_seconds += elapsed
+            stage.max_seconds = max(stage.max_seconds, elapsed)
+
+        if index + 1 < len(self.stages):
+            self.stages[index + 1].queue.put(job)
+        else:
+            job['timings']['total'] = round(time.time() - job['submitted_at'], 3)
+            logger.info(f"Post-traitement terminé pour {job.get('session_id')}: {job['timings']}")
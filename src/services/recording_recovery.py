@@ -0,0 +1,459 @@
+"""
+Reprise après crash - Réconciliation des enregistrements orphelins
+Au démarrage, un worker retrouve les encodeurs FFmpeg dont le parent est mort,
+les fichiers partiels et l'état en base resté bloqué, récupère ce qui peut
+l'être en vidéos et libère les terrains
+"""
+
+import os
+import re
+import time
+import signal
+import shutil
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional, Any, List, Set
+
+from ..models.database import db
+from ..models.user import ActiveRecording, Court, Video, RecordingSession
+from .media_probe import probe_stream
+
+logger = logging.getLogger(__name__)
+
+SESSION_ID_PATTERN = re.compile(r'rec_\d+_\d+_[0-9a-f]{8}')
+
+# Fichiers intermédiaires laissés par une fusion ou un segment HLS interrompus
+PARTIAL_FILE_PATTERNS = ('*.merged.mp4', '*.parts.txt', '*/*.tmp')
+
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _read_cmdline(pid: int) -> List[str]:
+    try:
+        with open(f'/proc/{pid}/cmdline', 'rb') as cmdline:
+            return [arg.decode(errors='replace') for arg in cmdline.read().split(b'\0') if arg]
+    except OSError:
+        return []
+
+
+def _read_ppid(pid: int) -> Optional[int]:
+    try:
+        with open(f'/proc/{pid}/stat') as stat:
+            # Le nom du processus peut contenir des espaces: on repart de la dernière parenthèse
+            return int(stat.read().rsplit(')', 1)[1].split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _is_ffmpeg(cmdline: List[str]) -> bool:
+    return bool(cmdline) and os.path.basename(cmdline[0]).startswith('ffmpeg')
+
+
+def terminate_ffmpeg(pid: int, marker: str, timeout: float = 10.0) -> bool:
+    """Arrêter proprement (SIGTERM, FFmpeg écrit alors son index) un FFmpeg orphelin
+
+    marker doit figurer dans sa ligne de commande: le PID a pu être réattribué.
+    """
+    if not os.path.isdir('/proc'):
+        logger.warning(f"Impossible de vérifier le processus {pid} sans /proc, laissé en place")
+        return False
+    cmdline = _read_cmdline(pid)
+    if not _is_ffmpeg(cmdline) or not any(marker in arg for arg in cmdline):
+        return False
+
+    try:
+        os.kill(pid, signal.SIGTERM)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and os.path.exists(f'/proc/{pid}'):
+            time.sleep(0.1)
+        if os.path.exists(f'/proc/{pid}'):
+            os.kill(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    except PermissionError as e:
+        logger.error(f"Arrêt du processus orphelin {pid} refusé: {e}")
+        return False
+
+    logger.warning(f"Processus FFmpeg orphelin arrêté: {pid} ({marker})")
+    return True
+
+
+def find_ffmpeg_readers(path: Path) -> List[int]:
+    """Processus FFmpeg dont la ligne de commande désigne ce fichier (lecteurs d'une playlist)"""
+    if not os.path.isdir('/proc'):
+        return []
+
+    target = str(path.resolve())
+    readers = []
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        cmdline = _read_cmdline(int(name))
+        if not _is_ffmpeg(cmdline):
+            continue
+        try:
+            cwd = os.readlink(f'/proc/{name}/cwd')
+        except OSError:
+            continue
+        if any(os.path.abspath(os.path.join(cwd, arg)) == target for arg in cmdline[1:]):
+            readers.append(int(name))
+    return readers
+
+
+def find_orphaned_ffmpeg(directory: Path) -> List[Dict[str, Any]]:
+    """Processus FFmpeg écrivant sous directory dont le parent est mort
+
+    Rattachés à init (ou à un parent disparu), plus personne ne les supervise.
+    """
+    if not os.path.isdir('/proc'):
+        return []
+
+    root = str(directory.resolve())
+    orphans = []
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        pid = int(name)
+        cmdline = _read_cmdline(pid)
+        if not _is_ffmpeg(cmdline):
+            continue
+
+        ppid = _read_ppid(pid)
+        if ppid not in (None, 1) and _pid_alive(ppid):
+            continue
+
+        try:
+            cwd = os.readlink(f'/proc/{pid}/cwd')
+        except OSError:
+            continue
+        if any(os.path.abspath(os.path.join(cwd, arg)).startswith(root + os.sep) for arg in cmdline[1:]):
+            orphans.append({'pid': pid, 'cmdline': cmdline})
+    return orphans
+
+
+class RecordingRecovery:
+    """Réconciliation de l'état des enregistrements après l'arrêt brutal d'un worker"""
+
+    def __init__(self, capture_service, terminate_timeout: float = 10.0):
+        self.capture_service = capture_service
+        self.registry = capture_service.registry
+        self.terminate_timeout = terminate_timeout
+
+    def run(self) -> Dict[str, Any]:
+        """Réconcilier encodeurs, fichiers et base; renvoie un rapport de ce qui a été fait"""
+        report: Dict[str, Any] = {
+            'reclaimed_sessions': [],
+            'salvaged_videos': [],
+            'unrecoverable': [],
+            'killed_encoders': [],
+            'released_courts': [],
+            'resumed_processing': [],
+            'removed_partial_files': []
+        }
+
+        orphaned = self._claim_orphaned_entries()
+        live_sessions = self._live_sessions()
+
+        # Arrêter les encodeurs avant de toucher à leurs fichiers
+        for entry in orphaned:
+            if entry['encoder_pid'] and entry['node'] == self.registry.node:
+                if terminate_ffmpeg(entry['encoder_pid'], entry['session_id'], self.terminate_timeout):
+                    report['killed_encoders'].append(entry['encoder_pid'])
+        report['killed_encoders'] += self._kill_orphan_encoders(live_sessions)
+
+        for entry in orphaned:
+            report['reclaimed_sessions'].append(entry['session_id'])
+            video_id = self._salvage(entry)
+            if video_id:
+                report['salvaged_videos'].append(video_id)
+            else:
+                report['unrecoverable'].append(entry['session_id'])
+            ActiveRecording.query.filter_by(id=entry['id']).delete(synchronize_session=False)
+            db.session.commit()
+
+        self._drop_abandoned_results()
+        report['released_courts'] = self._release_stuck_courts(live_sessions)
+        report['resumed_processing'] = self._resume_processing()
+        report['removed_partial_files'] = self._remove_partial_files(live_sessions)
+
+        if any(report.values()):
+            logger.warning(f"Reprise après crash: {report}")
+        else:
+            logger.info("Reprise après crash: aucun enregistrement orphelin")
+        return report
+
+    # ------------------------------------------------------------------
+    # Registre
+    # ------------------------------------------------------------------
+
+    def _owner_is_dead(self, entry: ActiveRecording) -> bool:
+        """Le worker propriétaire de l'entrée n'existe plus"""
+        if entry.node == self.registry.node:
+            if entry.worker_pid == self.registry.worker_pid:
+                # PID réutilisé (conteneur redémarré): cette session ne nous appartient pas
+                return entry.session_id not in self.capture_service.active_recordings
+            if not _pid_alive(entry.worker_pid):
+                return True
+        return entry.is_stale(self.registry.stale_after)
+
+    def _claim_orphaned_entries(self) -> List[Dict[str, Any]]:
+        """Réserver les entrées orphelines; un seul worker récupère chaque session"""
+        claimed = []
+        for entry in self.registry.list_active():
+            if not self._owner_is_dead(entry):
+                continue
+            # Copie avant la mise à jour: le commit recharge l'entrée
+            orphan = {
+                'id': entry.id,
+                'session_id': entry.session_id,
+                'court_id': entry.court_id,
+                'user_id': entry.user_id,
+                'node': entry.node,
+                'worker_pid': entry.worker_pid,
+                'encoder_pid': entry.encoder_pid,
+                'mode': entry.mode,
+                'video_path': entry.video_path,
+                'started_at': entry.started_at,
+                'heartbeat_at': entry.heartbeat_at
+            }
+            # Compare-and-set sur le heartbeat: les autres workers qui démarrent en même temps perdent
+            updated = ActiveRecording.query.filter_by(id=orphan['id'], heartbeat_at=orphan['heartbeat_at']).update({
+                'status': 'recovering',
+                'node': self.registry.node,
+                'worker_pid': self.registry.worker_pid,
+                'heartbeat_at': datetime.utcnow()
+            }, synchronize_session=False)
+            db.session.commit()
+            if updated:
+                logger.warning(
+                    f"Enregistrement orphelin {orphan['session_id']} "
+                    f"(worker {orphan['node']}/{orphan['worker_pid']}, encodeur {orphan['encoder_pid']})"
+                )
+                claimed.append(orphan)
+        return claimed
+
+    def _live_sessions(self) -> Set[str]:
+        """Sessions encore portées par un worker vivant (y compris celui-ci)"""
+        live = set(self.capture_service.active_recordings.keys())
+        for entry in self.registry.list_active():
+            if entry.status != 'recovering':
+                live.add(entry.session_id)
+        return live
+
+    def _drop_abandoned_results(self):
+        """Résultats d'arrêt publiés pour un worker qui n'est jamais venu les lire"""
+        for entry in ActiveRecording.query.filter(ActiveRecording.result.isnot(None)).all():
+            if entry.is_stale(self.registry.stale_after * 6):
+                db.session.delete(entry)
+        db.session.commit()
+
+    # ------------------------------------------------------------------
+    # Encodeurs
+    # ------------------------------------------------------------------
+
+    def _kill_orphan_encoders(self, live_sessions: Set[str]) -> List[int]:
+        """Encodeurs FFmpeg d'une session inconnue dont le worker parent est mort"""
+        killed = []
+        for orphan in find_orphaned_ffmpeg(self.capture_service.base_path):
+            session_ids = {match for arg in orphan['cmdline'] for match in SESSION_ID_PATTERN.findall(arg)}
+            if not session_ids or session_ids & live_sessions:
+                continue
+            if terminate_ffmpeg(orphan['pid'], next(iter(session_ids)), self.terminate_timeout):
+                killed.append(orphan['pid'])
+        return killed
+
+    # ------------------------------------------------------------------
+    # Fichiers
+    # ------------------------------------------------------------------
+
+    def _salvage(self, entry: Dict[str, Any]) -> Optional[int]:
+        """Transformer ce qui reste d'un enregistrement orphelin en vidéo"""
+        service = self.capture_service
+        session_id = entry['session_id']
+        video_path = entry['video_path']
+        if not video_path:
+            return None
+
+        video_filename = os.path.relpath(video_path, service.base_path)
+        existing = Video.query.filter_by(file_url=f"/videos/{video_filename}").first()
+        if existing:
+            # Le crash est survenu après l'arrêt: le post-traitement reprendra la vidéo
+            return existing.id
+
+        if entry['mode'] == 'segmented':
+            segment_dir = os.path.dirname(video_path)
+            if not os.path.exists(video_path) or not list(Path(segment_dir).glob('seg_*.m4s')):
+                logger.warning(f"Aucun segment récupérable pour {session_id}")
+                return None
+            parts = [video_path]
+        else:
+            parts = self._recoverable_parts(session_id, video_path)
+            if not parts:
+                logger.warning(f"Aucune partie lisible pour {session_id}, fichier non récupérable")
+                return None
+            if len(parts) == 1 and parts[0] != video_path:
+                os.replace(parts[0], video_path)
+                parts = [video_path]
+
+        # Durée écoulée jusqu'au dernier signe de vie du worker; ffprobe la corrigera
+        last_seen = entry['heartbeat_at'] or entry['started_at']
+        duration = int((last_seen - entry['started_at']).total_seconds()) if entry['started_at'] else 0
+
+        recording_session = RecordingSession.query.filter_by(recording_id=session_id).first()
+        session_name = (recording_session.title if recording_session and recording_session.title
+                        else f"Enregistrement récupéré du {entry['started_at']:%d/%m/%Y %H:%M}")
+
+        result = service._create_processing_video({
+            'session_id': session_id,
+            'court_id': entry['court_id'],
+            'user_id': entry['user_id'],
+            'session_name': session_name,
+            'video_filename': video_filename,
+            'video_path': video_path,
+            'mode': entry['mode'],
+            'parts': parts,
+            'start_time': entry['started_at']
+        }, None, duration=duration)
+
+        if result['status'] != 'processing':
+            return None
+        logger.warning(f"Enregistrement {session_id} récupéré dans la vidéo {result['video_id']}")
+        return result['video_id']
+
+    def _recoverable_parts(self, session_id: str, video_path: str) -> List[str]:
+        """Parties MP4 lisibles (un MP4 coupé net n'a pas d'index et est perdu)"""
+        base_path = self.capture_service.base_path
+        candidates = [video_path] + sorted(
+            (str(p) for p in base_path.glob(f"{session_id}_part*.mp4")),
+            key=lambda p: int(re.search(r'_part(\d+)\.mp4$', p).group(1))
+        )
+        can_probe = shutil.which('ffprobe') is not None
+
+        parts = []
+        for candidate in candidates:
+            if not os.path.exists(candidate) or os.path.getsize(candidate) == 0:
+                continue
+            if can_probe:
+                info = probe_stream(candidate, timeout=30)
+                if not info or not info.get('video_codec'):
+                    logger.warning(f"Partie illisible ignorée: {candidate}")
+                    continue
+            parts.append(candidate)
+        return parts
+
+    def _remove_partial_files(self, live_sessions: Set[str]) -> List[str]:
+        """Supprimer les fichiers intermédiaires qu'aucun worker vivant n'écrit"""
+        base_path = self.capture_service.base_path
+        cutoff = time.time() - self.registry.stale_after
+        removed = []
+        for pattern in PARTIAL_FILE_PATTERNS:
+            for partial in base_path.glob(pattern):
+                match = SESSION_ID_PATTERN.search(str(partial.relative_to(base_path)))
+                if match and match.group(0) in live_sessions:
+                    continue
+                try:
+                    if partial.stat().st_mtime < cutoff:
+                        partial.unlink()
+                        removed.append(str(partial))
+                except OSError as e:
+                    logger.error(f"Suppression impossible de {partial}: {e}")
+        return removed
+
+    # ------------------------------------------------------------------
+    # Base de données
+    # ------------------------------------------------------------------
+
+    def _release_stuck_courts(self, live_sessions: Set[str]) -> List[int]:
+        """Libérer les terrains marqués en enregistrement sans enregistrement vivant"""
+        released = []
+        for court in Court.query.filter_by(is_recording=True).all():
+            if court.recording_session_id and court.recording_session_id in live_sessions:
+                continue
+            if court.current_recording_id and RecordingSession.query.filter_by(
+                recording_id=court.current_recording_id, status='active'
+            ).first():
+                # Session planifiée (durée réservée): elle expire d'elle-même
+                continue
+
+            court.is_recording = False
+            court.recording_session_id = None
+            court.current_recording_id = None
+            released.append(court.id)
+            logger.warning(f"Terrain {court.id} libéré: aucun enregistrement vivant")
+
+        db.session.commit()
+        return released
+
+    def _pipeline_is_dead(self, video: Video) -> bool:
+        """Le worker qui porte le post-traitement de la vidéo n'existe plus"""
+        if video.processing_node == self.registry.node:
+            if video.processing_pid == self.registry.worker_pid:
+                # PID réutilisé (conteneur redémarré): ce pipeline n'est pas le nôtre
+                return video.id not in self.capture_service._processing_videos
+            if video.processing_pid and not _pid_alive(video.processing_pid):
+                return True
+        # Sans propriétaire (vidéo créée juste avant le crash): la création tient lieu de signe de vie
+        last_seen = video.processing_heartbeat_at or video.created_at
+        return not last_seen or (datetime.utcnow() - last_seen).total_seconds() > self.registry.stale_after
+
+    def _resume_processing(self) -> List[int]:
+        """Relancer le post-traitement des vidéos dont le pipeline a disparu avec le worker
+
+        Une vidéo déjà reprise ('recovering') par un worker mort à son tour est reprise
+        de nouveau: seul le battement de cœur du propriétaire compte, pas l'âge.
+        """
+        service = self.capture_service
+        resumed = []
+        for video in Video.query.filter(Video.processing_status.in_(('processing', 'recovering'))).all():
+            if not self._pipeline_is_dead(video):
+                continue
+            video_filename = video.file_url[len('/videos/'):] if video.file_url else None
+            if not video_filename:
+                continue
+            session_id = video_filename.split('/')[0].rsplit('.', 1)[0]
+
+            video_path = service.base_path / video_filename
+            if not video_path.exists() and (service.storage_path / video_filename).exists():
+                video_path = service.storage_path / video_filename
+            mode = 'segmented' if video_filename.endswith('.m3u8') else 'mp4'
+            parts = [str(video_path)]
+            if mode == 'mp4':
+                parts += sorted(
+                    (str(p) for p in service.base_path.glob(f"{session_id}_part*.mp4")),
+                    key=lambda p: int(re.search(r'_part(\d+)\.mp4$', p).group(1))
+                )
+
+            # Compare-and-set sur le battement de cœur: un seul worker reprend la vidéo
+            updated = Video.query.filter_by(
+                id=video.id, processing_status=video.processing_status,
+                processing_heartbeat_at=video.processing_heartbeat_at
+            ).update({
+                'processing_status': 'recovering',
+                'processing_node': self.registry.node,
+                'processing_pid': self.registry.worker_pid,
+                'processing_heartbeat_at': datetime.utcnow()
+            }, synchronize_session=False)
+            db.session.commit()
+            if not updated:
+                continue
+
+            service.submit_processing(video.id, {
+                'session_id': session_id,
+                'mode': mode,
+                'video_path': str(video_path),
+                'video_filename': video_filename,
+                'parts': parts
+            }, None)
+            resumed.append(video.id)
+        return resumed
@@ -0,0 +1,127 @@
+"""
+Registre partagé des enregistrements actifs
+Stocké en base pour que tous les workers (gunicorn) puissent consulter ou
+arrêter un enregistrement, quel que soit le processus qui porte l'encodeur
+"""
+
+import os
+import json
+import time
+import socket
+import logging
+from datetime import datetime
+from typing import Dict, Optional, Any, List
+
+from ..models.database import db
+from ..models.user import ActiveRecording
+
+logger = logging.getLogger(__name__)
+
+
+class RecordingRegistry:
+    """Accès au registre des enregistrements actifs (table active_recording)"""
+
+    def __init__(self, heartbeat_interval: float = 2.0, stale_after: float = None):
+        self.node = os.environ.get('PADELVAR_NODE_ID', socket.gethostname())
+        self.heartbeat_interval = heartbeat_interval
+        # Au-delà, le worker propriétaire est considéré comme mort
+        self.stale_after = stale_after or heartbeat_interval * 5
+
+    @property
+    def worker_pid(self) -> int:
+        # Évalué à chaque appel: gunicorn peut forker après l'import du module
+        return os.getpid()
+
+    def is_local(self, entry: ActiveRecording) -> bool:
+        """L'encodeur de cette entrée tourne-t-il dans ce processus ?"""
+        return entry.node == self.node and entry.worker_pid == self.worker_pid
+
+    def register(self, recording: Dict[str, Any], encoder_pid: int = None):
+        """Déclarer un enregistrement démarré par ce worker"""
+        entry = ActiveRecording(
+            session_id=recording['session_id'],
+            court_id=recording['court_id'],
+            user_id=recording['user_id'],
+            node=self.node,
+            worker_pid=self.worker_pid,
+            encoder_pid=encoder_pid,
+            status=recording['status'],
+            mode=recording.get('mode'),
+            video_path=recording['video_path']
+        )
+        db.session.add(entry)
+        db.session.commit()
+
+    def get(self, session_id: str) -> Optional[ActiveRecording]:
+        return ActiveRecording.query.filter_by(session_id=session_id).first()
+
+    def list_active(self) -> List[ActiveRecording]:
+        return ActiveRecording.query.filter(ActiveRecording.result.is_(None)).all()
+
+    def heartbeat(self, recordings: Dict[str, Dict[str, Any]]) -> List[str]:
+        """Rafraîchir les entrées de ce worker et renvoyer les arrêts demandés ailleurs
+
+        recordings associe chaque session locale à {'status', 'encoder_pid'}.
+        """
+        if not recordings:
+            return []
+
+        now = datetime.utcnow()
+        for session_id, state in recordings.items():
+            ActiveRecording.query.filter_by(session_id=session_id).update({
+                'heartbeat_at': now,
+                'status': state['status'],
+                'encoder_pid': state.get('encoder_pid')
+            }, synchronize_session=False)
+        db.session.commit()
+
+        rows = db.session.query(ActiveRecording.session_id).filter(
+            ActiveRecording.session_id.in_(list(recordings.keys())),
+            ActiveRecording.stop_requested.is_(True),
+            ActiveRecording.result.is_(None)
+        ).all()
+        return [row.session_id for row in rows]
+
+    def request_stop(self, session_id: str) -> bool:
+        """Demander au worker propriétaire d'arrêter l'enregistrement"""
+        updated = ActiveRecording.query.filter_by(session_id=session_id, result=None).update(
+            {'stop_requested': True}, synchronize_session=False
+        )
+        db.session.commit()
+        return updated > 0
+
+    def release(self, session_id: str, result: Dict[str, Any]):
+        """L'encodeur local est arrêté: publier le résultat ou retirer l'entrée"""
+        entry = self.get(session_id)
+        if not entry:
+            return
+        if entry.stop_requested:
+            # Un autre worker attend ce résultat, il supprimera l'entrée
+            entry.result = json.dumps(result, default=str)
+            entry.status = result.get('status', 'completed')
+        else:
+            db.session.delete(entry)
+        db.session.commit()
+
+    def wait_for_result(self, session_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """Attendre que le worker propriétaire publie le résultat de l'arrêt"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            db.session.expire_all()
+            entry = self.get(session_id)
+            if not entry:
+                return None
+            if entry.result:
+                result = json.loads(entry.result)
+                db.session.delete(entry)
+                db.session.commit()
+                return result
+            if entry.is_stale(self.stale_after):
+                logger.warning(f"Worker propriétaire de {session_id} ne répond plus ({entry.node}/{entry.worker_pid})")
+                return None
+            time.sleep(0.25)
+        return None
+
+    def remove(self, session_id: str):
+        ActiveRecording.query.filter_by(session_id=session_id).delete(synchronize_session=False)
+        db.session.commit()
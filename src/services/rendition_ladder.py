@@ -0,0 +1,259 @@
+"""
+Échelle de débits (ABR) - Déclinaisons 360p/540p/720p et playlist maîtresse HLS
+Les déclinaisons sont produites en arrière-plan par un nombre borné de processus
+FFmpeg à basse priorité (nice), pour ne jamais prendre de cœurs aux enregistrements.
+Elles sont générées à la première demande, ou d'avance pour les vidéos populaires.
+"""
+
+import os
+import shutil
+import logging
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Optional, Any, List, Tuple
+
+from ..models.database import db
+from ..models.user import Video, Court
+from .media_probe import probe_stream
+from .video_capture_service import video_capture_service
+
+logger = logging.getLogger(__name__)
+
+MASTER_PLAYLIST = 'master.m3u8'
+
+# (nom, hauteur, débit vidéo, débit audio): du plus léger au plus lourd
+RENDITION_LADDER: List[Tuple[str, int, str, str]] = [
+    ('360p', 360, '600k', '64k'),
+    ('540p', 540, '1200k', '96k'),
+    ('720p', 720, '2M', '128k'),
+]
+
+
+def ladder_for(source_height: Optional[int]) -> List[Tuple[str, int, str, str]]:
+    """Déclinaisons utiles pour une source: jamais au-dessus de sa résolution"""
+    if not source_height:
+        return RENDITION_LADDER
+    rungs = [rung for rung in RENDITION_LADDER if rung[1] <= source_height]
+    return rungs or RENDITION_LADDER[:1]
+
+
+def _lower_priority(niceness: int):
+    """Exécuté dans le processus FFmpeg avant exec: priorité CPU minimale"""
+    def apply():
+        os.nice(niceness)
+    return apply
+
+
+class RenditionService:
+    """Génération des déclinaisons ABR sur un pool borné de processus FFmpeg"""
+
+    def __init__(self, output_path: str = "static/renditions", max_workers: int = None,
+                 threads_per_job: int = None, niceness: int = None, popular_views: int = None,
+                 max_pending: int = 20, max_attempts: int = 3):
+        self.output_path = Path(output_path)
+        self.max_workers = max_workers or int(os.environ.get('PADELVAR_RENDITION_WORKERS', 1))
+        # Cœurs accordés à chaque FFmpeg: le pool entier n'occupe qu'une part de la machine
+        self.threads_per_job = threads_per_job or int(os.environ.get(
+            'PADELVAR_RENDITION_THREADS', max(1, (os.cpu_count() or 1) // 4)))
+        self.niceness = niceness if niceness is not None else int(os.environ.get('PADELVAR_RENDITION_NICE', 19))
+        # Nombre de lectures à partir duquel une vidéo est déclinée d'avance
+        self.popular_views = popular_views or int(os.environ.get('PADELVAR_RENDITION_POPULAR_VIEWS', 5))
+        self.segment_duration = 4
+        self.ffmpeg_timeout = 4 * 3600
+        # Une génération bloquée depuis plus longtemps (worker arrêté) peut être reprise
+        self.stale_after = timedelta(hours=6)
+        # Échec: nouvel essai après ce délai, au plus max_attempts générations de suite
+        self.retry_after = timedelta(minutes=float(os.environ.get('PADELVAR_RENDITION_RETRY_MINUTES', 30)))
+        self.max_attempts = max_attempts
+        self.max_pending = max_pending
+
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='rendition')
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.completed = 0
+        self.failed = 0
+
+    def directory(self, video: Video) -> Path:
+        return self.output_path / str(video.id)
+
+    def request(self, app, video: Video) -> str:
+        """Demander les déclinaisons d'une vidéo; retourne leur statut
+
+        La vidéo est réservée en base (mise à jour conditionnelle) : un seul
+        worker, tous processus confondus, la prend en charge. Un échec n'est
+        retenté qu'après retry_after, et au plus max_attempts fois. 'busy' si
+        trop de générations attendent déjà dans ce worker.
+        """
+        if video.renditions_status == 'ready' and (self.directory(video) / MASTER_PLAYLIST).exists():
+            return 'ready'
+        if video.processing_status != 'ready' or not video.file_url:
+            return 'unavailable'
+
+        with self._lock:
+            if self._pending >= self.max_pending:
+                return 'busy'
+            self._pending += 1
+
+        now = datetime.utcnow()
+        claimed = Video.query.filter(
+            Video.id == video.id,
+            db.or_(
+                Video.renditions_status.is_(None),
+                Video.renditions_status == 'ready',
+                db.and_(Video.renditions_status == 'failed',
+                        Video.renditions_attempts < self.max_attempts,
+                        Video.renditions_updated_at < now - self.retry_after),
+                db.and_(Video.renditions_status.in_(('pending', 'processing')),
+                        Video.renditions_updated_at < now - self.stale_after)
+            )
+        ).update({
+            Video.renditions_status: 'pending',
+            Video.renditions_updated_at: now,
+            Video.renditions_attempts: db.func.coalesce(Video.renditions_attempts, 0) + 1
+        }, synchronize_session=False)
+        db.session.commit()
+        db.session.refresh(video)
+        if claimed:
+            self._executor.submit(self._run, app, video.id)
+        else:
+            with self._lock:
+                self._pending -= 1
+        return video.renditions_status
+
+    def note_view(self, app, video: Video):
+        """Compter une lecture; une vidéo devenue populaire est déclinée d'avance"""
+        Video.query.filter_by(id=video.id).update(
+            {Video.view_count: db.func.coalesce(Video.view_count, 0) + 1}, synchronize_session=False
+        )
+        db.session.commit()
+        db.session.refresh(video)
+        if video.view_count >= self.popular_views and video.renditions_status is None:
+            self.request(app, video)
+
+    def _run(self, app, video_id: int):
+        try:
+            with app.app_context():
+                video = Video.query.get(video_id)
+                if not video:
+                    return
+                video.renditions_status = 'processing'
+                video.renditions_updated_at = datetime.utcnow()
+                db.session.commit()
+                try:
+                    self._generate(video)
+                    video.renditions_status = 'ready'
+                    video.renditions_attempts = 0
+                    self.completed += 1
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Déclinaisons ABR impossibles pour la vidéo {video_id}: {e}")
+                    video.renditions_status = 'failed'
+                    self.failed += 1
+                video.renditions_updated_at = datetime.utcnow()
+                db.session.commit()
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _generate(self, video: Video):
+        source = video_capture_service.resolve_media_path(video)
+        if not source or not os.path.exists(source):
+            raise FileNotFoundError("Média de la vidéo introuvable")
+
+        rungs = ladder_for(video.height)
+        info = probe_stream(source) or {}
+        has_audio = bool(info.get('audio_codec'))
+        fps = video.fps or info.get('fps') or 25
+
+        # Construction à côté puis renommage: la playlist servie est toujours complète
+        directory = self.directory(video)
+        directory.parent.mkdir(parents=True, exist_ok=True)
+        work_dir = directory.parent / f"{video.id}.{os.getpid()}.tmp"
+        shutil.rmtree(work_dir, ignore_errors=True)
+        work_dir.mkdir()
+        try:
+            command = self.command(source, str(work_dir.resolve()), rungs, has_audio, fps)
+            result = subprocess.run(command, capture_output=True, timeout=self.ffmpeg_timeout,
+                                    preexec_fn=_lower_priority(self.niceness))
+            if result.returncode != 0:
+                raise RuntimeError(result.stderr.decode('utf-8', 'replace').strip()[-200:] or
+                                   f"FFmpeg a échoué (code {result.returncode})")
+            shutil.rmtree(directory, ignore_errors=True)
+            os.replace(work_dir, directory)
+        except Exception:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            raise
+
+        size = sum(path.stat().st_size for path in directory.rglob('*') if path.is_file())
+        court = Court.query.get(video.court_id)
+        video_capture_service.retention.register(
+            video, court.club_id if court else None, [('renditions', str(directory), size)]
+        )
+        logger.info(f"Déclinaisons ABR de la vidéo {video.id} générées: "
+                    f"{', '.join(rung[0] for rung in rungs)} ({size // 1024 ** 2} Mo)")
+
+    def command(self, source: str, output_dir: str, rungs: List[Tuple[str, int, str, str]],
+                has_audio: bool, fps: float) -> List[str]:
+        """Une seule lecture de la source, mise à l'échelle et encodée pour chaque déclinaison
+
+        Les images clés sont forcées au même rythme partout (GOP fixe, sans détection
+        de scène) pour que le lecteur puisse changer de débit à chaque segment.
+        """
+        gop = max(1, int(round(fps * self.segment_duration)))
+        splits = ''.join(f"[s{number}]" for number in range(len(rungs)))
+        scales = ';'.join(f"[s{number}]scale=-2:{height}[v{number}]"
+                          for number, (_, height, _, _) in enumerate(rungs))
+        command = [
+            'ffmpeg', '-y', '-v', 'error', '-i', source,
+            '-filter_complex', f"[0:v]split={len(rungs)}{splits};{scales}"
+        ]
+        stream_map = []
+        for number, (name, _, video_bitrate, audio_bitrate) in enumerate(rungs):
+            command += ['-map', f"[v{number}]"]
+            command += [f'-b:v:{number}', video_bitrate, f'-maxrate:v:{number}', video_bitrate,
+                        f'-bufsize:v:{number}', video_bitrate]
+            if has_audio:
+                command += ['-map', '0:a:0', f'-b:a:{number}', audio_bitrate]
+                stream_map.append(f"v:{number},a:{number},name:{name}")
+            else:
+                stream_map.append(f"v:{number},name:{name}")
+        command += [
+            '-c:v', 'libx264', '-preset', 'veryfast', '-pix_fmt', 'yuv420p',
+            '-g', str(gop), '-keyint_min', str(gop), '-sc_threshold', '0',
+            '-threads', str(self.threads_per_job)
+        ]
+        if has_audio:
+            command += ['-c:a', 'aac', '-ac', '2']
+        command += [
+            '-f', 'hls',
+            '-hls_time', str(self.segment_duration),
+            '-hls_playlist_type', 'vod',
+            '-hls_segment_type', 'fmp4',
+            '-hls_flags', 'independent_segments',
+            '-master_pl_name', MASTER_PLAYLIST,
+            '-var_stream_map', ' '.join(stream_map),
+            '-hls_segment_filename', os.path.join(output_dir, '%v', 'seg_%05d.m4s'),
+            os.path.join(output_dir, '%v', 'index.m3u8')
+        ]
+        return command
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'max_workers': self.max_workers,
+            'threads_per_job': self.threads_per_job,
+            'niceness': self.niceness,
+            'popular_views': self.popular_views,
+            'pending': self._pending,
+            'max_pending': self.max_pending,
+            'max_attempts': self.max_attempts,
+            'completed': self.completed,
+            'failed': self.failed,
+            'ladder': [rung[0] for rung in RENDITION_LADDER]
+        }
+
+
+# Instance globale du service de déclinaisons
+rendition_service = RenditionService()
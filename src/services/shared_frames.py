@@ -0,0 +1,135 @@
+"""
+Anneau d'images partagé - Dernières images basse résolution d'un terrain
+Écrit par le processus d'ingestion du terrain, lu par n'importe quel worker via mmap:
+un consommateur de plus ne coûte ni connexion caméra ni décodage.
+"""
+
+import os
+import mmap
+import time
+import struct
+from typing import Optional, Tuple
+
+import numpy as np
+
+# En-tête: signature, version, canaux, largeur, hauteur, nombre d'emplacements, dernier numéro
+HEADER = struct.Struct('<4sHHIIIQ')
+MAGIC = b'PVFR'
+VERSION = 1
+LATEST_OFFSET = HEADER.size - 8
+# Emplacement: numéro de l'image (0 pendant l'écriture) et instant de capture
+SLOT_HEADER = struct.Struct('<Qd')
+SEQ = struct.Struct('<Q')
+
+
+class SharedFrameRing:
+    """Anneau d'images de taille fixe projeté en mémoire
+
+    Un seul écrivain (le worker qui porte l'ingestion); les lecteurs vérifient le
+    numéro de l'emplacement avant et après la copie pour écarter une image en cours
+    de réécriture.
+    """
+
+    def __init__(self, path: str, buffer: mmap.mmap, width: int, height: int, channels: int, slots: int):
+        self.path = path
+        self._buffer = buffer
+        self.width = width
+        self.height = height
+        self.channels = channels
+        self.slots = slots
+        self.frame_size = width * height * channels
+        self._stride = SLOT_HEADER.size + self.frame_size
+        self._inode = os.stat(path).st_ino
+
+    @classmethod
+    def create(cls, path: str, width: int, height: int, slots: int, channels: int = 1) -> 'SharedFrameRing':
+        """Créer un anneau vide (remplace l'ancien de façon atomique)"""
+        size = HEADER.size + slots * (SLOT_HEADER.size + width * height * channels)
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, 'wb') as ring_file:
+            ring_file.write(HEADER.pack(MAGIC, VERSION, channels, width, height, slots, 0))
+            ring_file.truncate(size)
+        os.replace(temporary_path, path)
+        return cls.open(path, writable=True)
+
+    @classmethod
+    def open(cls, path: str, writable: bool = False) -> Optional['SharedFrameRing']:
+        """Projeter un anneau existant; None s'il est absent ou invalide"""
+        try:
+            with open(path, 'r+b' if writable else 'rb') as ring_file:
+                buffer = mmap.mmap(ring_file.fileno(), 0,
+                                   access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+
+        if len(buffer) < HEADER.size:
+            buffer.close()
+            return None
+        magic, version, channels, width, height, slots, _ = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC or version != VERSION or \
+                len(buffer) < HEADER.size + slots * (SLOT_HEADER.size + width * height * channels):
+            buffer.close()
+            return None
+        return cls(path, buffer, width, height, channels, slots)
+
+    def close(self):
+        self._buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return (self.height, self.width) if self.channels == 1 else (self.height, self.width, self.channels)
+
+    def replaced(self) -> bool:
+        """L'ingestion a-t-elle recréé l'anneau (nouveau flux, nouvelles dimensions) ?"""
+        try:
+            return os.stat(self.path).st_ino != self._inode
+        except OSError:
+            return True
+
+    def latest_seq(self) -> int:
+        return SEQ.unpack_from(self._buffer, LATEST_OFFSET)[0]
+
+    def _slot_offset(self, seq: int) -> int:
+        return HEADER.size + (seq % self.slots) * self._stride
+
+    def write(self, frame: bytes, timestamp: float = None):
+        """Ajouter une image (côté écrivain uniquement)"""
+        if len(frame) != self.frame_size:
+            return
+        seq = self.latest_seq() + 1
+        offset = self._slot_offset(seq)
+        SEQ.pack_into(self._buffer, offset, 0)
+        self._buffer[offset + SLOT_HEADER.size:offset + self._stride] = frame
+        SLOT_HEADER.pack_into(self._buffer, offset, seq, timestamp or time.time())
+        SEQ.pack_into(self._buffer, LATEST_OFFSET, seq)
+
+    def read(self, seq: int) -> Optional[Tuple[float, np.ndarray]]:
+        """Image numéro seq (instant, image); None si elle a déjà été écrasée"""
+        if seq <= 0 or seq > self.latest_seq() or seq <= self.latest_seq() - self.slots:
+            return None
+        offset = self._slot_offset(seq)
+        before, timestamp = SLOT_HEADER.unpack_from(self._buffer, offset)
+        frame = np.frombuffer(self._buffer, dtype=np.uint8, count=self.frame_size,
+                              offset=offset + SLOT_HEADER.size).copy()
+        after = SEQ.unpack_from(self._buffer, offset)[0]
+        if before != seq or after != seq:
+            return None
+        return timestamp, frame.reshape(self.shape)
+
+    def latest(self) -> Optional[Tuple[int, float, np.ndarray]]:
+        """Dernière image complète: (numéro, instant, image)"""
+        seq = self.latest_seq()
+        while seq > 0:
+            result = self.read(seq)
+            if result:
+                return (seq,) + result
+            # Écrasée pendant la lecture par un tour complet de l'anneau: on relit la plus récente
+            newest = self.latest_seq()
+            seq = newest if newest != seq else seq - 1
+        return None
@@ -0,0 +1,195 @@
+"""
+Admission des enregistrements selon l'espace disque et les quotas des clubs
+L'espace nécessaire est estimé d'après la durée prévue et le débit du profil
+d'encodage; un démarrage est refusé ou basculé sur un profil plus léger
+quand le volume ou le quota du club ne suffit pas.
+"""
+
+import os
+import time
+import shutil
+import logging
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional, Any, List, Tuple, Iterator
+
+from ..models.user import Club
+from .node_ledger import NodeLedger
+
+logger = logging.getLogger(__name__)
+
+
+class InsufficientStorageError(Exception):
+    """Ni le volume d'enregistrement ni le quota du club ne peuvent accueillir la session"""
+
+    def __init__(self, message: str, details: Optional[Dict[str, Any]] = None):
+        super().__init__(message)
+        self.details = details or {}
+
+
+def parse_bitrate(value) -> int:
+    """Convertir un débit FFmpeg ('2M', '800k', 2000000) en bits/s"""
+    if isinstance(value, (int, float)):
+        return int(value)
+    value = str(value).strip()
+    multipliers = {'k': 1_000, 'K': 1_000, 'M': 1_000_000, 'G': 1_000_000_000}
+    if value and value[-1] in multipliers:
+        return int(float(value[:-1]) * multipliers[value[-1]])
+    return int(float(value))
+
+
+class StorageAdmission:
+    """Estimation, réservation et contrôle de l'espace des enregistrements en cours
+
+    Sur le disque, une réservation couvre ce que la session va encore écrire:
+    elle décroît avec le temps écoulé, puis s'annule à la fin de l'encodeur
+    (settle). Pour le quota du club, elle compte en entier jusqu'à ce que la
+    rétention inscrive les fichiers dans storage_used_bytes (release). Avec un
+    registre de nœud (ledger), elles sont partagées par tous les workers du nœud.
+    """
+
+    def __init__(self, volume_path: str, min_free_bytes: int = None, margin: float = 1.15,
+                 ledger: Optional[NodeLedger] = None):
+        self.volume_path = Path(volume_path)
+        self.min_free_bytes = min_free_bytes if min_free_bytes is not None else \
+            int(float(os.environ.get('PADELVAR_MIN_FREE_GB', 2)) * 1024 ** 3)
+        self.margin = margin  # marge sur le débit nominal (pics, conteneur, audio)
+        self.ledger = ledger
+        self._reservations: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.total_refused = 0
+        self.total_downgraded = 0
+
+    def estimate_bytes(self, seconds: float, bitrate: int) -> int:
+        return int(seconds * bitrate / 8 * self.margin)
+
+    def free_bytes(self) -> int:
+        return shutil.disk_usage(self.volume_path).free
+
+    @contextmanager
+    def _book(self) -> Iterator[Dict[str, Dict[str, Any]]]:
+        """Réservations modifiables sous verrou (registre du nœud ou mémoire du worker)"""
+        if self.ledger:
+            with self.ledger.transaction() as data:
+                yield data['reservations']
+        else:
+            with self._lock:
+                yield self._reservations
+
+    @staticmethod
+    def _outstanding(reservations: Dict[str, Dict[str, Any]], club_id: Optional[int] = None,
+                     now: float = None) -> int:
+        now = now if now is not None else time.time()
+        total = 0
+        for reservation in reservations.values():
+            if club_id is not None:
+                # Quota: tout ce qui n'est pas encore compté dans storage_used_bytes
+                if reservation['club_id'] == club_id:
+                    total += reservation['bytes']
+                continue
+            if reservation.get('settled'):
+                continue  # déjà écrit: l'espace libre du volume en tient compte
+            elapsed = now - reservation['reserved_at']
+            remaining_ratio = max(0.0, 1 - elapsed / reservation['seconds'])
+            total += int(reservation['bytes'] * remaining_ratio)
+        return total
+
+    def outstanding_bytes(self, club_id: Optional[int] = None) -> int:
+        """Espace encore à écrire (volume) ou pas encore compté dans le quota d'un club"""
+        with self._book() as reservations:
+            return self._outstanding(reservations, club_id)
+
+    def admit(self, club: Optional[Club], seconds: float,
+              profiles: List[Tuple[str, int]], session_id: Optional[str] = None) -> Dict[str, Any]:
+        """Choisir le premier profil (name, débit) qui tient sur le disque et dans le quota
+
+        Avec session_id, l'espace du profil retenu est réservé dans la même
+        transaction: deux workers ne peuvent pas admettre le même espace libre.
+        Lève InsufficientStorageError si même le plus léger ne tient pas.
+        """
+        with self._book() as reservations:
+            admission = self._admit(reservations, club, seconds, profiles)
+            if session_id:
+                reservations[session_id] = self._reservation(
+                    club.id if club else None, admission['estimated_bytes'], seconds
+                )
+        return admission
+
+    def _admit(self, reservations: Dict[str, Dict[str, Any]], club: Optional[Club], seconds: float,
+               profiles: List[Tuple[str, int]]) -> Dict[str, Any]:
+        disk_available = self.free_bytes() - self.min_free_bytes - self._outstanding(reservations)
+        quota_available = None
+        if club and club.storage_quota_bytes is not None:
+            quota_available = club.storage_quota_bytes - (club.storage_used_bytes or 0) \
+                - self._outstanding(reservations, club.id)
+        available = disk_available if quota_available is None else min(disk_available, quota_available)
+
+        for index, (name, bitrate) in enumerate(profiles):
+            needed = self.estimate_bytes(seconds, bitrate)
+            if needed <= available:
+                if index:
+                    self.total_downgraded += 1
+                    logger.warning(f"Espace limité: profil {profiles[0][0]} remplacé par {name} "
+                                   f"({needed // 1024 ** 2} Mo estimés, {max(0, available) // 1024 ** 2} Mo disponibles)")
+                return {'profile': name, 'bitrate': bitrate, 'estimated_bytes': needed, 'downgraded': bool(index)}
+
+        self.total_refused += 1
+        needed = self.estimate_bytes(seconds, profiles[-1][1])
+        details = {
+            'estimated_bytes': needed,
+            'disk_available_bytes': max(0, disk_available),
+            'quota_available_bytes': max(0, quota_available) if quota_available is not None else None
+        }
+        if quota_available is not None and quota_available < needed:
+            raise InsufficientStorageError("Quota de stockage du club atteint", details)
+        raise InsufficientStorageError("Espace disque insuffisant pour cet enregistrement", details)
+
+    @staticmethod
+    def _reservation(club_id: Optional[int], estimated_bytes: int, seconds: float) -> Dict[str, Any]:
+        # Horloge murale: comparée entre processus du nœud
+        return {
+            'pid': os.getpid(),
+            'club_id': club_id,
+            'bytes': estimated_bytes,
+            'seconds': max(1.0, seconds),
+            'reserved_at': time.time()
+        }
+
+    def reserve(self, session_id: str, club_id: Optional[int], estimated_bytes: int, seconds: float):
+        with self._book() as reservations:
+            reservations[session_id] = self._reservation(club_id, estimated_bytes, seconds)
+
+    def settle(self, session_id: str, written_bytes: Optional[int] = None):
+        """L'encodeur est terminé: la réservation ne vaut plus que pour le quota du club,
+        à hauteur de ce qui a été écrit (estimé d'après le temps écoulé si inconnu)"""
+        with self._book() as reservations:
+            reservation = reservations.get(session_id)
+            if not reservation or reservation.get('settled'):
+                return
+            if written_bytes is None:
+                elapsed = time.time() - reservation['reserved_at']
+                written_bytes = int(reservation['bytes'] * min(1.0, elapsed / reservation['seconds']))
+            reservation['bytes'] = written_bytes
+            reservation['settled'] = True
+
+    def release(self, session_id: str):
+        """Les fichiers sont inscrits par la rétention (ou ne le seront jamais)"""
+        with self._book() as reservations:
+            reservations.pop(session_id, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        usage = shutil.disk_usage(self.volume_path)
+        with self._book() as reservations:
+            reserved_sessions = len(reservations)
+            outstanding = self._outstanding(reservations)
+        return {
+            'volume_path': str(self.volume_path),
+            'total_bytes': usage.total,
+            'free_bytes': usage.free,
+            'min_free_bytes': self.min_free_bytes,
+            'reserved_sessions': reserved_sessions,
+            'outstanding_bytes': outstanding,
+            'total_refused': self.total_refused,
+            'total_downgraded': self.total_downgraded
+        }
@@ -0,0 +1,129 @@
+"""
+Storyboard des vidéos - Planches de miniatures et piste WebVTT pour la prévisualisation
+Toutes les miniatures (une toutes les N secondes) sortent d'une seule passe FFmpeg,
+assemblées en planches JPEG: le lecteur charge une planche pour des centaines d'aperçus.
+"""
+
+import os
+import math
+import shutil
+import logging
+import subprocess
+from typing import Dict, Optional, Any, List
+
+logger = logging.getLogger(__name__)
+
+VTT_FILENAME = 'storyboard.vtt'
+SHEET_PATTERN = 'sheet_%03d.jpg'
+
+
+def _timestamp(seconds: float) -> str:
+    """Horodatage WebVTT hh:mm:ss.mmm"""
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3_600_000)
+    minutes, milliseconds = divmod(milliseconds, 60_000)
+    secs, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}.{milliseconds:03d}"
+
+
+def build_vtt(duration: float, interval: float, columns: int, rows: int,
+              tile_width: int, tile_height: int) -> str:
+    """Piste WebVTT: une entrée par miniature, pointant sa zone (#xywh) dans sa planche"""
+    per_sheet = columns * rows
+    lines = ['WEBVTT', '']
+    for number in range(max(1, math.ceil(duration / interval))):
+        start = number * interval
+        end = min(duration, start + interval)
+        sheet, position = divmod(number, per_sheet)
+        x = (position % columns) * tile_width
+        y = (position // columns) * tile_height
+        lines.append(f"{_timestamp(start)} --> {_timestamp(end)}")
+        lines.append(f"{SHEET_PATTERN % sheet}#xywh={x},{y},{tile_width},{tile_height}")
+        lines.append('')
+    return '\n'.join(lines)
+
+
+class StoryboardGenerator:
+    """Génération des planches d'une vidéo en une passe de décodage"""
+
+    def __init__(self, interval: float = None, columns: int = 10, rows: int = 10,
+                 tile_width: int = 160, timeout: float = 1800):
+        self.interval = interval or float(os.environ.get('PADELVAR_STORYBOARD_INTERVAL', 5))
+        self.columns = columns
+        self.rows = rows
+        self.tile_width = tile_width
+        self.timeout = timeout
+
+    def tile_height(self, width: Optional[int], height: Optional[int]) -> int:
+        """Hauteur d'une miniature au ratio de la source (paire, pour le JPEG 4:2:0)"""
+        if not width or not height:
+            return self.tile_width * 9 // 16
+        return max(2, int(round(self.tile_width * height / width / 2)) * 2)
+
+    def command(self, media_path: str, output_dir: str, tile_height: int,
+                keyframe_interval: Optional[float]) -> List[str]:
+        """Une seule commande FFmpeg pour toutes les planches
+
+        Quand le GOP est plus court que l'intervalle, seules les images clés sont
+        décodées (-skip_frame nokey): le filtre fps retient la plus proche de chaque pas.
+        """
+        command = ['ffmpeg', '-y', '-v', 'error']
+        if keyframe_interval and keyframe_interval <= self.interval:
+            command += ['-skip_frame', 'nokey']
+        command += [
+            '-i', media_path, '-map', '0:v:0', '-an',
+            '-vf', (f"fps=1/{self.interval:g},scale={self.tile_width}:{tile_height},"
+                    f"tile={self.columns}x{self.rows}"),
+            '-q:v', '5', '-start_number', '0',
+            os.path.join(output_dir, SHEET_PATTERN)
+        ]
+        return command
+
+    def generate(self, media_path: str, output_dir: str, duration: float,
+                 width: Optional[int] = None, height: Optional[int] = None,
+                 keyframe_interval: Optional[float] = None) -> Dict[str, Any]:
+        """Écrire les planches et la piste WebVTT dans output_dir (remplacé en entier)
+
+        Le dossier est construit à côté puis renommé: un lecteur ne voit jamais
+        une piste pointant des planches incomplètes.
+        """
+        if not duration or duration <= 0:
+            raise ValueError("Durée de la vidéo inconnue")
+
+        tile_height = self.tile_height(width, height)
+        temporary_dir = f"{output_dir.rstrip(os.sep)}.{os.getpid()}.tmp"
+        shutil.rmtree(temporary_dir, ignore_errors=True)
+        os.makedirs(temporary_dir)
+        try:
+            result = subprocess.run(
+                self.command(media_path, temporary_dir, tile_height, keyframe_interval),
+                capture_output=True, timeout=self.timeout
+            )
+            if result.returncode != 0:
+                raise RuntimeError(result.stderr.decode('utf-8', 'replace').strip()[-200:] or
+                                   f"FFmpeg a échoué (code {result.returncode})")
+
+            with open(os.path.join(temporary_dir, VTT_FILENAME), 'w') as vtt_file:
+                vtt_file.write(build_vtt(duration, self.interval, self.columns, self.rows,
+                                         self.tile_width, tile_height))
+
+            shutil.rmtree(output_dir, ignore_errors=True)
+            os.replace(temporary_dir, output_dir)
+        except Exception:
+            shutil.rmtree(temporary_dir, ignore_errors=True)
+            raise
+
+        sheets = sum(1 for name in os.listdir(output_dir) if name.endswith('.jpg'))
+        size = sum(os.path.getsize(os.path.join(output_dir, name)) for name in os.listdir(output_dir))
+        logger.info(f"Storyboard généré: {output_dir} ({sheets} planche(s), "
+                    f"une miniature toutes les {self.interval:g}s)")
+        return {
+            'path': output_dir,
+            'interval': self.interval,
+            'columns': self.columns,
+            'rows': self.rows,
+            'tile_width': self.tile_width,
+            'tile_height': tile_height,
+            'sheets': sheets,
+            'size_bytes': size
+        }
@@ -9,17 +9,44 @@ import time
 import os
 import logging
 from datetime import datetime, timedelta
-from typing import Dict, Optional, Any
+from typing import Dict, Optional, Any, Set
 import uuid
+import hashlib
+import json
 import subprocess
+import shutil
 import requests
 from pathlib import Path
+from collections import deque
+from flask import current_app
 
 from ..models.database import db
-from ..models.user import Video, Court, User
+from ..models.user import Video, Court, User, StoredMedia
+from .encoder_pool import EncoderPool, EncoderPoolFullError, EncoderStartError
+from .node_ledger import NodeLedger
+from .media_probe import probe_stream, probe_media_file, can_copy_video, can_copy_audio
+from .recording_registry import RecordingRegistry
+from .encoder_progress import EncoderProgress, FFMPEG_PROGRESS_ARGS
+from .processing_pipeline import ProcessingPipeline, PipelineStage
+from .opencv_capture import OpenCVCaptureEngine
+from .recording_recovery import RecordingRecovery
+from .preroll_buffer import PrerollManager
+from .media_retention import MediaRetention
+from .storage_admission import StorageAdmission, parse_bitrate
+from .keyframe_index import KeyframeIndex, INDEX_SUFFIX
+from .storyboard import StoryboardGenerator, VTT_FILENAME
+from .highlights import HighlightDetector
 
 logger = logging.getLogger(__name__)
 
+RECORDING_MODES = ('mp4', 'segmented')
+HLS_PLAYLIST_NAME = 'index.m3u8'
+HLS_ENDLIST_TAG = '#EXT-X-ENDLIST'
+ENCODING_MODES = ('auto', 'copy', 'transcode')
+
+# Un remux qui meurt avant ce délai trahit une source incompatible avec la copie
+STREAM_COPY_MIN_RUNTIME = 10
+
 class VideoCaptureService:
     """Service de capture vidéo optimisé pour haute performance"""
     
@@ -30,9 +57,33 @@ class VideoCaptureService:
         self.thumbnails_path = Path("static/thumbnails")
         self.thumbnails_path.mkdir(parents=True, exist_ok=True)
         
+        # Planches de miniatures et piste WebVTT de prévisualisation, par vidéo
+        self.storyboards_path = Path("static/storyboards")
+        self.storyboards_path.mkdir(parents=True, exist_ok=True)
+        self.storyboard = StoryboardGenerator()
+        self._storyboard_locks: Dict[int, threading.Lock] = {}
+        self._storyboard_locks_guard = threading.Lock()
+        self.highlights = HighlightDetector()
+        
         # Sessions d'enregistrement actives
         self.active_recordings: Dict[str, Dict[str, Any]] = {}
-        self.recording_threads: Dict[str, threading.Thread] = {}
+        
+        # Vidéos dont le post-traitement tourne dans ce worker (battement de cœur en base)
+        self._processing_videos: Set[int] = set()
+        
+        # Slots d'encodage et réservations d'espace comptés pour tous les workers du nœud
+        self.node_ledger = NodeLedger(os.environ.get('PADELVAR_NODE_LEDGER', 'static/.node_ledger.json'))
+        
+        # Pool borné d'encodeurs partagé par toutes les sessions du nœud
+        self.encoder_pool = EncoderPool(ledger=self.node_ledger)
+        
+        # Registre en base partagé entre workers, entretenu par un battement de cœur
+        self.registry = RecordingRegistry()
+        self._app = None
+        self._heartbeat_thread: Optional[threading.Thread] = None
+        # Rétention et tampons: tâches lentes, hors du battement de cœur
+        self._maintenance_thread: Optional[threading.Thread] = None
+        self._background_lock = threading.Lock()
         
         # Configuration
         self.max_recording_duration = 3600  # 1 heure max
@@ -43,10 +94,64 @@ class VideoCaptureService:
             'bitrate': '2M'
         }
         
+        # Mode d'enregistrement: 'mp4' (fichier unique) ou 'segmented' (HLS fMP4)
+        self.recording_mode = os.environ.get('PADELVAR_RECORDING_MODE', 'mp4')
+        self.segment_duration = 4  # secondes par segment
+        
+        # Encodage: 'auto' recopie le H.264 de la caméra quand c'est possible
+        self.encoding_mode = os.environ.get('PADELVAR_ENCODING_MODE', 'auto')
+        self.copy_encoder_cost = float(os.environ.get('PADELVAR_COPY_ENCODER_COST', 0.25))
+        # Débits servant à estimer l'espace disque d'une session (et profil allégé si l'espace manque)
+        self.copy_bitrate = os.environ.get('PADELVAR_COPY_BITRATE', '4M')  # caméra sans débit annoncé
+        self.low_bitrate = '1M'
+        self.probe_cache_ttl = 300  # secondes
+        self._probe_cache: Dict[str, Dict[str, Any]] = {}
+        
+        # Tampons de pré-enregistrement des terrains (les dernières minutes toujours sur disque)
+        self.preroll = PrerollManager("static/preroll", self.encoder_pool)
+        
+        # Délais de première image récents, entrée tampon (préchauffée) ou caméra directe
+        self._startup_lock = threading.Lock()
+        self._first_frame_times: Dict[str, deque] = {
+            'buffer': deque(maxlen=200),
+            'camera': deque(maxlen=200)
+        }
+        
+        # Stockage définitif des vidéos terminées (par défaut le dossier d'enregistrement)
+        self.storage_path = Path(os.environ.get('PADELVAR_STORAGE_PATH', base_path))
+        self.storage_path.mkdir(parents=True, exist_ok=True)
+        
+        # Rétention pilotée par l'index des médias rangés (politique par club)
+        self.retention = MediaRetention()
+        
+        # Admission selon l'espace libre du volume d'enregistrement et le quota du club
+        self.admission = StorageAdmission(str(self.base_path), ledger=self.node_ledger)
+        
+        # Post-traitement en arrière-plan: l'arrêt rend la main immédiatement
+        self.processing_pipeline = ProcessingPipeline([
+            PipelineStage('finalize', self._stage_finalize, workers=2),
+            PipelineStage('probe', self._stage_probe, workers=2, max_retries=2),
+            PipelineStage('thumbnail', self._stage_thumbnail, workers=1, max_retries=2),
+            PipelineStage('checksum', self._stage_checksum, workers=1, max_retries=1),
+            PipelineStage('store', self._stage_store, workers=1, max_retries=3),
+            PipelineStage('index', self._stage_index, workers=1),
+            PipelineStage('storyboard', self._stage_storyboard, workers=1),
+            PipelineStage('highlights', self._stage_highlights, workers=1),
+            PipelineStage('ready', self._stage_ready, workers=1, max_retries=3)
+        ], on_failure=self._on_processing_failure)
+        
         logger.info("Service de capture vidéo initialisé")
     
-    def start_recording(self, court_id: int, user_id: int, session_name: str = None) -> Dict[str, Any]:
-        """Démarrer l'enregistrement d'un terrain"""
+    def start_recording(self, court_id: int, user_id: int, session_name: str = None,
+                        mode: str = None, preroll_seconds: int = 0,
+                        planned_seconds: int = None) -> Dict[str, Any]:
+        """Démarrer l'enregistrement d'un terrain
+
+        preroll_seconds fait commencer la vidéo dans le passé, si le terrain a un
+        tampon de pré-enregistrement actif. planned_seconds (par défaut la durée
+        maximale) sert à estimer l'espace disque: le démarrage est refusé
+        (InsufficientStorageError) ou passe à un profil plus léger s'il manque.
+        """
         try:
             # Vérifier que le terrain existe
             court = Court.query.get(court_id)
@@ -65,12 +170,25 @@ class VideoCaptureService:
             if not session_name:
                 session_name = f"Match du {datetime.now().strftime('%d/%m/%Y')}"
             
-            video_filename = f"{session_id}.mp4"
-            video_path = self.base_path / video_filename
-            
             # URL de la caméra du terrain
             camera_url = self._get_camera_url(court_id)
             
+            # Le fallback OpenCV ne sait écrire qu'un fichier MP4 unique
+            mode = mode or self.recording_mode
+            if mode not in RECORDING_MODES:
+                raise ValueError(f"Mode d'enregistrement inconnu: {mode}")
+            use_ffmpeg = shutil.which('ffmpeg') is not None
+            if not use_ffmpeg:
+                mode = 'mp4'
+            
+            if mode == 'segmented':
+                # Segments HLS + playlist dans un dossier propre à la session
+                (self.base_path / session_id).mkdir(parents=True, exist_ok=True)
+                video_filename = f"{session_id}/{HLS_PLAYLIST_NAME}"
+            else:
+                video_filename = f"{session_id}.mp4"
+            video_path = self.base_path / video_filename
+            
             # Configuration de la session
             recording_config = {
                 'session_id': session_id,
@@ -80,31 +198,113 @@ class VideoCaptureService:
                 'video_filename': video_filename,
                 'video_path': str(video_path),
                 'camera_url': camera_url,
-                'start_time': datetime.now(),
+                'start_time': datetime.utcnow(),  # UTC, comme recorded_at et le registre
                 'status': 'starting',
                 'duration': 0,
-                'file_size': 0
+                'file_size': 0,
+                'mode': mode,
+                'encoder': 'ffmpeg',
+                'parts': [str(video_path)],
+                'preroll': None
             }
             
+            # Un tampon vivant sur le terrain (pré-roll ou préchauffage) sert d'entrée:
+            # dernière image clé déjà sur disque et pas de seconde connexion caméra
+            if use_ffmpeg:
+                recording_config['preroll'] = self.preroll.attach(court_id, preroll_seconds or 0)
+                if preroll_seconds and not recording_config['preroll']:
+                    logger.warning(f"Pas de tampon de pré-enregistrement actif pour le terrain {court_id}")
+            input_kind = 'buffer' if recording_config['preroll'] else 'camera'
+            recording_config['progress'] = EncoderProgress(
+                on_first_frame=lambda seconds: self._record_first_frame(seconds, input_kind)
+            )
+            
+            # Sonder la caméra pour savoir si un simple remux suffit (paramètres
+            # déjà connus quand le tampon du terrain ou le scanner de santé les a sondés)
+            if use_ffmpeg:
+                source = None
+                if recording_config['preroll']:
+                    source = self.preroll.source_info(court_id)
+                if not source and court.camera_status == 'online' and court.camera_info \
+                        and court.camera_url == camera_url:
+                    source = json.loads(court.camera_info)
+                source = source or self._probe_source(camera_url)
+                recording_config['source'] = source
+                recording_config['video_copy'] = self._use_stream_copy(source)
+                recording_config['audio_copy'] = can_copy_audio(source)
+            else:
+                recording_config['video_copy'] = False
+            
+            # Espace nécessaire pour la durée prévue: premier profil qui tient, réservé
+            # avant de lancer l'encodeur et gardé jusqu'à l'inscription de la vidéo par la rétention
+            planned_seconds = min(planned_seconds or self.max_recording_duration, self.max_recording_duration)
+            if recording_config['preroll']:
+                planned_seconds += recording_config['preroll']['preroll_seconds']
+            storage = self.admission.admit(
+                court.club, planned_seconds, self._encoding_profiles(recording_config, use_ffmpeg),
+                session_id=session_id
+            )
+            if storage['profile'] != 'copy':
+                recording_config['video_copy'] = False
+                recording_config['video_bitrate'] = storage['bitrate']
+            encoder_cost = self.copy_encoder_cost if recording_config['video_copy'] else 1.0
+            
             # Ajouter à la liste des enregistrements actifs
             self.active_recordings[session_id] = recording_config
             
-            # Démarrer le thread d'enregistrement
-            recording_thread = threading.Thread(
-                target=self._record_video_thread,
-                args=(session_id, recording_config),
-                daemon=True
-            )
-            recording_thread.start()
-            self.recording_threads[session_id] = recording_thread
+            # Confier l'encodeur au pool (démarrage immédiat, file d'attente ou refus)
+            try:
+                if use_ffmpeg:
+                    submission = self.encoder_pool.submit(
+                        session_id,
+                        command_factory=lambda attempt: self._build_ffmpeg_command(session_id, attempt),
+                        on_start=self._on_encoder_start,
+                        on_exit=self._on_encoder_exit,
+                        cost=encoder_cost,
+                        on_output=recording_config['progress'].feed
+                    )
+                else:
+                    logger.warning("FFmpeg non trouvé, utilisation d'OpenCV")
+                    recording_config['encoder'] = 'opencv'
+                    submission = self.encoder_pool.submit(
+                        session_id,
+                        target=lambda: self._record_with_opencv(session_id, recording_config),
+                        on_start=self._on_encoder_start,
+                        on_exit=self._on_encoder_exit
+                    )
+            except Exception:
+                # File pleine ou soumission impossible: ni session ni espace réservé
+                self.active_recordings.pop(session_id, None)
+                self.admission.release(session_id)
+                raise
+            if submission['state'] == 'failed':
+                # Aucun encodeur derrière la session: ne pas l'annoncer comme démarrée
+                self.active_recordings.pop(session_id, None)
+                self.admission.release(session_id)
+                self.registry.release(session_id, {'status': 'error', 'error': "Encodeur non lancé"})
+                raise EncoderStartError(f"Impossible de lancer l'encodeur du terrain {court_id}")
+            
+            # Rendre la session visible des autres workers
+            self.registry.register(recording_config, encoder_pid=submission.get('pid'))
+            self._ensure_heartbeat()
             
-            logger.info(f"Enregistrement démarré: {session_id} pour terrain {court_id}")
+            if submission['state'] == 'queued':
+                recording_config['status'] = 'queued'
+                logger.info(f"Enregistrement en attente d'un slot: {session_id} pour terrain {court_id}")
+            else:
+                logger.info(f"Enregistrement démarré: {session_id} pour terrain {court_id}")
             
             return {
                 'session_id': session_id,
-                'status': 'started',
+                'status': 'queued' if submission['state'] == 'queued' else 'started',
+                'queue_position': submission.get('queue_position'),
                 'message': f"Enregistrement démarré pour {session_name}",
                 'video_filename': video_filename,
+                'mode': mode,
+                'encoding': 'copy' if recording_config['video_copy'] else 'transcode',
+                'storage_profile': storage['profile'],
+                'estimated_bytes': storage['estimated_bytes'],
+                'preroll_seconds': recording_config['preroll']['preroll_seconds'] if recording_config['preroll'] else 0,
                 'camera_url': camera_url
             }
             
@@ -113,25 +313,37 @@ class VideoCaptureService:
             raise e
     
     def stop_recording(self, session_id: str) -> Dict[str, Any]:
-        """Arrêter l'enregistrement d'une session"""
+        """Arrêter l'enregistrement d'une session
+
+        Rend la main dès que la vidéo est créée en base; la fin de l'encodeur,
+        les métadonnées, la miniature, l'empreinte et le rangement sont traités
+        par le pipeline de post-traitement.
+        """
         try:
             if session_id not in self.active_recordings:
-                raise ValueError(f"Session {session_id} non trouvée")
+                # L'encodeur tourne peut-être dans un autre worker
+                return self._stop_remote_recording(session_id)
             
             recording = self.active_recordings[session_id]
+            was_queued = recording['status'] == 'queued'
             recording['status'] = 'stopping'
             
-            # Attendre que le thread se termine (max 10 secondes)
-            if session_id in self.recording_threads:
-                thread = self.recording_threads[session_id]
-                thread.join(timeout=10)
-                del self.recording_threads[session_id]
+            # Demander l'arrêt de l'encodeur sans attendre qu'il finalise son fichier
+            encoder_stopped = self.encoder_pool.request_stop(session_id, timeout=10)
             
-            # Finaliser l'enregistrement
-            result = self._finalize_recording(session_id)
+            if was_queued:
+                # L'encodeur n'a jamais démarré: rien à traiter
+                self.admission.release(session_id)
+                result = {
+                    'status': 'cancelled',
+                    'message': f"Enregistrement annulé avant son démarrage: {recording['session_name']}"
+                }
+            else:
+                result = self._create_processing_video(recording, encoder_stopped)
             
-            # Supprimer de la liste active
+            # Supprimer de la liste active et du registre partagé
             del self.active_recordings[session_id]
+            self.registry.release(session_id, result)
             
             logger.info(f"Enregistrement arrêté: {session_id}")
             return result
@@ -140,203 +352,407 @@ class VideoCaptureService:
             logger.error(f"Erreur lors de l'arrêt de l'enregistrement: {e}")
             raise e
     
+    def _record_first_frame(self, seconds: float, input_kind: str):
+        """Conserver le délai de première image (entrée tampon ou caméra directe)"""
+        with self._startup_lock:
+            self._first_frame_times[input_kind].append(seconds)
+    
+    def get_startup_stats(self) -> Dict[str, Any]:
+        """Délai entre le lancement de l'encodeur et sa première image, par type d'entrée"""
+        stats = {}
+        with self._startup_lock:
+            samples_by_kind = {kind: sorted(samples) for kind, samples in self._first_frame_times.items()}
+        for kind, samples in samples_by_kind.items():
+            if not samples:
+                stats[kind] = {'count': 0}
+                continue
+            stats[kind] = {
+                'count': len(samples),
+                'avg': round(sum(samples) / len(samples), 3),
+                'p50': samples[len(samples) // 2],
+                'p95': samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+                'max': samples[-1]
+            }
+        stats['prewarm'] = self.preroll.prewarm
+        return stats
+    
+    def get_processing_stats(self) -> Dict[str, Any]:
+        """Files, relances et durées de chaque étape du post-traitement"""
+        return self.processing_pipeline.get_stats()
+    
     def get_recording_status(self, session_id: str = None) -> Dict[str, Any]:
-        """Obtenir le statut des enregistrements"""
+        """Obtenir le statut des enregistrements (servi depuis la mémoire, sans accès disque)"""
         try:
             if session_id:
                 if session_id in self.active_recordings:
-                    recording = self.active_recordings[session_id].copy()
-                    recording['duration'] = self._calculate_duration(recording['start_time'])
-                    recording['file_size'] = self._get_file_size(recording['video_path'])
-                    return recording
-                else:
-                    return {'error': f'Session {session_id} non trouvée'}
+                    return self._local_status(session_id, self.active_recordings[session_id])
+                
+                # Session portée par un autre worker
+                entry = self.registry.get(session_id)
+                if entry and not entry.result:
+                    return self._remote_status(entry)
+                return {'error': f'Session {session_id} non trouvée'}
             else:
                 # Retourner tous les enregistrements actifs
                 all_recordings = {}
-                for sid, recording in self.active_recordings.items():
-                    recording_copy = recording.copy()
-                    recording_copy['duration'] = self._calculate_duration(recording['start_time'])
-                    recording_copy['file_size'] = self._get_file_size(recording['video_path'])
-                    all_recordings[sid] = recording_copy
+                for sid, recording in list(self.active_recordings.items()):
+                    all_recordings[sid] = self._local_status(sid, recording)
+                
+                for entry in self.registry.list_active():
+                    if entry.session_id not in all_recordings:
+                        all_recordings[entry.session_id] = self._remote_status(entry)
                 
                 return {
                     'active_recordings': all_recordings,
-                    'total_active': len(all_recordings)
+                    'total_active': len(all_recordings),
+                    'encoder_pool': self.encoder_pool.get_stats()
                 }
                 
         except Exception as e:
             logger.error(f"Erreur lors de la récupération du statut: {e}")
             return {'error': str(e)}
     
-    def _record_video_thread(self, session_id: str, config: Dict[str, Any]):
-        """Thread d'enregistrement vidéo"""
-        try:
-            camera_url = config['camera_url']
-            video_path = config['video_path']
-            
-            logger.info(f"Démarrage capture vidéo: {camera_url} -> {video_path}")
+    def _local_status(self, session_id: str, recording: Dict[str, Any]) -> Dict[str, Any]:
+        """Statut d'une session locale à partir des statistiques de l'encodeur"""
+        status = {key: value for key, value in recording.items() if key != 'progress'}
+        live = recording['progress'].snapshot()
+        status['live'] = live
+        # Durée réellement encodée si l'encodeur l'a déjà signalée, sinon horloge murale
+        if live['seconds_since_update'] is not None:
+            status['duration'] = int(live['out_time'])
+        else:
+            status['duration'] = self._calculate_duration(recording['start_time'])
+        status['file_size'] = live['total_size']
+        if recording['status'] == 'queued':
+            status['queue_position'] = self.encoder_pool.queue_position(session_id)
+        return status
+    
+    def _stop_remote_recording(self, session_id: str, timeout: float = 20) -> Dict[str, Any]:
+        """Faire arrêter une session par le worker qui porte son encodeur"""
+        entry = self.registry.get(session_id)
+        if not entry or entry.result:
+            raise ValueError(f"Session {session_id} non trouvée")
+        
+        if entry.is_stale(self.registry.stale_after):
+            raise ValueError(
+                f"Session {session_id}: le worker {entry.node}/{entry.worker_pid} ne répond plus"
+            )
+        
+        self.registry.request_stop(session_id)
+        result = self.registry.wait_for_result(session_id, timeout)
+        if result is None:
+            raise ValueError(f"Session {session_id}: pas de réponse du worker propriétaire")
+        
+        logger.info(f"Enregistrement arrêté via {entry.node}/{entry.worker_pid}: {session_id}")
+        return result
+    
+    def _remote_status(self, entry) -> Dict[str, Any]:
+        """Statut d'une session portée par un autre worker, lu dans le registre"""
+        status = entry.to_dict()
+        status['duration'] = int((datetime.utcnow() - entry.started_at).total_seconds()) if entry.started_at else 0
+        status['stale'] = entry.is_stale(self.registry.stale_after)
+        return status
+    
+    def _ensure_heartbeat(self):
+        """Démarrer le battement de cœur et la maintenance de ce worker (appelé depuis une requête)
+
+        Plusieurs requêtes peuvent arriver ensemble: un seul thread de chaque sorte.
+        """
+        with self._background_lock:
+            self._app = current_app._get_current_object()
+            if not (self._heartbeat_thread and self._heartbeat_thread.is_alive()):
+                self._heartbeat_thread = threading.Thread(
+                    target=self._heartbeat_loop,
+                    name='recording-registry-heartbeat',
+                    daemon=True
+                )
+                self._heartbeat_thread.start()
+            if not (self._maintenance_thread and self._maintenance_thread.is_alive()):
+                self._maintenance_thread = threading.Thread(
+                    target=self._maintenance_loop,
+                    name='recording-maintenance',
+                    daemon=True
+                )
+                self._maintenance_thread.start()
+    
+    def _maintenance_loop(self):
+        """Rétention des médias et synchronisation des tampons, chacune à son rythme
+
+        Un nettoyage long ne doit pas retarder le battement de cœur: les autres
+        workers prendraient les sessions de ce worker pour abandonnées.
+        """
+        while True:
+            time.sleep(self.registry.heartbeat_interval)
+            if self.retention.due():
+                with self._app.app_context():
+                    self.cleanup_old_recordings()
+            if self.preroll.sync_due():
+                # Reprendre les tampons d'un worker disparu, suivre la configuration des terrains
+                with self._app.app_context():
+                    try:
+                        self.preroll.sync()
+                    except Exception as e:
+                        db.session.rollback()
+                        logger.error(f"Erreur de synchronisation des pré-enregistrements: {e}")
+    
+    def _heartbeat_loop(self):
+        """Signaler les sessions locales et exécuter les arrêts demandés par d'autres workers"""
+        while True:
+            time.sleep(self.registry.heartbeat_interval)
+            if self._processing_videos:
+                with self._app.app_context():
+                    try:
+                        self._processing_heartbeat()
+                    except Exception as e:
+                        db.session.rollback()
+                        logger.error(f"Erreur du battement de cœur du post-traitement: {e}")
             
-            # Mettre à jour le statut
-            self.active_recordings[session_id]['status'] = 'recording'
+            if not self.active_recordings:
+                continue
             
-            # Utiliser FFmpeg pour capturer et encoder
-            # Plus stable et performant que OpenCV pour les flux réseau
-            ffmpeg_cmd = [
-                'ffmpeg',
-                '-i', camera_url,
+            with self._app.app_context():
+                try:
+                    snapshot = {}
+                    for sid, recording in list(self.active_recordings.items()):
+                        job = self.encoder_pool.get_job(sid)
+                        snapshot[sid] = {
+                            'status': recording['status'],
+                            'encoder_pid': job.pid if job else None
+                        }
+                    
+                    for sid in self.registry.heartbeat(snapshot):
+                        logger.info(f"Arrêt demandé par un autre worker: {sid}")
+                        self.stop_recording(sid)
+                        
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Erreur du battement de cœur du registre: {e}")
+    
+    def _encoding_profiles(self, recording: Dict[str, Any], use_ffmpeg: bool) -> list:
+        """Profils (nom, débit en bits/s) par ordre de préférence, du plus lourd au plus léger"""
+        transcode = parse_bitrate(self.video_quality['bitrate'])
+        if not use_ffmpeg:
+            return [('opencv', transcode)]
+        
+        candidates = []
+        if recording['video_copy']:
+            source = recording.get('source') or {}
+            candidates.append(('copy', source.get('bitrate') or parse_bitrate(self.copy_bitrate)))
+        candidates += [('transcode', transcode), ('transcode_low', parse_bitrate(self.low_bitrate))]
+        
+        # Un profil de repli n'a de sens que s'il est plus léger que le précédent
+        profiles = [candidates[0]]
+        for name, bitrate in candidates[1:]:
+            if bitrate < profiles[-1][1]:
+                profiles.append((name, bitrate))
+        return profiles
+    
+    def check_storage_admission(self, club, planned_seconds: int) -> Dict[str, Any]:
+        """Vérifier qu'une session de cette durée tiendrait (sans réserver d'espace)"""
+        recording = {'video_copy': False}
+        return self.admission.admit(club, planned_seconds, self._encoding_profiles(recording, True))
+    
+    def _build_ffmpeg_command(self, session_id: str, attempt: int) -> list:
+        """Commande FFmpeg d'un encodeur (attempt > 0 après un redémarrage)"""
+        recording = self.active_recordings[session_id]
+        camera_url = recording['camera_url']
+        
+        # Un remux qui plante aussitôt: la source n'est pas recopiable, on réencode
+        attempt_started_at = recording.get('attempt_started_at')
+        if (recording['video_copy'] and attempt > 0 and attempt_started_at
+                and time.monotonic() - attempt_started_at < STREAM_COPY_MIN_RUNTIME):
+            logger.warning(f"Copie du flux impossible pour {session_id}, passage au réencodage")
+            recording['video_copy'] = False
+            self.encoder_pool.set_cost(session_id, 1.0)
+        recording['attempt_started_at'] = time.monotonic()
+        if attempt > 0:
+            recording['progress'].new_attempt()
+        
+        remaining = max(1, self.max_recording_duration - self._calculate_duration(recording['start_time']))
+        
+        command = ['ffmpeg', '-y'] + FFMPEG_PROGRESS_ARGS
+        preroll = recording.get('preroll')
+        if preroll and not self.preroll.is_live(recording['court_id']):
+            # Tampon arrêté ou figé: suivre sa playlist épuiserait les redémarrages
+            logger.warning(f"Tampon du terrain {recording['court_id']} indisponible, {session_id} lit la caméra")
+            preroll = recording['preroll'] = None
+        if preroll:
+            # Lecture du tampon du terrain: depuis le point demandé, puis en direct
+            # (après un redémarrage, on reprend au direct pour ne rien dupliquer)
+            start_index = preroll['start_index'] if attempt == 0 else -1
+            command += ['-live_start_index', str(start_index), '-i', preroll['playlist']]
+        else:
+            if camera_url.startswith('rtsp://'):
+                command += ['-rtsp_transport', 'tcp']
+            command += ['-i', camera_url]
+        
+        if recording['video_copy']:
+            # La caméra fournit déjà du H.264: remux sans décodage
+            command += ['-c:v', 'copy']
+        else:
+            # Qualité constante plafonnée au débit retenu à l'admission (taille prévisible)
+            bitrate = recording.get('video_bitrate') or parse_bitrate(self.video_quality['bitrate'])
+            command += [
                 '-c:v', 'libx264',
                 '-preset', 'medium',
                 '-crf', '23',
-                '-c:a', 'aac',
-                '-b:a', '128k',
-                '-f', 'mp4',
-                '-movflags', '+faststart',
-                '-t', str(self.max_recording_duration),  # Durée max
-                video_path
+                '-maxrate', str(bitrate),
+                '-bufsize', str(bitrate * 2),
+                '-threads', str(self.encoder_pool.threads_per_encoder)
             ]
-            
-            # Alternative avec OpenCV si FFmpeg n'est pas disponible
-            try:
-                # Essayer avec FFmpeg d'abord
-                process = subprocess.Popen(
-                    ffmpeg_cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    universal_newlines=True
-                )
-                
-                # Surveiller le processus
-                while process.poll() is None:
-                    if self.active_recordings[session_id]['status'] == 'stopping':
-                        process.terminate()
-                        break
-                    time.sleep(1)
-                
-                stdout, stderr = process.communicate()
-                
-                if process.returncode == 0:
-                    logger.info(f"Enregistrement FFmpeg terminé avec succès: {session_id}")
-                else:
-                    logger.warning(f"FFmpeg terminé avec code {process.returncode}: {stderr}")
-                    # Fallback vers OpenCV
-                    self._record_with_opencv(session_id, config)
-                    
-            except FileNotFoundError:
-                logger.warning("FFmpeg non trouvé, utilisation d'OpenCV")
-                self._record_with_opencv(session_id, config)
-            except Exception as e:
-                logger.error(f"Erreur FFmpeg: {e}, fallback vers OpenCV")
-                self._record_with_opencv(session_id, config)
-            
-        except Exception as e:
-            logger.error(f"Erreur dans le thread d'enregistrement {session_id}: {e}")
-            self.active_recordings[session_id]['status'] = 'error'
-            self.active_recordings[session_id]['error'] = str(e)
+        
+        source = recording.get('source')
+        if source and not source.get('audio_codec'):
+            command += ['-an']
+        elif recording.get('audio_copy'):
+            command += ['-c:a', 'copy']
+        else:
+            command += ['-c:a', 'aac', '-b:a', '128k']
+        
+        command += ['-t', str(remaining)]  # Durée max
+        
+        if recording['mode'] == 'segmented':
+            # Segments fMP4 courts: chaque segment terminé est renommé atomiquement
+            # (temp_file) et immédiatement servable; un redémarrage reprend la playlist
+            segment_dir = os.path.dirname(recording['video_path'])
+            if not recording['video_copy']:
+                command += ['-force_key_frames', f"expr:gte(t,n_forced*{self.segment_duration})"]
+            command += [
+                '-f', 'hls',
+                '-hls_time', str(self.segment_duration),
+                '-hls_list_size', '0',
+                '-hls_playlist_type', 'event',
+                '-hls_segment_type', 'fmp4',
+                '-hls_fmp4_init_filename', 'init.mp4',
+                '-hls_flags', 'append_list+independent_segments+temp_file',
+                '-hls_segment_filename', os.path.join(segment_dir, 'seg_%05d.m4s'),
+                recording['video_path']
+            ]
+            logger.info(f"Démarrage capture vidéo segmentée: {camera_url} -> {segment_dir}")
+            return command
+        
+        # Un redémarrage écrit une nouvelle partie pour ne pas écraser la précédente
+        if attempt == 0:
+            output_path = recording['video_path']
+        else:
+            output_path = str(self.base_path / f"{session_id}_part{attempt}.mp4")
+            recording['parts'].append(output_path)
+        
+        logger.info(f"Démarrage capture vidéo: {camera_url} -> {output_path}")
+        
+        # FFmpeg est plus stable et performant que OpenCV pour les flux réseau
+        return command + [
+            '-f', 'mp4',
+            '-movflags', '+faststart',
+            output_path
+        ]
+    
+    def _probe_source(self, camera_url: str) -> Optional[Dict[str, Any]]:
+        """Paramètres du flux caméra, mis en cache pour ne pas resonder à chaque démarrage"""
+        cached = self._probe_cache.get(camera_url)
+        if cached and time.monotonic() - cached['probed_at'] < self.probe_cache_ttl:
+            return cached['info']
+        
+        info = probe_stream(camera_url)
+        if info:
+            self._probe_cache[camera_url] = {'info': info, 'probed_at': time.monotonic()}
+        return info
+    
+    def _use_stream_copy(self, source: Optional[Dict[str, Any]]) -> bool:
+        """Choisir entre remux (copie du flux) et réencodage"""
+        if self.encoding_mode == 'transcode':
+            return False
+        if self.encoding_mode == 'copy':
+            return True
+        return can_copy_video(source)
+    
+    def _on_encoder_start(self, session_id: str):
+        """Callback du pool: l'encodeur a obtenu un slot"""
+        recording = self.active_recordings.get(session_id)
+        if recording and recording['status'] in ('starting', 'queued'):
+            recording['status'] = 'recording'
+            recording['progress'].mark_launched()
+    
+    def _on_encoder_exit(self, session_id: str, returncode: Optional[int], reason: str):
+        """Callback du pool: l'encodeur a rendu son slot"""
+        recording = self.active_recordings.get(session_id)
+        # Plus rien à écrire, mais rien n'est encore compté dans le quota du club
+        self.admission.settle(session_id, recording['progress'].stats['total_size'] if recording else None)
+        if not recording:
+            return
+        
+        if reason == 'failed':
+            logger.error(f"Encodeur en échec pour {session_id} (code {returncode})")
+            recording['status'] = 'error'
+            recording['error'] = f"Encodeur arrêté avec le code {returncode}"
+        elif reason == 'completed':
+            logger.info(f"Enregistrement FFmpeg terminé avec succès: {session_id}")
     
     def _record_with_opencv(self, session_id: str, config: Dict[str, Any]):
-        """Enregistrement avec OpenCV comme fallback"""
+        """Enregistrement avec OpenCV comme fallback (cadence fixe, reconnexion automatique)"""
         try:
-            camera_url = config['camera_url']
-            video_path = config['video_path']
-            
-            # Ouvrir la capture vidéo
-            cap = cv2.VideoCapture(camera_url)
-            
-            if not cap.isOpened():
-                raise Exception(f"Impossible d'ouvrir la caméra: {camera_url}")
-            
-            # Configuration de l'enregistreur
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-            fps = self.video_quality['fps']
-            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-            
-            out = cv2.VideoWriter(video_path, fourcc, fps, (width, height))
-            
-            start_time = time.time()
-            frame_count = 0
-            
-            while True:
-                # Vérifier si on doit arrêter
-                if self.active_recordings[session_id]['status'] == 'stopping':
-                    break
-                
-                # Vérifier la durée maximale
-                if time.time() - start_time > self.max_recording_duration:
-                    break
-                
-                ret, frame = cap.read()
-                if not ret:
-                    logger.warning(f"Impossible de lire le frame de {camera_url}")
-                    time.sleep(0.1)
-                    continue
-                
-                # Écrire le frame
-                out.write(frame)
-                frame_count += 1
-                
-                # Pause pour maintenir le FPS
-                time.sleep(1.0 / fps)
-            
-            # Nettoyer
-            cap.release()
-            out.release()
+            engine = OpenCVCaptureEngine(
+                camera_url=config['camera_url'],
+                output_path=config['video_path'],
+                fps=self.video_quality['fps'],
+                should_stop=lambda: config['status'] == 'stopping',
+                max_duration=self.max_recording_duration,
+                on_progress=config['progress'].update
+            )
+            config['capture_engine'] = engine
+            frame_count = engine.run()
             
-            logger.info(f"Enregistrement OpenCV terminé: {session_id}, {frame_count} frames")
+            logger.info(f"Enregistrement OpenCV terminé: {session_id}, {frame_count} frames {engine.get_stats()}")
             
         except Exception as e:
             logger.error(f"Erreur OpenCV pour {session_id}: {e}")
-            self.active_recordings[session_id]['status'] = 'error'
-            self.active_recordings[session_id]['error'] = str(e)
+            config['status'] = 'error'
+            config['error'] = str(e)
     
-    def _finalize_recording(self, session_id: str) -> Dict[str, Any]:
-        """Finaliser l'enregistrement et créer l'entrée en base"""
+    def _create_processing_video(self, recording: Dict[str, Any], encoder_stopped,
+                                 duration: Optional[int] = None) -> Dict[str, Any]:
+        """Créer la vidéo en base (statut 'processing') et lancer le post-traitement"""
         try:
-            recording = self.active_recordings[session_id]
-            video_path = recording['video_path']
-            
-            # Vérifier que le fichier existe
-            if not os.path.exists(video_path):
-                raise Exception(f"Fichier vidéo non trouvé: {video_path}")
-            
-            # Calculer la durée et la taille
-            duration = self._calculate_duration(recording['start_time'])
-            file_size = self._get_file_size(video_path)
-            
-            # Générer une miniature
-            thumbnail_path = self._generate_thumbnail(video_path, recording['session_id'])
+            # Durée mesurée par l'encodeur, à défaut par l'horloge (remplacée par ffprobe ensuite)
+            if duration is None:
+                live = recording['progress'].stats
+                if live['updated_at']:
+                    duration = int(live['out_time'])
+                else:
+                    duration = self._calculate_duration(recording['start_time'])
             
-            # Créer l'entrée vidéo en base de données
             video = Video(
                 title=recording['session_name'],
                 file_url=f"/videos/{recording['video_filename']}",
-                thumbnail_url=f"/thumbnails/{recording['session_id']}.jpg" if thumbnail_path else None,
                 duration=duration,
                 court_id=recording['court_id'],
                 user_id=recording['user_id'],
                 recorded_at=recording['start_time'],
                 is_unlocked=False,  # Nécessite des crédits pour débloquer
                 credits_cost=10,  # Coût par défaut
-                file_size=file_size
+                processing_status='processing'
             )
             
             db.session.add(video)
             db.session.commit()
             
-            logger.info(f"Vidéo enregistrée en base: {video.id}")
+            logger.info(f"Vidéo enregistrée en base: {video.id}, post-traitement en file")
+            
+            self.submit_processing(video.id, recording, encoder_stopped)
             
             return {
-                'status': 'completed',
+                'status': 'processing',
                 'video_id': video.id,
                 'video_filename': recording['video_filename'],
                 'duration': duration,
-                'file_size': file_size,
-                'thumbnail_url': video.thumbnail_url,
+                'file_size': None,
+                'thumbnail_url': None,
                 'message': f"Enregistrement terminé: {recording['session_name']}"
             }
             
         except Exception as e:
+            db.session.rollback()
+            self.admission.release(recording['session_id'])
             logger.error(f"Erreur lors de la finalisation: {e}")
             return {
                 'status': 'error',
@@ -344,6 +760,282 @@ class VideoCaptureService:
                 'message': "Erreur lors de la finalisation de l'enregistrement"
             }
     
+    def _processing_heartbeat(self):
+        """Signaler les vidéos en post-traitement dans ce worker (la reprise les laisse tranquilles)"""
+        Video.query.filter(Video.id.in_(list(self._processing_videos))).update({
+            'processing_heartbeat_at': datetime.utcnow()
+        }, synchronize_session=False)
+        db.session.commit()
+    
+    def submit_processing(self, video_id: int, recording: Dict[str, Any], encoder_stopped=None):
+        """Confier une vidéo au pipeline de post-traitement (ce worker en devient propriétaire)"""
+        Video.query.filter_by(id=video_id).update({
+            'processing_node': self.registry.node,
+            'processing_pid': self.registry.worker_pid,
+            'processing_heartbeat_at': datetime.utcnow()
+        }, synchronize_session=False)
+        db.session.commit()
+        self._processing_videos.add(video_id)
+        self._ensure_heartbeat()
+        self.processing_pipeline.submit({
+            'app': current_app._get_current_object(),
+            'video_id': video_id,
+            'session_id': recording['session_id'],
+            'mode': recording.get('mode'),
+            'video_path': recording['video_path'],
+            'video_filename': recording['video_filename'],
+            'parts': list(recording.get('parts', [])),
+            'encoder_stopped': encoder_stopped
+        })
+    
+    def start_preroll_buffers(self):
+        """Démarrer les tampons de pré-enregistrement configurés (au démarrage du worker)"""
+        self.preroll.sync()
+        self._ensure_heartbeat()
+    
+    def recover_orphaned_recordings(self) -> Dict[str, Any]:
+        """Réconcilier encodeurs, fichiers et base après l'arrêt brutal d'un worker"""
+        return RecordingRecovery(self).run()
+    
+    # ------------------------------------------------------------------
+    # Étapes du pipeline de post-traitement (exécutées en contexte d'application)
+    # ------------------------------------------------------------------
+    
+    def _stage_finalize(self, job: Dict[str, Any]):
+        """Attendre la fin de l'encodeur puis rendre le fichier lisible"""
+        if job.get('encoder_stopped') is not None:
+            job['encoder_stopped'].result(timeout=60)
+            job['encoder_stopped'] = None
+        
+        video_path = job['video_path']
+        if job['mode'] == 'segmented':
+            # Les segments sont déjà durables: il suffit de clore la playlist
+            self._close_playlist(video_path)
+        elif len(job['parts']) > 1:
+            # Recoller les parties écrites après un redémarrage d'encodeur
+            self._merge_parts(job['parts'], video_path)
+        
+        if not os.path.exists(video_path):
+            raise FileNotFoundError(f"Fichier vidéo non trouvé: {video_path}")
+    
+    def _stage_probe(self, job: Dict[str, Any]):
+        video = Video.query.get(job['video_id'])
+        if job['mode'] == 'segmented':
+            video.file_size = self._get_directory_size(os.path.dirname(job['video_path']))
+        else:
+            video.file_size = self._get_file_size(job['video_path'])
+        self.store_video_metadata(video, job['video_path'])
+        db.session.commit()
+    
+    def _stage_thumbnail(self, job: Dict[str, Any]):
+        thumbnail_path = self._generate_thumbnail(job['video_path'], job['session_id'])
+        if not thumbnail_path:
+            # La vidéo reste lisible sans miniature: pas de raison de l'écarter
+            logger.warning(f"Miniature non générée pour {job['session_id']}")
+            return
+        video = Video.query.get(job['video_id'])
+        video.thumbnail_url = f"/thumbnails/{job['session_id']}.jpg"
+        db.session.commit()
+    
+    def _stage_checksum(self, job: Dict[str, Any]):
+        """Empreinte SHA-256 du média (tous les fichiers pour un enregistrement segmenté)"""
+        if job['mode'] == 'segmented':
+            directory = os.path.dirname(job['video_path'])
+            files = sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                           if not name.endswith(INDEX_SUFFIX))
+        else:
+            files = [job['video_path']]
+        
+        video = Video.query.get(job['video_id'])
+        video.checksum = self.compute_checksum(files)
+        db.session.commit()
+    
+    @staticmethod
+    def compute_checksum(files) -> str:
+        """SHA-256 du contenu des fichiers, lus dans l'ordre donné"""
+        digest = hashlib.sha256()
+        for file_path in files:
+            with open(file_path, 'rb') as media_file:
+                for chunk in iter(lambda: media_file.read(1024 * 1024), b''):
+                    digest.update(chunk)
+        return digest.hexdigest()
+    
+    def _stage_store(self, job: Dict[str, Any]):
+        """Ranger le média dans le stockage définitif"""
+        if self.storage_path.resolve() == self.base_path.resolve():
+            return
+        
+        if job['mode'] == 'segmented':
+            source = os.path.dirname(job['video_path'])
+            destination = self.storage_path / job['session_id']
+        else:
+            source = job['video_path']
+            destination = self.storage_path / job['video_filename']
+        
+        if Path(source).resolve() == destination.resolve():
+            # Déjà rangé (post-traitement repris après un crash)
+            return
+        
+        shutil.move(source, destination)
+        job['video_path'] = str(self.storage_path / job['video_filename'])
+        logger.info(f"Média rangé dans le stockage: {destination}")
+    
+    def _stage_index(self, job: Dict[str, Any]):
+        """Index binaire des images clés (recherche, extraits, miniatures à un instant)"""
+        try:
+            KeyframeIndex.build(job['video_path'])
+        except Exception as e:
+            # Simple accélérateur: il sera reconstruit à la première utilisation
+            logger.warning(f"Index des images clés non construit pour {job['session_id']}: {e}")
+    
+    def _stage_storyboard(self, job: Dict[str, Any]):
+        """Planches de prévisualisation (une passe de décodage sur le média rangé)"""
+        video = Video.query.get(job['video_id'])
+        try:
+            self._build_storyboard(video, job['video_path'])
+        except Exception as e:
+            # Confort de lecture seulement: régénéré à la première demande
+            logger.warning(f"Storyboard non généré pour {job['session_id']}: {e}")
+        db.session.commit()
+    
+    def _build_storyboard(self, video: Video, video_path: str) -> Dict[str, Any]:
+        """Générer le storyboard d'une vidéo et renseigner storyboard_url (sans commit)"""
+        result = self.storyboard.generate(
+            video_path, str(self.storyboards_path / str(video.id)), video.duration,
+            width=video.width, height=video.height, keyframe_interval=video.keyframe_interval
+        )
+        video.storyboard_url = f"/api/videos/{video.id}/storyboard/{VTT_FILENAME}"
+        return result
+    
+    def _stage_highlights(self, job: Dict[str, Any]):
+        """Temps forts candidats (mouvement et énergie sonore, une passe basse résolution)"""
+        video = Video.query.get(job['video_id'])
+        try:
+            self.detect_highlights(video, job['video_path'])
+        except Exception as e:
+            # Confort seulement: la vidéo reste consultable sans temps forts
+            logger.warning(f"Temps forts non détectés pour {job['session_id']}: {e}")
+        db.session.commit()
+    
+    def detect_highlights(self, video: Video, video_path: str) -> list:
+        """Détecter les temps forts d'une vidéo et les enregistrer sur celle-ci (sans commit)"""
+        info = probe_stream(video_path) or {}
+        highlights = self.highlights.detect(video_path, bool(info.get('audio_codec')),
+                                            width=video.width, height=video.height)
+        video.highlights = json.dumps(highlights)
+        return highlights
+    
+    def _stage_ready(self, job: Dict[str, Any]):
+        job['timings']['total'] = round(time.time() - job['submitted_at'], 3)
+        video = Video.query.get(job['video_id'])
+        self._index_media(video, job['video_path'], job['mode'], job['session_id'])
+        video.processing_status = 'ready'
+        video.processing_timings = json.dumps(job['timings'])
+        db.session.commit()
+        # Les fichiers comptent désormais dans storage_used_bytes du club
+        self.admission.release(job['session_id'])
+        self._processing_videos.discard(job['video_id'])
+    
+    def _index_media(self, video: Video, video_path: str, mode: Optional[str], session_id: str):
+        """Inscrire les fichiers de la vidéo dans l'index de rétention (sans commit)"""
+        court = Court.query.get(video.court_id)
+        entries = []
+        if mode == 'segmented':
+            entries.append(('hls', os.path.dirname(video_path), video.file_size))
+        else:
+            entries.append(('video', video_path, video.file_size))
+            index_path = KeyframeIndex.index_path(video_path)
+            if os.path.exists(index_path):
+                entries.append(('index', index_path, os.path.getsize(index_path)))
+        if video.thumbnail_url:
+            thumbnail_path = self.thumbnails_path / f"{session_id}.jpg"
+            size = thumbnail_path.stat().st_size if thumbnail_path.exists() else None
+            entries.append(('thumbnail', str(thumbnail_path), size))
+        storyboard_dir = self.storyboards_path / str(video.id)
+        if video.storyboard_url and storyboard_dir.exists():
+            entries.append(('storyboard', str(storyboard_dir), self._get_directory_size(str(storyboard_dir))))
+        self.retention.register(video, court.club_id if court else None, entries)
+    
+    def _on_processing_failure(self, job: Dict[str, Any], stage_name: str, error: Exception):
+        """Une étape a épuisé ses relances: la vidéo est marquée en échec"""
+        db.session.rollback()
+        self._processing_videos.discard(job['video_id'])
+        self.admission.release(job['session_id'])
+        video = Video.query.get(job['video_id'])
+        if video:
+            video.processing_status = 'failed'
+            video.processing_timings = json.dumps(dict(job['timings'], failed_stage=stage_name, error=str(error)))
+            db.session.commit()
+    
+    def store_video_metadata(self, video: Video, video_path: str) -> bool:
+        """Extraire par ffprobe les métadonnées d'un fichier terminé et les stocker sur la vidéo
+
+        Les appels suivants lisent ces colonnes et ne touchent plus au fichier.
+        Le commit reste à la charge de l'appelant.
+        """
+        metadata = probe_media_file(str(video_path))
+        if not metadata:
+            return False
+        
+        if metadata['duration']:
+            video.duration = int(round(metadata['duration']))
+        video.video_codec = metadata['video_codec']
+        video.width = metadata['width']
+        video.height = metadata['height']
+        video.fps = metadata['fps']
+        video.bitrate = metadata['bitrate']
+        video.keyframe_interval = metadata['keyframe_interval']
+        video.metadata_extracted_at = datetime.utcnow()
+        return True
+    
+    def _close_playlist(self, playlist_path: str):
+        """Clore une playlist HLS (ENDLIST) si l'encodeur ne l'a pas fait"""
+        try:
+            with open(playlist_path, 'rb+') as playlist:
+                playlist.seek(0, os.SEEK_END)
+                size = playlist.tell()
+                playlist.seek(max(0, size - 64))
+                if HLS_ENDLIST_TAG.encode() in playlist.read():
+                    return
+                playlist.write(f"\n{HLS_ENDLIST_TAG}\n".encode())
+            logger.info(f"Playlist clôturée: {playlist_path}")
+        except OSError as e:
+            logger.error(f"Erreur lors de la clôture de la playlist {playlist_path}: {e}")
+    
+    def _merge_parts(self, parts: list, video_path: str):
+        """Concaténer sans réencodage les parties d'un enregistrement redémarré"""
+        existing_parts = [p for p in parts if os.path.exists(p)]
+        if len(existing_parts) < 2:
+            return
+        
+        list_path = f"{video_path}.parts.txt"
+        merged_path = f"{video_path}.merged.mp4"
+        try:
+            with open(list_path, 'w') as list_file:
+                for part in existing_parts:
+                    list_file.write(f"file '{os.path.abspath(part)}'\n")
+            
+            subprocess.run([
+                'ffmpeg', '-y',
+                '-f', 'concat', '-safe', '0',
+                '-i', list_path,
+                '-c', 'copy',
+                '-movflags', '+faststart',
+                merged_path
+            ], check=True, capture_output=True)
+            
+            os.replace(merged_path, video_path)
+            for part in existing_parts:
+                if part != video_path:
+                    os.remove(part)
+            logger.info(f"{len(existing_parts)} parties fusionnées dans {video_path}")
+            
+        except (FileNotFoundError, subprocess.CalledProcessError) as e:
+            logger.error(f"Erreur lors de la fusion des parties de {video_path}: {e}")
+        finally:
+            if os.path.exists(list_path):
+                os.remove(list_path)
+    
     def _generate_thumbnail(self, video_path: str, session_id: str) -> Optional[str]:
         """Générer une miniature pour la vidéo"""
         try:
@@ -352,9 +1044,9 @@ class VideoCaptureService:
             
             # Utiliser FFmpeg pour générer la miniature
             ffmpeg_cmd = [
-                'ffmpeg',
+                'ffmpeg', '-y',
+                '-ss', '00:00:01',  # Seek côté entrée: frame à 1 seconde sans décoder le début
                 '-i', video_path,
-                '-ss', '00:00:01',  # Prendre une frame à 1 seconde
                 '-vframes', '1',
                 '-q:v', '2',  # Haute qualité
                 str(thumbnail_path)
@@ -372,6 +1064,81 @@ class VideoCaptureService:
             logger.error(f"Erreur génération miniature: {e}")
             return None
     
+    def seek(self, video: Video, seconds: float) -> Optional[Dict[str, Any]]:
+        """Image clé précédant un instant: instant et position en octets dans le fichier
+
+        None si le média est absent; lève KeyframeIndexError si l'index ne peut être construit.
+        """
+        video_path = self.resolve_media_path(video)
+        if not video_path or not os.path.exists(video_path):
+            return None
+        with KeyframeIndex.load_or_build(video_path) as index:
+            entry = index.entry_at_or_before(seconds)
+        if not entry:
+            return None
+        return {'keyframe_time': entry[0], 'byte_offset': entry[1] if entry[1] >= 0 else None}
+    
+    def thumbnail_at(self, video: Video, seconds: float) -> Optional[str]:
+        """Miniature à un instant: une seule image clé décodée (seek côté entrée), mise en cache"""
+        video_path = self.resolve_media_path(video)
+        position = self.seek(video, seconds)
+        if not position:
+            return None
+        
+        keyframe_time = position['keyframe_time']
+        thumbnail_path = self.thumbnails_path / 'at' / f"{video.id}_{int(keyframe_time * 1000)}.jpg"
+        if thumbnail_path.exists():
+            return str(thumbnail_path)
+        thumbnail_path.parent.mkdir(parents=True, exist_ok=True)
+        
+        command = [
+            'ffmpeg', '-y', '-v', 'error',
+            '-ss', f"{keyframe_time:.6f}", '-i', video_path,
+            '-frames:v', '1', '-q:v', '3',
+            str(thumbnail_path)
+        ]
+        try:
+            subprocess.run(command, check=True, capture_output=True, timeout=30)
+        except (FileNotFoundError, subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+            logger.error(f"Miniature à {keyframe_time}s impossible pour la vidéo {video.id}: {e}")
+            return None
+        
+        court = Court.query.get(video.court_id)
+        self.retention.register(video, court.club_id if court else None,
+                                [('preview', str(thumbnail_path), thumbnail_path.stat().st_size)])
+        db.session.commit()
+        return str(thumbnail_path)
+    
+    def storyboard_dir(self, video: Video) -> Optional[str]:
+        """Dossier du storyboard d'une vidéo, généré à la demande pour les vidéos antérieures"""
+        directory = self.storyboards_path / str(video.id)
+        if video.storyboard_url and (directory / VTT_FILENAME).exists():
+            return str(directory)
+        video_path = self.resolve_media_path(video)
+        if video.processing_status != 'ready' or not video_path or not os.path.exists(video_path):
+            return None
+        
+        # Une seule génération par vidéo, les demandes simultanées attendent son résultat
+        with self._storyboard_locks_guard:
+            lock = self._storyboard_locks.setdefault(video.id, threading.Lock())
+        with lock:
+            db.session.refresh(video)
+            if video.storyboard_url and (directory / VTT_FILENAME).exists():
+                return str(directory)
+            if not video.duration:
+                self.store_video_metadata(video, video_path)
+            try:
+                result = self._build_storyboard(video, video_path)
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Storyboard impossible pour la vidéo {video.id}: {e}")
+                return None
+            court = Court.query.get(video.court_id)
+            self.retention.register(video, court.club_id if court else None,
+                                    [('storyboard', result['path'], result['size_bytes'])])
+            db.session.commit()
+        return str(directory)
+    
     def _generate_thumbnail_opencv(self, video_path: str, thumbnail_path: str) -> Optional[str]:
         """Générer miniature avec OpenCV"""
         try:
@@ -410,8 +1177,8 @@ class VideoCaptureService:
             return f"http://localhost:5000/api/courts/{court_id}/camera_stream"
     
     def _calculate_duration(self, start_time: datetime) -> int:
-        """Calculer la durée en secondes"""
-        return int((datetime.now() - start_time).total_seconds())
+        """Calculer la durée en secondes (start_time en UTC)"""
+        return int((datetime.utcnow() - start_time).total_seconds())
     
     def _get_file_size(self, file_path: str) -> int:
         """Obtenir la taille du fichier en octets"""
@@ -420,32 +1187,55 @@ class VideoCaptureService:
         except:
             return 0
     
-    def cleanup_old_recordings(self, days_old: int = 30):
-        """Nettoyer les anciens enregistrements"""
+    def _get_directory_size(self, directory: str) -> int:
+        """Taille cumulée des fichiers d'un dossier (segments HLS)"""
         try:
-            cutoff_date = datetime.now() - timedelta(days=days_old)
-            
-            # Supprimer les anciens fichiers vidéo
-            for video_file in self.base_path.glob("*.mp4"):
-                if os.path.getctime(video_file) < cutoff_date.timestamp():
-                    os.remove(video_file)
-                    logger.info(f"Fichier vidéo ancien supprimé: {video_file}")
-            
-            # Supprimer les anciennes miniatures
-            for thumb_file in self.thumbnails_path.glob("*.jpg"):
-                if os.path.getctime(thumb_file) < cutoff_date.timestamp():
-                    os.remove(thumb_file)
-                    logger.info(f"Miniature ancienne supprimée: {thumb_file}")
-            
-            # Mettre à jour la base de données
-            old_videos = Video.query.filter(Video.recorded_at < cutoff_date).all()
-            for video in old_videos:
-                video.file_url = None  # Marquer comme non disponible
-            
-            db.session.commit()
-            
+            return sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+        except OSError:
+            return 0
+    
+    def resolve_media_path(self, video: Video) -> Optional[str]:
+        """Chemin local du média d'une vidéo (stockage définitif, sinon dossier d'enregistrement)"""
+        if not video.file_url:
+            return None
+        filename = video.file_url.replace('/videos/', '', 1)
+        video_path = self.storage_path / filename
+        if not video_path.exists():
+            video_path = self.base_path / filename
+        return str(video_path)
+    
+    def cleanup_old_recordings(self) -> Dict[str, Any]:
+        """Supprimer les médias expirés selon la politique de rétention de chaque club"""
+        try:
+            return self.retention.run()
         except Exception as e:
+            db.session.rollback()
             logger.error(f"Erreur lors du nettoyage: {e}")
+            return {'error': str(e)}
+    
+    def index_existing_media(self, chunk_size: int = 500) -> int:
+        """Indexer les vidéos antérieures à l'index de rétention (reprise de l'existant)"""
+        indexed = 0
+        last_id = 0
+        while True:
+            videos = (Video.query
+                      .filter(Video.id > last_id, Video.file_url.isnot(None),
+                              ~Video.id.in_(db.session.query(StoredMedia.video_id)
+                                            .filter(StoredMedia.video_id.isnot(None))))
+                      .order_by(Video.id)
+                      .limit(chunk_size)
+                      .all())
+            if not videos:
+                break
+            for video in videos:
+                filename = video.file_url.replace('/videos/', '', 1)
+                mode = 'segmented' if filename.endswith(HLS_PLAYLIST_NAME) else 'mp4'
+                session_id = filename.split('/')[0].rsplit('.', 1)[0]
+                self._index_media(video, self.resolve_media_path(video), mode, session_id)
+            db.session.commit()
+            indexed += len(videos)
+            last_id = videos[-1].id
+        return indexed
 
 # Instance globale du service
 video_capture_service = VideoCaptureService()
@@ -22,7 +22,9 @@ if __name__ == "__main__":
     
     try:
         # Créer l'application
-        app = create_app('development')
+        # Avec le rechargement automatique, seul le processus enfant sert les requêtes
+        serving_process = os.environ.get('WERKZEUG_RUN_MAIN') == 'true'
+        app = create_app('development', start_services=serving_process)
         print("✅ Application créée avec succès")
         
         # Démarrer le serveur
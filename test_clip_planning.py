@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Test du découpage des extraits: morceaux copiés et bords réencodés selon les images clés
+"""
+
+import sys
+import os
+import tempfile
+sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+
+from src.services.keyframe_index import KeyframeIndex
+from src.services.clip_service import plan_clip
+
+# Une image clé toutes les 2 secondes
+KEYFRAMES = [(float(seconds), seconds * 25600) for seconds in range(0, 12, 2)]
+
+
+def test_plan_clip():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'match.mp4.kfi')
+        KeyframeIndex.write(path, KEYFRAMES)
+        with KeyframeIndex.open(path) as index:
+            # Mode rapide: le début recule à l'image clé précédente, tout est copié
+            assert plan_clip(index, 3.0, 7.0, False) == (2.0, [(2.0, 7.0, 'copy')])
+
+            # Mode précis: bords réencodés, cœur copié
+            assert plan_clip(index, 3.0, 7.0, True) == (3.0, [
+                (3.0, 4.0, 'encode'), (4.0, 6.0, 'copy'), (6.0, 7.0, 'encode')
+            ])
+
+            # Bornes sur des images clés: une seule copie
+            assert plan_clip(index, 4.0, 8.0, True) == (4.0, [(4.0, 8.0, 'copy')])
+
+            # Début réencodé jusqu'à l'image clé, fin sur une image clé
+            assert plan_clip(index, 3.0, 8.0, True) == (3.0, [(3.0, 4.0, 'encode'), (4.0, 8.0, 'copy')])
+
+            # Extrait contenu dans un seul GOP: entièrement réencodé
+            assert plan_clip(index, 4.5, 5.5, True) == (4.5, [(4.5, 5.5, 'encode')])
+    print("✅ Découpage des extraits")
+
+
+if __name__ == "__main__":
+    test_plan_clip()
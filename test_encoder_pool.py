@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Test du pool d'encodeurs: capacité bornée, file d'attente et redémarrages après crash
+(des commandes shell remplacent FFmpeg)
+"""
+
+import sys
+import os
+import time
+import asyncio
+import logging
+sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+
+from src.services import encoder_pool
+from src.services.encoder_pool import EncoderPool, EncoderPoolFullError, EncoderJob
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_capacite_et_file_attente():
+    """Un slot, une place en file: le troisième encodeur est refusé"""
+    pool = EncoderPool(max_slots=1, max_queue=1)
+    exits = []
+    on_exit = lambda session_id, returncode, reason: exits.append((session_id, reason))
+    sleeper = lambda attempt: ['sleep', '30']
+
+    assert pool.submit('rec_a', command_factory=sleeper, on_exit=on_exit)['state'] == 'running'
+    queued = pool.submit('rec_b', command_factory=sleeper, on_exit=on_exit)
+    assert queued == {'state': 'queued', 'queue_position': 1}
+    try:
+        pool.submit('rec_c', command_factory=sleeper, on_exit=on_exit)
+        assert False, "le pool aurait dû refuser rec_c"
+    except EncoderPoolFullError:
+        pass
+    assert pool.get_stats()['total_rejected'] == 1
+
+    # Le slot libéré revient à l'encodeur en attente
+    pool.stop('rec_a', timeout=5)
+    assert wait_for(lambda: pool.get_job('rec_b') is not None and pool.get_job('rec_b').pid)
+    pool.stop('rec_b', timeout=5)
+    assert exits == [('rec_a', 'stopped'), ('rec_b', 'stopped')]
+    assert pool.get_stats()['used_slots'] == 0
+    print("✅ Capacité et file d'attente")
+
+
+def test_redemarrages_puis_abandon():
+    """Un encodeur qui plante est relancé (tentative suivante) jusqu'à la limite"""
+    pool = EncoderPool(max_slots=1, max_queue=0, max_restarts=2, restart_delay=0.1)
+    attempts, exits = [], []
+
+    def crashing(attempt):
+        attempts.append(attempt)
+        return ['sh', '-c', 'exit 3']
+
+    pool.submit('rec_crash', command_factory=crashing,
+                on_exit=lambda session_id, returncode, reason: exits.append((returncode, reason)))
+    assert wait_for(lambda: exits)
+    assert attempts == [0, 1, 2]
+    assert exits == [(3, 'failed')]
+    assert pool.get_stats()['total_restarts'] == 2
+    print("✅ Redémarrages puis abandon")
+
+
+def test_fin_de_stderr_journalisee():
+    """La fin de stderr d'un encodeur planté est journalisée avant chaque redémarrage"""
+    records = []
+    handler = logging.Handler()
+    handler.emit = records.append
+    encoder_pool.logger.addHandler(handler)
+    try:
+        pool = EncoderPool(max_slots=1, max_queue=0, max_restarts=1, restart_delay=0.05)
+        exits = []
+        command = ['sh', '-c', 'printf "frame=1\\rframe=2\\r" >&2; echo "rtsp: connexion refusée" >&2; exit 1']
+        pool.submit('rec_stderr', command_factory=lambda attempt: command,
+                    on_exit=lambda session_id, returncode, reason: exits.append(reason))
+        assert wait_for(lambda: exits)
+    finally:
+        encoder_pool.logger.removeHandler(handler)
+
+    tails = [record.getMessage() for record in records if 'fin de stderr' in record.getMessage()]
+    assert len(tails) == 2
+    assert tails[0].splitlines()[1:] == ['frame=1', 'frame=2', 'rtsp: connexion refusée']
+    print("✅ Fin de stderr journalisée")
+
+
+def test_credit_rendu_apres_fonctionnement_stable():
+    """Après un fonctionnement stable, un plantage ne s'ajoute pas aux précédents"""
+    stable_runtime = encoder_pool.STABLE_RUNTIME
+    encoder_pool.STABLE_RUNTIME = 0.0
+    try:
+        pool = EncoderPool(max_slots=1, max_queue=0, max_restarts=1, restart_delay=0.05)
+        attempts, exits = [], []
+
+        def crashing(attempt):
+            attempts.append(attempt)
+            return ['sh', '-c', 'exit 3']
+
+        pool.submit('rec_stable', command_factory=crashing,
+                    on_exit=lambda session_id, returncode, reason: exits.append(reason))
+        assert wait_for(lambda: len(attempts) >= 4)
+        assert not exits
+        pool.stop('rec_stable', timeout=5)
+        assert exits == ['stopped']
+    finally:
+        encoder_pool.STABLE_RUNTIME = stable_runtime
+    print("✅ Crédit de redémarrages rendu après un fonctionnement stable")
+
+
+def test_arret_pendant_attente_de_redemarrage():
+    """Un arrêt demandé pendant le délai de redémarrage est immédiat"""
+    pool = EncoderPool(max_slots=1, max_queue=0, max_restarts=3, restart_delay=30)
+    attempts, exits = [], []
+
+    def crashing(attempt):
+        attempts.append(attempt)
+        return ['sh', '-c', 'exit 3']
+
+    pool.submit('rec_backoff', command_factory=crashing,
+                on_exit=lambda session_id, returncode, reason: exits.append((returncode, reason)))
+    assert wait_for(lambda: pool.get_stats()['total_restarts'] == 1)
+    started = time.monotonic()
+    pool.stop('rec_backoff', timeout=5)
+    assert time.monotonic() - started < 5
+    assert attempts == [0]
+    assert exits == [(3, 'stopped')]
+    print("✅ Arrêt pendant l'attente de redémarrage")
+
+
+def test_arret_avant_lancement():
+    """Arrêt demandé entre la promotion depuis la file et le lancement: l'encodeur ne part pas"""
+    pool = EncoderPool(max_slots=1, max_queue=0)
+    pool._ensure_loop()
+    exits = []
+    job = EncoderJob('rec_promoted', command_factory=lambda attempt: ['sleep', '30'],
+                     on_exit=lambda session_id, returncode, reason: exits.append(reason))
+    with pool._lock:
+        pool._running['rec_promoted'] = job
+
+    stopped = pool.request_stop('rec_promoted')
+    assert asyncio.run_coroutine_threadsafe(pool._start(job), pool._loop).result(5) is False
+    assert stopped.result(5) is None
+    assert job.pid is None
+    assert exits == ['cancelled']
+    print("✅ Arrêt avant lancement")
+
+
+def test_lancement_impossible():
+    """Un exécutable introuvable rend le slot et signale l'échec"""
+    pool = EncoderPool(max_slots=1, max_queue=0)
+    exits = []
+    result = pool.submit('rec_missing', command_factory=lambda attempt: ['/nonexistent/ffmpeg'],
+                         on_exit=lambda session_id, returncode, reason: exits.append(reason))
+    assert result == {'state': 'failed'}
+    assert exits == ['failed']
+    assert pool.get_stats()['used_slots'] == 0
+    print("✅ Lancement impossible")
+
+
+def test_fin_normale():
+    pool = EncoderPool(max_slots=1, max_queue=0)
+    exits = []
+    pool.submit('rec_ok', command_factory=lambda attempt: ['true'],
+                on_exit=lambda session_id, returncode, reason: exits.append((returncode, reason)))
+    assert wait_for(lambda: exits)
+    assert exits == [(0, 'completed')]
+    assert pool.get_stats()['total_restarts'] == 0
+    print("✅ Fin normale")
+
+
+if __name__ == "__main__":
+    test_capacite_et_file_attente()
+    test_redemarrages_puis_abandon()
+    test_fin_de_stderr_journalisee()
+    test_credit_rendu_apres_fonctionnement_stable()
+    test_arret_pendant_attente_de_redemarrage()
+    test_arret_avant_lancement()
+    test_lancement_impossible()
+    test_fin_normale()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Test de la sélection des temps forts sur une intensité synthétique
+"""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+
+import numpy as np
+
+from src.services.highlights import HighlightDetector
+
+
+def synthetic_score() -> np.ndarray:
+    score = np.zeros(120, dtype=np.float32)
+    score[30] = 5.0   # temps fort principal
+    score[33] = 4.0   # même action: écarté
+    score[80] = 3.0   # second temps fort
+    score[110] = 0.5  # sous le seuil
+    return score
+
+
+def test_selection_des_temps_forts():
+    detector = HighlightDetector(window=10, max_highlights=5)
+    assert detector.select(synthetic_score()) == [
+        {'start': 25.0, 'end': 35.0, 'score': 5.0},
+        {'start': 75.0, 'end': 85.0, 'score': 3.0},
+    ]
+
+    # Nombre limité: les mieux notés d'abord
+    detector = HighlightDetector(window=10, max_highlights=1)
+    assert detector.select(synthetic_score()) == [{'start': 25.0, 'end': 35.0, 'score': 5.0}]
+
+    # Pic en début de vidéo: la fenêtre ne déborde pas
+    score = np.zeros(40, dtype=np.float32)
+    score[2] = 2.0
+    assert HighlightDetector(window=10).select(score) == [{'start': 0.0, 'end': 10.0, 'score': 2.0}]
+
+    # Aucun pic au-dessus du seuil
+    assert HighlightDetector(window=10).select(np.zeros(60, dtype=np.float32)) == []
+    print("✅ Sélection des temps forts")
+
+
+if __name__ == "__main__":
+    test_selection_des_temps_forts()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Test de l'index des images clés: recherche dichotomique, reconstruction d'un index périmé
+et échec de construction
+"""
+
+import sys
+import os
+import tempfile
+import subprocess
+sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+
+from src.services.keyframe_index import KeyframeIndex, KeyframeIndexError
+
+# Une image clé toutes les 2 secondes: (instant, position en octets)
+KEYFRAMES = [(0.0, 48), (2.0, 51200), (4.0, 102400), (6.0, 153600), (8.0, 204800)]
+
+
+def test_recherche_dichotomique():
+    """Image clé précédente / suivante pour des instants quelconques"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'match.mp4.kfi')
+        KeyframeIndex.write(path, KEYFRAMES)
+        with KeyframeIndex.open(path) as index:
+            assert len(index) == 5
+            assert index.entry_at_or_before(3.5) == (2.0, 51200)
+            assert index.entry_at_or_before(4.0) == (4.0, 102400)
+            assert index.entry_at_or_before(100.0) == (8.0, 204800)
+            assert index.entry_at_or_before(-1.0) is None
+            assert index.at_or_after(4.5) == 6.0
+            assert index.at_or_after(8.5) is None
+            assert index.is_keyframe(2.0)
+            assert not index.is_keyframe(2.5)
+    print("✅ Recherche dichotomique dans l'index")
+
+
+def test_reconstruction_index_perime():
+    """L'index est reconstruit quand le média est plus récent ou l'index illisible"""
+    scans = []
+
+    def fake_scan(media_path, timeout=300):
+        scans.append(media_path)
+        return KEYFRAMES[:len(scans) + 1]
+
+    original_scan = KeyframeIndex.scan
+    KeyframeIndex.scan = staticmethod(fake_scan)
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            media_path = os.path.join(directory, 'match.mp4')
+            open(media_path, 'wb').close()
+            index_path = KeyframeIndex.index_path(media_path)
+
+            with KeyframeIndex.load_or_build(media_path) as index:
+                assert len(index) == 2
+            with KeyframeIndex.load_or_build(media_path) as index:
+                assert len(index) == 2 and len(scans) == 1, "index à jour réutilisé"
+
+            # Média réécrit (archivage) après l'index
+            later = os.path.getmtime(index_path) + 10
+            os.utime(media_path, (later, later))
+            with KeyframeIndex.load_or_build(media_path) as index:
+                assert len(index) == 3 and len(scans) == 2, "index périmé reconstruit"
+
+            # Index tronqué
+            with open(index_path, 'wb') as index_file:
+                index_file.write(b'PVKI')
+            with KeyframeIndex.load_or_build(media_path) as index:
+                assert len(index) == 4 and len(scans) == 3, "index illisible reconstruit"
+    finally:
+        KeyframeIndex.scan = original_scan
+    print("✅ Reconstruction d'un index périmé ou illisible")
+
+
+def test_construction_impossible():
+    """Média illisible par ffprobe: erreur dédiée plutôt qu'une exception brute"""
+    def failing_scan(media_path, timeout=300):
+        raise subprocess.CalledProcessError(1, ['ffprobe', media_path])
+
+    original_scan = KeyframeIndex.scan
+    KeyframeIndex.scan = staticmethod(failing_scan)
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            media_path = os.path.join(directory, 'corrompu.mp4')
+            open(media_path, 'wb').close()
+            try:
+                KeyframeIndex.load_or_build(media_path)
+                assert False, "la construction aurait dû échouer"
+            except KeyframeIndexError:
+                pass
+            assert not os.path.exists(KeyframeIndex.index_path(media_path))
+    finally:
+        KeyframeIndex.scan = original_scan
+    print("✅ Construction impossible signalée")
+
+
+if __name__ == "__main__":
+    test_recherche_dichotomique()
+    test_reconstruction_index_perime()
+    test_construction_impossible()
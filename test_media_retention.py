@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Test de la purge des médias expirés par lots (base en mémoire, fichiers temporaires)
+"""
+
+import sys
+import os
+import tempfile
+sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+
+from datetime import datetime, timedelta
+from src.models.user import db, User, Club, Video, StoredMedia, UserRole
+from src.services.media_retention import MediaRetention
+from src.main import create_app
+
+
+class CountingRetention(MediaRetention):
+    """Note, pour chaque fichier supprimé, combien de médias les lots précédents ont déjà retirés"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.seen_deleted = []
+
+    def _remove(self, media):
+        self.seen_deleted.append(StoredMedia.query.filter(StoredMedia.deleted_at.isnot(None)).count())
+        return super()._remove(media)
+
+
+def test_purge_par_lots():
+    app = create_app('testing')
+
+    with app.app_context(), tempfile.TemporaryDirectory() as directory:
+        db.create_all()
+        club = Club(name='Club test', storage_used_bytes=7000)
+        user = User(email='retention@example.com', name='Joueur', role=UserRole.PLAYER)
+        db.session.add_all([club, user])
+        db.session.commit()
+
+        expired_at = datetime.utcnow() - timedelta(days=1)
+        for number in range(7):
+            video = Video(title=f'Match {number}', user_id=user.id, file_url=f'/videos/match_{number}.mp4')
+            db.session.add(video)
+            db.session.flush()
+            path = os.path.join(directory, f'match_{number}.mp4')
+            with open(path, 'wb') as media_file:
+                media_file.write(b'\0' * 1000)
+            db.session.add(StoredMedia(video_id=video.id, club_id=club.id, kind='video', path=path,
+                                       size_bytes=1000, created_at=expired_at, expires_at=expired_at))
+        # Conservé: pas encore expiré
+        kept_path = os.path.join(directory, 'recent.mp4')
+        open(kept_path, 'wb').close()
+        db.session.add(StoredMedia(club_id=club.id, kind='video', path=kept_path, size_bytes=0,
+                                   expires_at=datetime.utcnow() + timedelta(days=1)))
+        db.session.commit()
+
+        retention = CountingRetention(chunk_size=3)
+        report = retention.run()
+
+        assert report['deleted'] == 7 and report['freed_bytes'] == 7000
+        assert report['videos_unavailable'] == 7
+        assert retention.seen_deleted == [0, 0, 0, 3, 3, 3, 6]
+        assert not any(name.startswith('match_') for name in os.listdir(directory))
+        assert os.path.exists(kept_path)
+        assert Club.query.get(club.id).storage_used_bytes == 0
+        assert Video.query.filter(Video.file_url.isnot(None)).count() == 0
+
+        # Politique du club modifiée: recalcul des expirations par lots
+        club.retention_days = 90
+        db.session.commit()
+        assert retention.apply_club_policy(club) == 1
+    print("✅ Purge des médias expirés par lots")
+
+
+if __name__ == "__main__":
+    test_purge_par_lots()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Test du tampon de pré-enregistrement: anneau de segments borné, un seul propriétaire
+par terrain et point d'entrée d'un enregistrement dans le passé (FFmpeg non lancé)
+"""
+
+import sys
+import os
+import time
+import shutil
+import tempfile
+import subprocess
+from types import SimpleNamespace
+sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+
+from src.services import preroll_buffer
+from src.services.preroll_buffer import PrerollManager
+
+
+class RecordingPool:
+    """Pool factice: garde les encodeurs soumis sans lancer de processus"""
+
+    def __init__(self):
+        self.jobs = {}
+
+    def submit(self, session_id, command_factory=None, **kwargs):
+        self.jobs[session_id] = command_factory
+        return {'state': 'running', 'pid': None}
+
+    def stop(self, session_id, timeout=10):
+        self.jobs.pop(session_id, None)
+
+
+def write_playlist(path, durations):
+    lines = ['#EXTM3U', '#EXT-X-VERSION:7', '#EXT-X-TARGETDURATION:2']
+    for number, duration in enumerate(durations):
+        lines += [f'#EXTINF:{duration:.3f},', f'seg_{number:06d}.m4s']
+    with open(path, 'w') as playlist:
+        playlist.write('\n'.join(lines) + '\n')
+
+
+def test_anneau_et_proprietaire_unique():
+    preroll_buffer.probe_stream = lambda url, timeout=10: {'video_codec': 'h264'}
+    with tempfile.TemporaryDirectory() as directory:
+        pool = RecordingPool()
+        manager = PrerollManager(directory, pool, segment_duration=2)
+        court = SimpleNamespace(id=1, camera_url='rtsp://camera/1', preroll_seconds=10)
+
+        # Segments d'un ancien propriétaire
+        court_dir = os.path.join(directory, 'court_1')
+        os.makedirs(court_dir)
+        open(os.path.join(court_dir, 'seg_000042.m4s'), 'wb').close()
+
+        assert manager.start_buffer(court)
+        command = pool.jobs['preroll_1'](0)
+        assert command[command.index('-hls_list_size') + 1] == '6'  # 10 s en segments de 2 s, plus un
+        assert 'delete_segments' in command[command.index('-hls_flags') + 1]
+        assert command[command.index('-c') + 1] == 'copy'
+        assert 'seg_000042.m4s' not in os.listdir(court_dir)
+
+        # Un autre worker du nœud ne reprend pas un terrain déjà porté
+        other_worker = PrerollManager(directory, RecordingPool(), segment_duration=2)
+        assert not other_worker.start_buffer(court)
+
+        manager.stop_all()
+        assert other_worker.start_buffer(court)
+        other_worker.stop_all()
+    print("✅ Anneau de segments et propriétaire unique")
+
+
+def test_segments_conserves_pour_les_lecteurs():
+    """Un tampon repris pendant qu'un enregistrement suit sa playlist garde ses segments"""
+    preroll_buffer.probe_stream = lambda url, timeout=10: {'video_codec': 'h264'}
+    with tempfile.TemporaryDirectory() as directory:
+        pool = RecordingPool()
+        manager = PrerollManager(directory, pool, segment_duration=2)
+        court = SimpleNamespace(id=1, camera_url='rtsp://camera/1', preroll_seconds=10)
+        court_dir = os.path.join(directory, 'court_1')
+        os.makedirs(court_dir)
+        playlist_path = os.path.join(court_dir, 'index.m3u8')
+        write_playlist(playlist_path, [2.0, 2.0])
+
+        # Lecteur de la playlist: un processus nommé ffmpeg qui la désigne en argument
+        fake_ffmpeg = os.path.join(directory, 'ffmpeg')
+        os.symlink(shutil.which('sh'), fake_ffmpeg)
+        reader = subprocess.Popen([fake_ffmpeg, '-c', 'sleep 30; true', playlist_path])
+        try:
+            time.sleep(0.2)
+            assert manager.start_buffer(court)
+            pool.jobs['preroll_1'](0)
+            assert os.path.exists(playlist_path)
+        finally:
+            reader.kill()
+            reader.wait()
+            manager.stop_all()
+    print("✅ Segments conservés pour les lecteurs")
+
+
+def test_rattachement_dans_le_passe():
+    with tempfile.TemporaryDirectory() as directory:
+        manager = PrerollManager(directory, RecordingPool(), segment_duration=2)
+        os.makedirs(os.path.join(directory, 'court_1'))
+        playlist_path = os.path.join(directory, 'court_1', 'index.m3u8')
+        write_playlist(playlist_path, [2.0, 2.0, 2.0, 2.0])
+
+        assert manager.is_live(1)
+        assert manager.attach(1, 5) == {'playlist': playlist_path, 'start_index': -3, 'preroll_seconds': 6.0}
+        assert manager.attach(1, 0) == {'playlist': playlist_path, 'start_index': -1, 'preroll_seconds': 0}
+        # Plus que le tampon n'en contient: tout ce qui est disponible
+        assert manager.attach(1, 60)['start_index'] == -4
+        assert manager.attach(1, 60)['preroll_seconds'] == 8.0
+
+        # Playlist figée: le tampon est mort, pas de rattachement
+        old = time.time() - 60
+        os.utime(playlist_path, (old, old))
+        assert not manager.is_live(1)
+        assert manager.attach(1, 5) is None
+        assert manager.attach(2, 5) is None
+    print("✅ Rattachement dans le passé")
+
+
+if __name__ == "__main__":
+    test_anneau_et_proprietaire_unique()
+    test_segments_conserves_pour_les_lecteurs()
+    test_rattachement_dans_le_passe()
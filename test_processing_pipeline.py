@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Test du pipeline de post-traitement: enchaînement des étapes, relances et échec définitif
+"""
+
+import sys
+import os
+import time
+import tempfile
+import threading
+sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+
+from flask import Flask
+from src.models.user import db, User, Video, UserRole
+from src.services.processing_pipeline import ProcessingPipeline, PipelineStage
+from src.services.video_capture_service import VideoCaptureService
+from src.main import create_app
+
+
+def run_job(pipeline, job, done, timeout=10.0):
+    pipeline.submit(job)
+    assert done.wait(timeout), "le job n'a pas terminé à temps"
+    # Le handler final a signalé la fin: laisser le worker clore l'étape
+    deadline = time.monotonic() + timeout
+    while any(stats['in_progress'] for stats in pipeline.get_stats().values()) and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_enchainement_des_etapes():
+    """Les étapes s'exécutent dans l'ordre, en contexte d'application, et sont chronométrées"""
+    app = Flask(__name__)
+    done = threading.Event()
+    calls = []
+
+    def handler(name):
+        def run(job):
+            from flask import current_app
+            assert current_app.name == app.name
+            calls.append(name)
+            if name == 'ready':
+                done.set()
+        return run
+
+    pipeline = ProcessingPipeline([
+        PipelineStage('finalize', handler('finalize')),
+        PipelineStage('probe', handler('probe'), workers=2),
+        PipelineStage('ready', handler('ready'))
+    ])
+    job = {'app': app, 'session_id': 'rec_1'}
+    run_job(pipeline, job, done)
+
+    assert calls == ['finalize', 'probe', 'ready']
+    assert set(job['timings']) >= {'finalize', 'probe', 'ready'}
+    stats = pipeline.get_stats()
+    assert [stats[name]['processed'] for name in ('finalize', 'probe', 'ready')] == [1, 1, 1]
+    print("✅ Enchaînement des étapes")
+
+
+def test_relance_puis_succes():
+    """Une étape en échec est relancée jusqu'à max_retries"""
+    app = Flask(__name__)
+    done = threading.Event()
+    attempts = []
+
+    def flaky(job):
+        attempts.append(time.monotonic())
+        if len(attempts) < 3:
+            raise OSError("disque occupé")
+
+    pipeline = ProcessingPipeline([
+        PipelineStage('store', flaky, max_retries=2, retry_delay=0.05),
+        PipelineStage('ready', lambda job: done.set())
+    ])
+    job = {'app': app, 'session_id': 'rec_2'}
+    run_job(pipeline, job, done)
+
+    assert len(attempts) == 3
+    assert job['attempts']['store'] == 3
+    assert pipeline.get_stats()['store']['retries'] == 2
+    assert pipeline.get_stats()['store']['failed'] == 0
+    print("✅ Relance puis succès")
+
+
+def test_echec_definitif():
+    """Relances épuisées: on_failure reçoit l'étape, les suivantes ne s'exécutent pas"""
+    app = Flask(__name__)
+    done = threading.Event()
+    failures, later = [], []
+
+    def broken(job):
+        raise RuntimeError("média illisible")
+
+    def on_failure(job, stage_name, error):
+        failures.append((job['session_id'], stage_name, str(error)))
+        done.set()
+
+    pipeline = ProcessingPipeline([
+        PipelineStage('probe', broken, max_retries=1, retry_delay=0.05),
+        PipelineStage('ready', later.append)
+    ], on_failure=on_failure)
+    run_job(pipeline, {'app': app, 'session_id': 'rec_3'}, done)
+
+    assert failures == [('rec_3', 'probe', 'média illisible')]
+    assert not later
+    assert pipeline.get_stats()['probe']['failed'] == 1
+    print("✅ Échec définitif")
+
+
+def test_miniature_absente():
+    """Sans miniature, l'étape passe: la vidéo n'est pas marquée en échec"""
+    app = create_app('testing')
+
+    with app.app_context(), tempfile.TemporaryDirectory() as directory:
+        db.create_all()
+        service = VideoCaptureService(base_path=directory)
+        service._generate_thumbnail = lambda video_path, session_id: None
+        user = User(email='thumbnail@example.com', name='Joueur', role=UserRole.PLAYER)
+        db.session.add(user)
+        db.session.commit()
+        video = Video(title='Match', user_id=user.id, file_url='/videos/rec_4.mp4', processing_status='processing')
+        db.session.add(video)
+        db.session.commit()
+
+        service._stage_thumbnail({'video_id': video.id, 'session_id': 'rec_4',
+                                  'video_path': os.path.join(directory, 'rec_4.mp4')})
+
+        video = Video.query.get(video.id)
+        assert video.thumbnail_url is None
+        assert video.processing_status == 'processing'
+    print("✅ Miniature absente")
+
+
+if __name__ == "__main__":
+    test_enchainement_des_etapes()
+    test_relance_puis_succes()
+    test_echec_definitif()
+    test_miniature_absente()
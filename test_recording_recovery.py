@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Test de la reprise après crash: session orpheline récupérée en vidéo, terrain libéré,
+fichiers intermédiaires supprimés (médias factices, ffprobe simulé)
+"""
+
+import sys
+import os
+import time
+import tempfile
+import subprocess
+sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+
+from datetime import datetime, timedelta
+from src.models.user import db, User, Club, Court, Video, ActiveRecording, UserRole
+from src.services import recording_recovery
+from src.services.recording_recovery import RecordingRecovery
+from src.services.video_capture_service import VideoCaptureService
+from src.main import create_app
+
+ORPHAN_SESSION = 'rec_1_1700000000_0000abcd'
+LIVE_SESSION = 'rec_1_1700000100_0000beef'
+
+
+def dead_pid() -> int:
+    process = subprocess.Popen(['true'])
+    process.wait()
+    return process.pid
+
+
+def write_media(path, size=1000):
+    with open(path, 'wb') as media_file:
+        media_file.write(b'\0' * size)
+
+
+def setup_service(directory):
+    """Service de capture sur un répertoire temporaire; le pipeline n'est pas lancé"""
+    service = VideoCaptureService(base_path=directory)
+    service.submitted = []
+    service.submit_processing = lambda video_id, recording, encoder_stopped=None: \
+        service.submitted.append((video_id, list(recording.get('parts', []))))
+    recording_recovery.probe_stream = lambda path, timeout=30: {'video_codec': 'h264'}
+    return service
+
+
+def test_session_orpheline_recuperee():
+    app = create_app('testing')
+
+    with app.app_context(), tempfile.TemporaryDirectory() as directory:
+        db.create_all()
+        service = setup_service(directory)
+        registry = service.registry
+
+        club = Club(name='Club test')
+        db.session.add(club)
+        db.session.commit()
+        orphan_court = Court(name='Terrain 1', qr_code='recovery-1', camera_url='rtsp://camera/1', club_id=club.id,
+                             is_recording=True, recording_session_id=ORPHAN_SESSION)
+        live_court = Court(name='Terrain 2', qr_code='recovery-2', camera_url='rtsp://camera/2', club_id=club.id,
+                           is_recording=True, recording_session_id=LIVE_SESSION)
+        user = User(email='recovery@example.com', name='Joueur', role=UserRole.PLAYER)
+        db.session.add_all([orphan_court, live_court, user])
+        db.session.commit()
+
+        # Worker mort en cours d'enregistrement: fichier principal et deux parties après redémarrage
+        video_path = os.path.join(directory, f'{ORPHAN_SESSION}.mp4')
+        for path in (video_path, os.path.join(directory, f'{ORPHAN_SESSION}_part1.mp4'),
+                     os.path.join(directory, f'{ORPHAN_SESSION}_part2.mp4')):
+            write_media(path)
+        started_at = datetime.utcnow() - timedelta(minutes=10)
+        db.session.add(ActiveRecording(
+            session_id=ORPHAN_SESSION, court_id=orphan_court.id, user_id=user.id,
+            node=registry.node, worker_pid=dead_pid(), status='recording', mode='mp4',
+            video_path=video_path, started_at=started_at, heartbeat_at=started_at + timedelta(minutes=9)
+        ))
+
+        # Session portée par ce worker: rien ne doit y toucher
+        service.active_recordings[LIVE_SESSION] = {'session_id': LIVE_SESSION}
+        registry.register({'session_id': LIVE_SESSION, 'court_id': live_court.id, 'user_id': user.id,
+                           'status': 'recording', 'mode': 'mp4',
+                           'video_path': os.path.join(directory, f'{LIVE_SESSION}.mp4')})
+
+        # Fusion interrompue d'une session morte depuis longtemps
+        merged_path = os.path.join(directory, 'rec_1_1600000000_0000cafe.merged.mp4')
+        write_media(merged_path)
+        old = time.time() - 3600
+        os.utime(merged_path, (old, old))
+        db.session.commit()
+
+        report = RecordingRecovery(service, terminate_timeout=1).run()
+
+        assert report['reclaimed_sessions'] == [ORPHAN_SESSION]
+        assert len(report['salvaged_videos']) == 1
+        video = Video.query.get(report['salvaged_videos'][0])
+        assert video.processing_status == 'processing'
+        assert video.file_url == f'/videos/{ORPHAN_SESSION}.mp4'
+        assert video.duration == 9 * 60
+        assert service.submitted == [(video.id, [
+            video_path,
+            os.path.join(directory, f'{ORPHAN_SESSION}_part1.mp4'),
+            os.path.join(directory, f'{ORPHAN_SESSION}_part2.mp4')
+        ])]
+
+        assert report['released_courts'] == [orphan_court.id]
+        assert Court.query.get(live_court.id).is_recording
+        assert [entry.session_id for entry in ActiveRecording.query.all()] == [LIVE_SESSION]
+        assert report['removed_partial_files'] == [merged_path]
+    print("✅ Session orpheline récupérée")
+
+
+def test_session_sans_media():
+    """Rien de lisible: la session est déclarée perdue et son entrée retirée"""
+    app = create_app('testing')
+
+    with app.app_context(), tempfile.TemporaryDirectory() as directory:
+        db.create_all()
+        service = setup_service(directory)
+
+        club = Club(name='Club test')
+        db.session.add(club)
+        db.session.commit()
+        court = Court(name='Terrain 1', qr_code='recovery-3', camera_url='rtsp://camera/1', club_id=club.id,
+                      is_recording=True, recording_session_id=ORPHAN_SESSION)
+        user = User(email='recovery@example.com', name='Joueur', role=UserRole.PLAYER)
+        db.session.add_all([court, user])
+        db.session.commit()
+
+        started_at = datetime.utcnow() - timedelta(minutes=10)
+        db.session.add(ActiveRecording(
+            session_id=ORPHAN_SESSION, court_id=court.id, user_id=user.id,
+            node=service.registry.node, worker_pid=dead_pid(), status='recording', mode='mp4',
+            video_path=os.path.join(directory, f'{ORPHAN_SESSION}.mp4'),
+            started_at=started_at, heartbeat_at=started_at
+        ))
+        db.session.commit()
+
+        report = RecordingRecovery(service, terminate_timeout=1).run()
+
+        assert report['unrecoverable'] == [ORPHAN_SESSION]
+        assert report['salvaged_videos'] == []
+        assert report['released_courts'] == [court.id]
+        assert ActiveRecording.query.count() == 0
+        assert Video.query.count() == 0
+    print("✅ Session sans média")
+
+
+def test_reprise_du_post_traitement():
+    """Seuls les post-traitements dont le worker est mort ou muet sont repris"""
+    app = create_app('testing')
+
+    with app.app_context(), tempfile.TemporaryDirectory() as directory:
+        db.create_all()
+        service = setup_service(directory)
+        node = service.registry.node
+        user = User(email='recovery@example.com', name='Joueur', role=UserRole.PLAYER)
+        db.session.add(user)
+        db.session.commit()
+
+        now = datetime.utcnow()
+        owners = {
+            'rec_1_1700000200_0000d00d': ('processing', node, dead_pid(), now),          # worker mort
+            'rec_1_1700000300_0000f00d': ('processing', node, os.getppid(), now),        # worker vivant
+            'rec_1_1700000400_0000b00c': ('recovering', 'autre-noeud', 4242, now - timedelta(minutes=5)),
+        }
+        videos = {}
+        for session_id, (status, owner_node, owner_pid, heartbeat_at) in owners.items():
+            video = Video(title=session_id, user_id=user.id, file_url=f'/videos/{session_id}.mp4',
+                          processing_status=status, processing_node=owner_node,
+                          processing_pid=owner_pid, processing_heartbeat_at=heartbeat_at)
+            db.session.add(video)
+            db.session.commit()
+            videos[session_id] = video.id
+        for part in (2, 10):
+            write_media(os.path.join(directory, f'rec_1_1700000200_0000d00d_part{part}.mp4'))
+
+        resumed = RecordingRecovery(service, terminate_timeout=1)._resume_processing()
+
+        assert sorted(resumed) == sorted([videos['rec_1_1700000200_0000d00d'], videos['rec_1_1700000400_0000b00c']])
+        assert dict(service.submitted)[videos['rec_1_1700000200_0000d00d']] == [
+            os.path.join(directory, f'{name}.mp4') for name in (
+                'rec_1_1700000200_0000d00d', 'rec_1_1700000200_0000d00d_part2', 'rec_1_1700000200_0000d00d_part10'
+            )
+        ]
+        reclaimed = Video.query.get(videos['rec_1_1700000400_0000b00c'])
+        assert reclaimed.processing_status == 'recovering'
+        assert (reclaimed.processing_node, reclaimed.processing_pid) == (node, os.getpid())
+        assert Video.query.get(videos['rec_1_1700000300_0000f00d']).processing_status == 'processing'
+    print("✅ Reprise du post-traitement")
+
+
+if __name__ == "__main__":
+    test_session_orpheline_recuperee()
+    test_session_sans_media()
+    test_reprise_du_post_traitement()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Test du registre partagé des enregistrements actifs: battements de cœur,
+arrêt demandé depuis un autre worker et détection d'un propriétaire muet
+"""
+
+import sys
+import os
+import time
+sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+
+from datetime import datetime, timedelta
+from src.models.user import db, User, Club, Court, ActiveRecording, UserRole
+from src.services.recording_registry import RecordingRegistry
+from src.main import create_app
+
+
+def setup_court():
+    db.create_all()
+    club = Club(name='Club test')
+    db.session.add(club)
+    db.session.commit()
+    court = Court(name='Terrain 1', qr_code='registry-court-1', camera_url='rtsp://camera/1', club_id=club.id)
+    user = User(email='registry@example.com', name='Joueur', role=UserRole.PLAYER)
+    db.session.add_all([court, user])
+    db.session.commit()
+    return court, user
+
+
+def recording_for(session_id, court, user):
+    return {
+        'session_id': session_id,
+        'court_id': court.id,
+        'user_id': user.id,
+        'status': 'recording',
+        'mode': 'mp4',
+        'video_path': f'/tmp/{session_id}.mp4'
+    }
+
+
+def test_arret_demande_par_un_autre_worker():
+    app = create_app('testing')
+
+    with app.app_context():
+        court, user = setup_court()
+        owner = RecordingRegistry()
+        other_worker = RecordingRegistry()
+
+        owner.register(recording_for('rec_1_1_0000abcd', court, user), encoder_pid=1234)
+        entry = owner.get('rec_1_1_0000abcd')
+        assert owner.is_local(entry)
+        assert [e.session_id for e in owner.list_active()] == ['rec_1_1_0000abcd']
+
+        # Rien à arrêter: le battement de cœur rafraîchit seulement l'entrée
+        assert owner.heartbeat({'rec_1_1_0000abcd': {'status': 'recording', 'encoder_pid': 1234}}) == []
+        assert not owner.get('rec_1_1_0000abcd').is_stale(owner.stale_after)
+
+        # L'arrêt demandé ailleurs est remonté au propriétaire au battement suivant
+        assert other_worker.request_stop('rec_1_1_0000abcd')
+        assert owner.heartbeat({'rec_1_1_0000abcd': {'status': 'recording', 'encoder_pid': 1234}}) == \
+            ['rec_1_1_0000abcd']
+
+        # Le propriétaire publie le résultat, le demandeur le lit et retire l'entrée
+        owner.release('rec_1_1_0000abcd', {'status': 'completed', 'video_id': 42})
+        assert other_worker.wait_for_result('rec_1_1_0000abcd', timeout=2) == \
+            {'status': 'completed', 'video_id': 42}
+        assert ActiveRecording.query.count() == 0
+    print("✅ Arrêt demandé par un autre worker")
+
+
+def test_fin_locale_et_proprietaire_muet():
+    app = create_app('testing')
+
+    with app.app_context():
+        court, user = setup_court()
+        registry = RecordingRegistry(heartbeat_interval=0.1)
+
+        # Arrêt local sans demandeur: l'entrée disparaît
+        registry.register(recording_for('rec_1_2_0000abcd', court, user))
+        registry.release('rec_1_2_0000abcd', {'status': 'completed'})
+        assert registry.get('rec_1_2_0000abcd') is None
+
+        # Propriétaire sans battement de cœur récent: on ne l'attend pas
+        registry.register(recording_for('rec_1_3_0000abcd', court, user))
+        ActiveRecording.query.filter_by(session_id='rec_1_3_0000abcd').update(
+            {'heartbeat_at': datetime.utcnow() - timedelta(minutes=1)}, synchronize_session=False
+        )
+        db.session.commit()
+        assert registry.request_stop('rec_1_3_0000abcd')
+        started = time.monotonic()
+        assert registry.wait_for_result('rec_1_3_0000abcd', timeout=5) is None
+        assert time.monotonic() - started < 1
+    print("✅ Fin locale et propriétaire muet")
+
+
+if __name__ == "__main__":
+    test_arret_demande_par_un_autre_worker()
+    test_fin_locale_et_proprietaire_muet()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Test de l'anneau d'images partagé: numérotation des écritures et lectures concurrentes
+"""
+
+import sys
+import os
+import tempfile
+sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+
+from src.services.shared_frames import SharedFrameRing, SEQ
+
+WIDTH, HEIGHT, SLOTS = 4, 3, 3
+
+
+def frame(value: int) -> bytes:
+    return bytes([value]) * (WIDTH * HEIGHT)
+
+
+def test_lecture_ecriture():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'analysis.ring')
+        writer = SharedFrameRing.create(path, WIDTH, HEIGHT, slots=SLOTS)
+        reader = SharedFrameRing.open(path)
+        try:
+            assert reader.latest() is None
+            for value in range(1, 6):
+                writer.write(frame(value), timestamp=100.0 + value)
+            writer.write(b'taille incorrecte')  # ignorée
+
+            seq, timestamp, image = reader.latest()
+            assert (seq, timestamp) == (5, 105.0)
+            assert image.shape == (HEIGHT, WIDTH) and int(image[0, 0]) == 5
+
+            # Seules les SLOTS dernières images restent lisibles
+            assert reader.read(3)[0] == 103.0
+            assert reader.read(2) is None
+            assert reader.read(6) is None
+        finally:
+            reader.close()
+            writer.close()
+    print("✅ Numérotation des images de l'anneau")
+
+
+def test_image_en_cours_d_ecriture():
+    """Un emplacement en cours de réécriture (numéro à 0) n'est jamais rendu"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'analysis.ring')
+        writer = SharedFrameRing.create(path, WIDTH, HEIGHT, slots=SLOTS)
+        for value in range(1, 4):
+            writer.write(frame(value), timestamp=float(value))
+        SEQ.pack_into(writer._buffer, writer._slot_offset(3), 0)
+
+        reader = SharedFrameRing.open(path)
+        try:
+            assert reader.read(3) is None
+            seq, _, image = reader.latest()
+            assert seq == 2 and int(image[0, 0]) == 2
+
+            # Ingestion redémarrée: le lecteur doit rouvrir l'anneau
+            assert not reader.replaced()
+            SharedFrameRing.create(path, WIDTH, HEIGHT, slots=SLOTS).close()
+            assert reader.replaced()
+        finally:
+            reader.close()
+            writer.close()
+    print("✅ Écriture en cours et anneau recréé")
+
+
+if __name__ == "__main__":
+    test_lecture_ecriture()
+    test_image_en_cours_d_ecriture()
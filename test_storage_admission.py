@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Test de l'admission des enregistrements: choix du profil selon l'espace disque,
+le quota du club et l'espace déjà réservé par les sessions en cours, y compris
+celles des autres workers du nœud
+"""
+
+import sys
+import os
+import tempfile
+from types import SimpleNamespace
+sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+
+from src.services.storage_admission import StorageAdmission, InsufficientStorageError
+from src.services.node_ledger import NodeLedger
+
+MB = 1024 ** 2
+# Une heure à 1 Mo/s, ou à 0,25 Mo/s
+PROFILES = [('x264', 8 * MB), ('copy', 2 * MB)]
+
+
+def admission_with_free_space(directory, free_bytes):
+    admission = StorageAdmission(directory, min_free_bytes=0, margin=1.0)
+    admission.free_bytes = lambda: free_bytes
+    return admission
+
+
+def test_profil_selon_espace_et_quota():
+    with tempfile.TemporaryDirectory() as directory:
+        admission = admission_with_free_space(directory, 10_000 * MB)
+        assert admission.admit(None, 3600, PROFILES)['profile'] == 'x264'
+
+        # Quota du club presque atteint: profil plus léger
+        club = SimpleNamespace(id=1, storage_quota_bytes=2_000 * MB, storage_used_bytes=500 * MB)
+        result = admission.admit(club, 3600, PROFILES)
+        assert result['profile'] == 'copy' and result['downgraded']
+        assert result['estimated_bytes'] == 900 * MB
+
+        # Quota atteint: refus motivé
+        club.storage_used_bytes = 1_500 * MB
+        try:
+            admission.admit(club, 3600, PROFILES)
+            assert False, "l'enregistrement aurait dû être refusé"
+        except InsufficientStorageError as e:
+            assert str(e) == "Quota de stockage du club atteint"
+        assert admission.total_refused == 1 and admission.total_downgraded == 1
+    print("✅ Profil selon l'espace disque et le quota")
+
+
+def test_reservations_des_sessions_en_cours():
+    """L'espace promis aux sessions en cours n'est pas admis une seconde fois"""
+    with tempfile.TemporaryDirectory() as directory:
+        admission = admission_with_free_space(directory, 8_500 * MB)
+        first = admission.admit(None, 3600, PROFILES)
+        admission.reserve('rec_a', None, first['estimated_bytes'], 3600)
+        assert admission.admit(None, 3600, PROFILES)['profile'] == 'x264'
+        admission.reserve('rec_b', None, first['estimated_bytes'], 3600)
+        assert admission.admit(None, 3600, PROFILES)['profile'] == 'copy'
+
+        admission.release('rec_a')
+        assert admission.admit(None, 3600, PROFILES)['profile'] == 'x264'
+        assert admission.get_stats()['reserved_sessions'] == 1
+    print("✅ Réservations des sessions en cours")
+
+
+def test_decroissance_des_reservations():
+    """Une réservation ne couvre que ce qu'il reste à écrire"""
+    reserved_at = 1_000_000.0
+    reservations = {
+        'rec_a': {'pid': os.getpid(), 'club_id': 1, 'bytes': 1000, 'seconds': 100.0, 'reserved_at': reserved_at},
+        'rec_b': {'pid': os.getpid(), 'club_id': 2, 'bytes': 500, 'seconds': 50.0, 'reserved_at': reserved_at},
+    }
+    outstanding = StorageAdmission._outstanding
+    assert outstanding(reservations, now=reserved_at) == 1500
+    assert outstanding(reservations, now=reserved_at + 25) == 750 + 250
+    # Le quota du club compte la réservation entière: rien n'est encore dans storage_used_bytes
+    assert outstanding(reservations, club_id=1, now=reserved_at + 25) == 1000
+    assert outstanding(reservations, now=reserved_at + 50) == 500
+    assert outstanding(reservations, now=reserved_at + 500) == 0
+    print("✅ Décroissance des réservations")
+
+
+def test_reservation_soldee_a_la_fin_de_l_encodeur():
+    """Encodeur terminé: plus rien sur le volume, l'écrit reste au quota jusqu'à la rétention"""
+    with tempfile.TemporaryDirectory() as directory:
+        admission = StorageAdmission(directory, min_free_bytes=0)
+        admission.reserve('rec_a', 1, 1000, 100)
+        admission.reserve('rec_b', 1, 1000, 100)
+
+        admission.settle('rec_a', written_bytes=300)
+        admission.settle('rec_b')  # taille inconnue: estimée d'après le temps écoulé
+        assert admission.outstanding_bytes() == 0
+        assert 300 <= admission.outstanding_bytes(club_id=1) < 400
+
+        admission.release('rec_a')
+        admission.release('rec_b')
+        assert admission.outstanding_bytes(club_id=1) == 0
+    print("✅ Réservation soldée à la fin de l'encodeur")
+
+
+def test_reservations_partagees_par_le_noeud():
+    """Deux workers sur le même registre voient les réservations l'un de l'autre"""
+    with tempfile.TemporaryDirectory() as directory:
+        ledger_path = os.path.join(directory, 'ledger.json')
+        first = StorageAdmission(directory, min_free_bytes=0, ledger=NodeLedger(ledger_path))
+        second = StorageAdmission(directory, min_free_bytes=0, ledger=NodeLedger(ledger_path))
+
+        admission = first.admit(None, 3600, [('copy', 4_000_000)], session_id='rec_a')
+        assert admission['profile'] == 'copy'
+        assert 0 < second.outstanding_bytes() <= admission['estimated_bytes']
+
+        first.release('rec_a')
+        assert second.outstanding_bytes() == 0
+    print("✅ Réservations partagées par le nœud")
+
+
+if __name__ == "__main__":
+    test_profil_selon_espace_et_quota()
+    test_reservations_des_sessions_en_cours()
+    test_decroissance_des_reservations()
+    test_reservation_soldee_a_la_fin_de_l_encodeur()
+    test_reservations_partagees_par_le_noeud()